@@ -0,0 +1,102 @@
+"""Run the pypglab benchmark suites.
+
+The suites follow the asv conventions: a class with `params`, `setup()`,
+`teardown()` and `time_*` or `track_*` methods, so they can also be run by
+asv. This runner has no dependencies, run from the repository root:
+
+    python -m benchmarks [-k pattern] [--devices 1,100,10000] [--repeat 5]
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib
+import inspect
+import pkgutil
+import time
+from pathlib import Path
+
+# minimum duration of a timed sample
+MIN_SAMPLE_TIME = 0.02
+
+
+def suites():
+    """Yield the name and class of all benchmark suites"""
+    package = Path(__file__).parent
+    for module_info in sorted(pkgutil.iter_modules([str(package)]), key=lambda module: module.name):
+        if not module_info.name.startswith("bench_"):
+            continue
+
+        module = importlib.import_module(f"{__package__}.{module_info.name}")
+        for name, cls in inspect.getmembers(module, inspect.isclass):
+            if cls.__module__ != module.__name__:
+                continue
+            if any(attr.startswith(("time_", "track_")) for attr in dir(cls)):
+                yield f"{module_info.name}.{name}", cls
+
+
+def time_call(func, param, repeat: int) -> float:
+    """Return the best time of a call in seconds"""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func(param)
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_SAMPLE_TIME or number >= 1000:
+            break
+        number = number * 10
+
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            func(param)
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def format_time(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:8.2f} {unit:2s}"
+    return f"{seconds / 1e-9:8.2f} ns"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", dest="pattern", default="", help="run only the benchmarks containing the pattern")
+    parser.add_argument("--devices", help="comma separated number of devices, default from the suites")
+    parser.add_argument("--repeat", type=int, default=5, help="timed samples, the best one is reported")
+    args = parser.parse_args()
+
+    devices = [int(value) for value in args.devices.split(",")] if args.devices else None
+
+    print(f"{'benchmark':48s} {'devices':>8s} {'total':>11s} {'per device':>11s}")
+    for suite_name, cls in suites():
+        methods = [attr for attr in dir(cls) if attr.startswith(("time_", "track_"))]
+        methods = [attr for attr in methods if args.pattern in f"{suite_name}.{attr}"]
+        if not methods:
+            continue
+
+        for param in devices or cls.params:
+            suite = cls()
+            suite.setup(param)
+            try:
+                for method_name in methods:
+                    method = getattr(suite, method_name)
+                    name = f"{suite_name}.{method_name}"
+
+                    if method_name.startswith("time_"):
+                        elapsed = time_call(method, param, args.repeat)
+                        print(f"{name:48s} {param:8d} {format_time(elapsed)} {format_time(elapsed / param)}")
+                    else:
+                        value = method(param)
+                        unit = getattr(method, "unit", "")
+                        print(f"{name:48s} {param:8d} {value:11.1f} {unit}")
+            finally:
+                suite.teardown(param)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""Discovery message parse and validation benchmark (Device.config)"""
+
+from __future__ import annotations
+
+import json
+
+from pypglab.device import Device
+
+from .common import AsyncBenchmark, discovery_payload, null_client
+
+
+class DeviceConfig(AsyncBenchmark):
+    """Configure the E-Boards from their discovery payload"""
+
+    def setup(self, devices: int) -> None:
+        super().setup(devices)
+        self.mqtt = null_client()
+        self.payloads = [discovery_payload(index)[1] for index in range(devices)]
+        self.devices = [Device() for _ in range(devices)]
+        self.run(self._config(self.devices))
+
+    async def _config(self, devices: list[Device]) -> None:
+        for device, payload in zip(devices, self.payloads):
+            await device.config(self.mqtt, json.loads(payload))
+
+    def time_config(self, devices: int) -> None:
+        """New devices, all the entities are created"""
+        self.run(self._config([Device() for _ in range(devices)]))
+
+    def time_rediscovery(self, devices: int) -> None:
+        """Devices already configured with the same discovery message"""
+        self.run(self._config(self.devices))
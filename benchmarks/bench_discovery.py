@@ -0,0 +1,103 @@
+"""Discovery burst benchmark.
+
+Replay the retained discovery messages received after a broker restart and
+report the time until every device is configured, and the longest time the
+event loop was not able to dispatch other messages.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_discovery [devices]
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import sys
+import time
+
+from pypglab.helper import AsyncPgLab
+
+from .common import discovery_payload
+
+DEVICES = 5000
+
+# every device is discovered twice, the retained and the new message
+REPLAYS = 2
+
+# messages dispatched for every read from the socket
+READ_MESSAGES = 64
+
+
+def discovery_messages(devices: int) -> list[tuple[str, bytes]]:
+    """Return the synthetic discovery messages of the devices"""
+    return [discovery_payload(index) for index in range(devices)] * REPLAYS
+
+
+async def _watch_loop(stalls: list[float]) -> None:
+    """Record the longest interval between two runs of the event loop"""
+    last = time.perf_counter()
+    while True:
+        await asyncio.sleep(0)
+        now = time.perf_counter()
+        stalls[0] = max(stalls[0], now - last)
+        last = now
+
+
+async def sequential(messages: list[tuple[str, bytes]]) -> tuple[float, float, int]:
+    """Configure the devices one at a time blocking the dispatch, as before the pipeline"""
+    pglab = AsyncPgLab()
+    stalls = [0.0]
+    watch = asyncio.create_task(_watch_loop(stalls))
+    await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    for _, payload in messages:
+        await pglab._configure_device(json.loads(payload))
+    elapsed = time.perf_counter() - start
+    await asyncio.sleep(0)
+
+    watch.cancel()
+    return elapsed, stalls[0], len(pglab.registry)
+
+
+async def pipeline(messages: list[tuple[str, bytes]]) -> tuple[float, float, int]:
+    """Dispatch the messages and wait for the discovery worker"""
+    pglab = AsyncPgLab()
+    pglab._discovery.start()
+    stalls = [0.0]
+    watch = asyncio.create_task(_watch_loop(stalls))
+    await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    for index, (topic, payload) in enumerate(messages):
+        pglab._dispatch(topic, payload)
+        if index % READ_MESSAGES == 0:
+            await asyncio.sleep(0)
+    await pglab.wait_discovery()
+    elapsed = time.perf_counter() - start
+    await asyncio.sleep(0)
+
+    watch.cancel()
+    await pglab._discovery.stop()
+    return elapsed, stalls[0], len(pglab.registry)
+
+
+def main() -> None:
+    devices = int(sys.argv[1]) if len(sys.argv) > 1 else DEVICES
+    messages = discovery_messages(devices)
+
+    print(f"{len(messages)} discovery messages for {devices} devices")
+    for name, run in (
+        ("sequential", sequential(messages)),
+        ("pipeline", pipeline(messages)),
+    ):
+        elapsed, stall, configured = asyncio.run(run)
+        print(
+            f"{name:24s} ready in {elapsed * 1000:9.1f} ms, "
+            f"longest loop stall {stall * 1000:8.2f} ms, {configured} devices"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Message dispatch benchmark, from the received message to the entity state"""
+
+from __future__ import annotations
+
+import json
+
+from pypglab.const import RELAY_STATE_OFF, RELAY_STATE_ON
+from pypglab.helper import AsyncPgLab
+
+from .common import AsyncBenchmark, device_name, discovery_message
+
+
+class Dispatch(AsyncBenchmark):
+    """Dispatch a state message to every E-Board"""
+
+    def setup(self, devices: int) -> None:
+        super().setup(devices)
+
+        # the paho client is never connected, subscriptions are only routed
+        self.pglab = AsyncPgLab()
+        for index in range(devices):
+            self.run(self.pglab._configure_device(discovery_message(index)))
+
+        names = [device_name(index) for index in range(devices)]
+        self.relay_on = [(f"pglab/{name}/relay/0/state", RELAY_STATE_ON.encode()) for name in names]
+        self.relay_off = [(f"pglab/{name}/relay/0/state", RELAY_STATE_OFF.encode()) for name in names]
+        self.shutter = [(f"pglab/{name}/shutter/0/state", b"OPENING") for name in names]
+        self.sensor = [
+            (f"pglab/{name}/sensor/value", json.dumps({"temp": 25, "volt": 230, "rtime": 10}).encode())
+            for name in names
+        ]
+        self.unknown = [(f"pglab/{name}/relay/0/set", RELAY_STATE_ON.encode()) for name in names]
+
+    def _dispatch(self, messages: list[tuple[str, bytes]]) -> None:
+        dispatch = self.pglab._dispatch
+        for topic, payload in messages:
+            dispatch(topic, payload)
+
+    def time_relay_state(self, devices: int) -> None:
+        """A relay turned on and off"""
+        self._dispatch(self.relay_on)
+        self._dispatch(self.relay_off)
+
+    def time_shutter_state(self, devices: int) -> None:
+        """A shutter state"""
+        self._dispatch(self.shutter)
+
+    def time_sensor_value(self, devices: int) -> None:
+        """The status sensor JSON"""
+        self._dispatch(self.sensor)
+
+    def time_unrouted(self, devices: int) -> None:
+        """The echo of our own commands, received and dropped"""
+        self._dispatch(self.unknown)
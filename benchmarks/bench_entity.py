@@ -0,0 +1,78 @@
+"""Entity memory and command throughput benchmark.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_entity
+"""
+
+import asyncio
+import gc
+import time
+import tracemalloc
+
+from pypglab.mqtt import Client
+from pypglab.relay import Relay, RelayBank
+from pypglab.sensor import StatusSensor
+from pypglab.shutter import Shutter
+
+ENTITIES = 10000
+COMMANDS = 100000
+
+
+async def _publish(topic, payload, qos, retain):
+    pass
+
+
+def entity_bytes(create) -> float:
+    """Return the memory allocated for every entity created"""
+    gc.collect()
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    entities = [create(index) for index in range(ENTITIES)]
+    end, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert len(entities) == ENTITIES
+    return (end - start) / ENTITIES
+
+
+async def commands_per_second(relay: Relay, repeat: int = 5) -> float:
+    """Return the number of relay commands published per second, best of repeat runs"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(COMMANDS // 2):
+            await relay.turn_on()
+            await relay.turn_off()
+        best = min(best, time.perf_counter() - start)
+    return COMMANDS / best
+
+
+def main() -> None:
+    mqtt = Client(_publish, None, None)
+
+    banks = {}
+
+    def relay(index):
+        device = index // 64
+        bank = banks.get(device)
+        if bank is None:
+            bank = banks[device] = RelayBank(f"E-BOARD-{device:08X}")
+        return Relay(str(device), bank.device_name, index % 64, mqtt, None, bank)
+
+    def shutter(index):
+        return Shutter(str(index), f"E-BOARD-{index:08X}", index % 32, mqtt)
+
+    def sensor(index):
+        return StatusSensor(str(index), f"E-BOARD-{index:08X}", ["temp", "volt", "rtime"], mqtt)
+
+    print(f"relay          {entity_bytes(relay):8.0f} bytes/entity")
+    print(f"shutter        {entity_bytes(shutter):8.0f} bytes/entity")
+    print(f"status sensor  {entity_bytes(sensor):8.0f} bytes/entity")
+
+    relay = Relay("0", "E-BOARD-00000000", 0, mqtt)
+    print(f"relay commands {asyncio.run(commands_per_second(relay)):8.0f} commands/s")
+
+
+if __name__ == "__main__":
+    main()
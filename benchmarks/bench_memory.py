@@ -0,0 +1,30 @@
+"""Memory per configured E-Board benchmark"""
+
+from __future__ import annotations
+
+import gc
+import tracemalloc
+
+from pypglab.helper import AsyncPgLab
+
+from .common import AsyncBenchmark, discovery_message
+
+
+class Memory(AsyncBenchmark):
+    """Memory allocated by the discovery of the E-Boards, including the topic routes"""
+
+    def track_bytes_per_eboard(self, devices: int) -> float:
+        pglab = AsyncPgLab()
+
+        gc.collect()
+        tracemalloc.start()
+        start, _ = tracemalloc.get_traced_memory()
+        for index in range(devices):
+            self.run(pglab._configure_device(discovery_message(index)))
+        end, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        assert len(pglab.registry) == devices
+        return (end - start) / devices
+
+    track_bytes_per_eboard.unit = "bytes"
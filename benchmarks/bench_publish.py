@@ -0,0 +1,38 @@
+"""Command publish benchmark (Relay.turn_on)"""
+
+from __future__ import annotations
+
+import asyncio
+
+from .common import AsyncBenchmark
+
+
+class RelayCommands(AsyncBenchmark):
+    """Send relay commands to every E-Board, the publish is discarded"""
+
+    def setup(self, devices: int) -> None:
+        super().setup(devices)
+        self.devices = self.run(self.configure_devices(devices))
+        self.relays = [device.relays[0] for device in self.devices]
+
+    async def _turn_on(self) -> None:
+        for relay in self.relays:
+            await relay.turn_on()
+
+    async def _turn_on_gather(self) -> None:
+        await asyncio.gather(*(relay.turn_on() for relay in self.relays))
+
+    async def _all_relays_on(self) -> None:
+        await asyncio.gather(*(device.all_relays_on() for device in self.devices))
+
+    def time_turn_on(self, devices: int) -> None:
+        """A relay turned on, one command after the other"""
+        self.run(self._turn_on())
+
+    def time_turn_on_gather(self, devices: int) -> None:
+        """A relay turned on, all commands at the same time"""
+        self.run(self._turn_on_gather())
+
+    def time_all_relays_on(self, devices: int) -> None:
+        """All the 14 relays turned on"""
+        self.run(self._all_relays_on())
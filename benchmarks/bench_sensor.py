@@ -0,0 +1,30 @@
+"""Status sensor JSON update benchmark"""
+
+from __future__ import annotations
+
+import json
+
+from .common import AsyncBenchmark
+
+
+class SensorUpdates(AsyncBenchmark):
+    """Update the status sensor of every E-Board"""
+
+    def setup(self, devices: int) -> None:
+        super().setup(devices)
+        self.sensors = [device.status_sensor for device in self.run(self.configure_devices(devices))]
+        self.payloads = [
+            json.dumps({"temp": 20 + index % 10, "volt": 230, "rtime": index}) for index in range(devices)
+        ]
+        self.unchanged = json.dumps({"temp": 25, "volt": 230, "rtime": 0})
+
+    def time_changed(self, devices: int) -> None:
+        """A different value for every sensor"""
+        for sensor, payload in zip(self.sensors, self.payloads):
+            sensor.status_change_received(payload)
+
+    def time_unchanged(self, devices: int) -> None:
+        """The same value received again"""
+        payload = self.unchanged
+        for sensor in self.sensors:
+            sensor.status_change_received(payload)
@@ -0,0 +1,82 @@
+"""Shared helpers of the pypglab benchmarks"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+
+from pypglab.const import PGLAB_DISCOVERY_TOPIC
+from pypglab.device import Device
+from pypglab.mqtt import Client
+
+# number of devices every suite is run with
+DEVICES = [1, 10, 100, 1000, 10000]
+
+# E-Board with 14 relays, 1 shutter and the status sensor
+EBOARD_SHUTTERS = 1
+EBOARD_BOARDS = "11000000"
+
+
+def device_name(index: int) -> str:
+    """Return the name of a synthetic E-Board"""
+    return f"E-BOARD-{index:06d}"
+
+
+def discovery_message(index: int, shutters: int = EBOARD_SHUTTERS, boards: str = EBOARD_BOARDS) -> dict:
+    """Return the discovery message of a synthetic E-Board"""
+    name = device_name(index)
+    return {
+        "ip": "192.168.1.10",
+        "mac": f"AA:BB:CC:{index >> 16 & 255:02X}:{index >> 8 & 255:02X}:{index & 255:02X}",
+        "name": name,
+        "hw": "1.0.0",
+        "fw": "1.0.0",
+        "type": "E-BOARD",
+        "id": name.lower(),
+        "manufacturer": "PG LAB Electronics",
+        "params": {"shutters": shutters, "boards": boards},
+    }
+
+
+def discovery_payload(index: int, **kwargs) -> tuple[str, bytes]:
+    """Return the discovery topic and payload of a synthetic E-Board"""
+    return (
+        f"{PGLAB_DISCOVERY_TOPIC}/{device_name(index)}/config",
+        json.dumps(discovery_message(index, **kwargs)).encode(),
+    )
+
+
+async def _publish(topic, payload, qos, retain):
+    pass
+
+
+def null_client() -> Client:
+    """Return a client interface discarding all messages"""
+    return Client(_publish, None, None)
+
+
+class AsyncBenchmark:
+    """Base class of the benchmarks running coroutines in their own event loop"""
+
+    params = DEVICES
+    param_names = ["devices"]
+
+    def setup(self, devices: int) -> None:
+        self.loop = asyncio.new_event_loop()
+
+    def teardown(self, devices: int) -> None:
+        self.loop.close()
+
+    def run(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    async def configure_devices(self, devices: int, mqtt: Client | None = None) -> list[Device]:
+        """Return configured E-Boards with unlimited command rate"""
+        mqtt = mqtt or null_client()
+        result = []
+        for index in range(devices):
+            device = Device()
+            await device.config(mqtt, discovery_message(index))
+            device.set_command_rate(1e9, 1000)
+            result.append(device)
+        return result
@@ -0,0 +1,145 @@
+"""Persistent cache of the configured devices for pypglab"""
+
+from __future__ import annotations
+
+import json
+import os
+from collections.abc import Iterable
+
+from .const import (
+    CONFIG_FIRMWARE_VERSION,
+    CONFIG_HARDWARE_VERSION,
+    CONFIG_ID,
+    CONFIG_IP,
+    CONFIG_MAC,
+    CONFIG_MANUFACTURER,
+    CONFIG_NAME,
+    CONFIG_PARAMETERS,
+    CONFIG_TYPE,
+    LOGGER,
+    RELAY_STATE_OFF,
+    RELAY_STATE_ON,
+    SHUTTER_STATE_CLOSED,
+    SHUTTER_STATE_OPEN,
+)
+from .device import Device
+from .shutter import Shutter
+
+# the version of the cache file format, a file with another version is ignored
+CACHE_VERSION = 1
+
+# the state payload of the shutter states stored, a movement in progress is not restored
+SHUTTER_STATE_PAYLOADS = {
+    Shutter.STATE_OPEN: SHUTTER_STATE_OPEN,
+    Shutter.STATE_CLOSED: SHUTTER_STATE_CLOSED,
+}
+
+
+def device_snapshot(device: Device) -> dict:
+    """Return the discovery message and the last known entity states of a device"""
+    config = {
+        CONFIG_IP: device.ip,
+        CONFIG_MAC: device.mac,
+        CONFIG_ID: device.id,
+        CONFIG_NAME: device.name,
+        CONFIG_TYPE: device.type,
+        CONFIG_MANUFACTURER: device.manufacturer,
+        CONFIG_HARDWARE_VERSION: device.hardware_version,
+        CONFIG_FIRMWARE_VERSION: device.firmware_version,
+    }
+    if device.parameters is not None:
+        config[CONFIG_PARAMETERS] = dict(device.parameters)
+
+    relays = {
+        str(relay.id): RELAY_STATE_ON if relay.state else RELAY_STATE_OFF
+        for relay in device.relays
+        if relay.state is not None
+    }
+    shutters = {
+        str(shutter.id): SHUTTER_STATE_PAYLOADS[shutter.state]
+        for shutter in device.shutters
+        if shutter.state in SHUTTER_STATE_PAYLOADS
+    }
+    positions = {
+        str(shutter.id): shutter.position
+        for shutter in device.shutters
+        if shutter.state in SHUTTER_STATE_PAYLOADS and shutter.position is not None
+    }
+    sensor = dict(device.status_sensor.state) if device.status_sensor else {}
+
+    return {
+        "config": config,
+        "tags": sorted(device.tags),
+        "relays": relays,
+        "shutters": shutters,
+        "positions": positions,
+        "sensor": sensor,
+    }
+
+
+def restore_states(device: Device, snapshot: dict) -> None:
+    """Restore the tags and the entity states of a snapshot, without notifying the callbacks"""
+    device.tags.update(snapshot.get("tags", ()))
+
+    for relay in device.relays:
+        payload = snapshot.get("relays", {}).get(str(relay.id))
+        if payload is not None:
+            relay.status_change_received(payload)
+
+    for shutter in device.shutters:
+        payload = snapshot.get("shutters", {}).get(str(shutter.id))
+        if payload is not None:
+            shutter.restore(payload, snapshot.get("positions", {}).get(str(shutter.id)))
+
+    sensor = snapshot.get("sensor")
+    if sensor and device.status_sensor:
+        device.status_sensor.restore(sensor)
+
+
+class DeviceCache:
+    """The configured devices and their last known states stored in a JSON file.
+
+    The devices loaded from the cache are usable before the broker replays
+    the discovery messages, a discovery message then reconfigures a device
+    only if its configuration hash is different. The hash is not stored,
+    Python string hashes change on every process start, it is computed again
+    when the cached discovery message is configured.
+    """
+
+    def __init__(self, path: str | os.PathLike) -> None:
+        """Initialize"""
+        self._path = os.fspath(path)
+
+    def load(self) -> list[dict]:
+        """Return the device snapshots stored, an empty list if the cache is missing or not valid"""
+        try:
+            with open(self._path, encoding="utf-8") as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError) as e:
+            LOGGER.warning("Device cache %s not readable (%s)", self._path, e)
+            return []
+
+        if not isinstance(data, dict) or data.get("version") != CACHE_VERSION:
+            LOGGER.warning("Device cache %s has an unknown format, ignored", self._path)
+            return []
+
+        return [device for device in data.get("devices", []) if isinstance(device, dict) and "config" in device]
+
+    def save(self, devices: Iterable[Device]) -> None:
+        """Store the snapshot of the devices, the file is replaced atomically"""
+        data = {
+            "version": CACHE_VERSION,
+            "devices": [device_snapshot(device) for device in devices],
+        }
+
+        temporary = self._path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(data, file, separators=(",", ":"))
+        os.replace(temporary, self._path)
+
+    @property
+    def path(self) -> str:
+        """Get the cache file path"""
+        return self._path
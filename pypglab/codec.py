@@ -0,0 +1,77 @@
+"""JSON codec for pypglab
+
+The discovery messages and the status sensor values are decoded with the
+fastest JSON library installed: orjson, then msgspec, then the standard
+library. All backends accept bytes or text and raise ValueError for an
+invalid document.
+"""
+
+from __future__ import annotations
+
+import json
+from collections.abc import Callable
+from typing import Any
+
+# the optional JSON libraries, in order of preference
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+JSON_BACKEND_ORJSON = "orjson"
+JSON_BACKEND_MSGSPEC = "msgspec"
+JSON_BACKEND_STDLIB = "json"
+
+Json_Loads = Callable[[Any], Any]
+
+
+def _msgspec_loads() -> Json_Loads:
+    decode = msgspec.json.Decoder().decode
+
+    def loads(payload: bytes | str) -> Any:
+        try:
+            return decode(payload)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e)) from e
+
+    return loads
+
+
+def available_backends() -> list[str]:
+    """Return the JSON backends installed, the preferred one first"""
+    backends = []
+    if orjson is not None:
+        backends.append(JSON_BACKEND_ORJSON)
+    if msgspec is not None:
+        backends.append(JSON_BACKEND_MSGSPEC)
+    backends.append(JSON_BACKEND_STDLIB)
+    return backends
+
+
+def set_backend(name: str | None = None) -> None:
+    """Decode with a JSON backend, the preferred one installed when not given"""
+    if name is None:
+        name = available_backends()[0]
+    elif name not in available_backends():
+        raise ValueError(f"JSON backend {name} not available")
+
+    global loads, backend
+    if name == JSON_BACKEND_ORJSON:
+        loads = orjson.loads
+    elif name == JSON_BACKEND_MSGSPEC:
+        loads = _msgspec_loads()
+    else:
+        loads = json.loads
+    backend = name
+
+
+# the JSON decoder in use and its name, set by set_backend
+loads: Json_Loads = json.loads
+backend: str = JSON_BACKEND_STDLIB
+
+set_backend()
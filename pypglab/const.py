@@ -57,6 +57,18 @@ SHUTTER_CMD_OPEN: Final = "OPEN"
 SHUTTER_CMD_CLOSE: Final = "CLOSE"
 SHUTTER_CMD_STOP: Final = "STOP"
 
+# The relay and shutter states as received in the MQTT payloads, compared without decoding
+RELAY_PAYLOAD_ON: Final = RELAY_STATE_ON.encode()
+RELAY_PAYLOAD_OFF: Final = RELAY_STATE_OFF.encode()
+SHUTTER_PAYLOAD_OPENING: Final = SHUTTER_STATE_OPENING.encode()
+SHUTTER_PAYLOAD_OPEN: Final = SHUTTER_STATE_OPEN.encode()
+SHUTTER_PAYLOAD_CLOSING: Final = SHUTTER_STATE_CLOSING.encode()
+SHUTTER_PAYLOAD_CLOSED: Final = SHUTTER_STATE_CLOSED.encode()
+
+# Shutter position tolerance in percent, and maximum seconds to wait for a shutter with unknown travel time
+SHUTTER_POSITION_TOLERANCE: Final = 1
+SHUTTER_MAX_TRAVEL_TIME: Final = 120
+
 # MQTT topic for set and get state
 ENTITY_TOPIC = {
     ENTITY_RELAY: ("set", "state"),
@@ -64,11 +76,31 @@ ENTITY_TOPIC = {
     ENTITY_SENSOR: (None, "value"),
 }
 
+# Default command rate limit (commands per second, burst) of a PG LAB device
+DEFAULT_COMMAND_RATE_LIMIT = (1000, 8)
+
+# Command rate limit of a device type by the minimum firmware version
+COMMAND_RATE_LIMITS = {
+    "E-BOARD": {"0.0.0": DEFAULT_COMMAND_RATE_LIMIT},
+    "E-RELAY": {"0.0.0": DEFAULT_COMMAND_RATE_LIMIT},
+    "E-SWITCH": {"0.0.0": DEFAULT_COMMAND_RATE_LIMIT},
+}
+
+# Maximum number of topics with a command waiting for the broker connection
+OFFLINE_QUEUE_SIZE = 1024
+
+# Seconds to wait for the state confirming a command, and times the command is sent again
+COMMAND_TIMEOUT = 2
+COMMAND_RETRIES = 2
+
 # Sensors value
 SENSOR_TEMPERATURE: Final = "temp"
 SENSOR_VOLTAGE: Final = "volt"
 SENSOR_REBOOT_TIME: Final = "rtime"
 
+# Default number of values stored by a sensor history
+SENSOR_HISTORY_SIZE = 1024
+
 # Sensors status for a specific PG LAB device
 STATUS_SENSOR_CONFIG = {
     "E-BOARD": [SENSOR_TEMPERATURE, SENSOR_VOLTAGE, SENSOR_REBOOT_TIME],
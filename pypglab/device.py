@@ -2,6 +2,8 @@
 
 from __future__ import annotations
 
+import asyncio
+from functools import partial
 from typing import cast
 from voluptuous import Schema, ALLOW_EXTRA, REMOVE_EXTRA, MultipleInvalid
 
@@ -24,10 +26,17 @@ from .const import (
     CONFIG_FIRMWARE_VERSION,
     CONFIG_EBOARD_SHUTTERS,
     CONFIG_EBOARD_BOARDS,
+    DEFAULT_COMMAND_RATE_LIMIT,
+    COMMAND_RETRIES,
+    COMMAND_TIMEOUT,
+    RELAY_STATE_ON,
+    RELAY_STATE_OFF,
 )
 
+from .events import EVENT_STREAM_SIZE, OVERFLOW_DROP_OLDEST, Event_Filter, EventHub, EventStream
 from .mqtt import Client
-from .relay import CreateRelay
+from .relay import CreateRelay, RelayBank
+from .scheduler import CommandScheduler, command_rate_limit
 from .sensor import CreateStatusSensor
 from .shutter import CreateShutter
 
@@ -62,8 +71,21 @@ PGLAB_EBOARD_PARAMETERS = Schema (
 class Device:
     """The class represent a generic PG LAB device."""
 
-    def __init__(self) -> None:
-        """Initialize."""
+    def __init__(
+        self,
+        command_rate: float | None = None,
+        command_burst: int | None = None,
+        events: EventHub | None = None,
+        sensor_history: int = 0,
+    ) -> None:
+        """Initialize.
+
+        command_rate (commands per second) and command_burst limit the commands
+        sent to the device, when not set they are chosen from the device type
+        and firmware version. The state events of the device are forwarded to
+        the events hub, if given. The last sensor_history values of every
+        sensor are stored, when not zero.
+        """
 
         # device ip address
         self._ip = None
@@ -95,12 +117,34 @@ class Device:
         # prepare an array of available relays
         self._relays = []
 
+        # the relays state of the device
+        self._relay_bank: RelayBank | None = None
+
         # prepare an array of available shutters
         self._shutters = []
 
         # prepare the status sensor of the device
         self._status_sensor = None
 
+        # the number of sensor values stored, disabled when zero
+        self._sensor_history = sensor_history
+
+        # true when the entities are subscribed to their MQTT topics
+        self._subscribed = False
+
+        # the state events of the device entities
+        self._events = EventHub(events)
+
+        # user defined tags to select the device in the fleet commands
+        self._tags: set[str] = set()
+
+        # the command rate limit requested by the user
+        self._command_rate_limit = (command_rate, command_burst)
+
+        # limit the rate of the commands sent to the device by all entities
+        rate, burst = DEFAULT_COMMAND_RATE_LIMIT
+        self._scheduler = CommandScheduler(command_rate or rate, command_burst or burst)
+
         # internal configuration hash
         self._hash = hash(
             (
@@ -110,76 +154,234 @@ class Device:
         )
 
     async def config(self, mqtt: Client, config: dict, subscribe:bool = False) -> bool:
-        """Perform internal configuration."""
+        """Perform internal configuration.
 
-        # validate config message
-        try:
-            config = PGLAB_DISCOVERY_SCHEMA(config)
-        except MultipleInvalid as e:
-            LOGGER.warning("Invalid discovey message (%s)", e)
-            return False
+        A device already configured is updated incrementally: nothing changes
+        if the configuration hash is the same, otherwise only the entities
+        added or removed by the new configuration are created or dropped.
+        """
 
-        self._mac = config[CONFIG_MAC]
-        self._ip = config[CONFIG_IP]
-        self._id = config[CONFIG_ID]
-        self._name = config[CONFIG_NAME]
-        self._type = config[CONFIG_TYPE]
-        self._manufacturer = config[CONFIG_MANUFACTURER]
-        self._hardware_version = config[CONFIG_HARDWARE_VERSION]
-        self._firmware_version = config[CONFIG_FIRMWARE_VERSION]
+        # validate config message, the schema reports the errors of a message not well formed
+        validated_config = cv.fast_discovery(config)
+        if validated_config is None:
+            try:
+                validated_config = PGLAB_DISCOVERY_SCHEMA(config)
+            except MultipleInvalid as e:
+                LOGGER.warning("Invalid discovey message (%s)", e)
+                return False
 
-        # update the device hash
-        self._hash = hash((self._id, self._name, self._mac))
+        config = validated_config
 
-        # initialize the specific type of device
-        if self.is_eboard:
+        parameters = None
+
+        # the device hash
+        config_hash = hash((config[CONFIG_ID], config[CONFIG_NAME], config[CONFIG_MAC]))
+
+        if config[CONFIG_TYPE] == PGLAB_DEVICE_TYPES[E_BOARD]:
 
             # validate e-board parameters
-            try:
-                eboard_config = PGLAB_EBOARD_PARAMETERS(config)                
-            except MultipleInvalid as e:
-                LOGGER.warning("Invalid E-Board parameters message (%s)", e)
-                return False
+            parameters = cv.fast_eboard_parameters(config)
+            if parameters is None:
+                try:
+                    eboard_config = PGLAB_EBOARD_PARAMETERS(config)
+                except MultipleInvalid as e:
+                    LOGGER.warning("Invalid E-Board parameters message (%s)", e)
+                    return False
 
-            # save the e-board parameters
-            self._parameters = eboard_config[CONFIG_PARAMETERS]
+                parameters = eboard_config[CONFIG_PARAMETERS]
 
             # update the device hash with specific e-board configuration
-            self._hash = hash(
+            config_hash = hash(
                 (
-                    self._hash,
-                    self._parameters.get(CONFIG_EBOARD_SHUTTERS),
-                    self._parameters.get(CONFIG_EBOARD_BOARDS),
+                    config_hash,
+                    parameters.get(CONFIG_EBOARD_SHUTTERS),
+                    parameters.get(CONFIG_EBOARD_BOARDS),
                 )
             )
 
-            shutters = self._parameters.get(CONFIG_EBOARD_SHUTTERS)
-
-            # prepare all shutters
-            for index in range(0, shutters):
-                if await self.is_relay_connected(index * 2):
-                    shutter = await CreateShutter(self._id, self._name, index, mqtt)
-                    if subscribe:
-                        await shutter.subscribe_topics()
-                    self._shutters.append(shutter)
-
-            # prepare all relays
-            for index in range(2 * shutters, 64):
-                if await self.is_relay_connected(index):
-                    relay = await CreateRelay(self._id, self._name, index, mqtt)
-                    if subscribe:
-                        await relay.subscribe_topics()
-                    self._relays.append(relay)
-
-            # prepare the sensor
+        # these attributes don't affect the entities
+        self._ip = config[CONFIG_IP]
+        self._manufacturer = config[CONFIG_MANUFACTURER]
+        self._hardware_version = config[CONFIG_HARDWARE_VERSION]
+        self._firmware_version = config[CONFIG_FIRMWARE_VERSION]
+
+        # update the command rate limit for this type of device
+        rate, burst = command_rate_limit(config[CONFIG_TYPE], self._firmware_version)
+        command_rate, command_burst = self._command_rate_limit
+        self._scheduler.configure(command_rate or rate, command_burst or burst)
+
+        configured = self._id is not None
+
+        if not configured or config_hash != self._hash:
+
+            # the entity topics depend on the device identity, replace all of them if it changed
+            if configured and (
+                self._id != config[CONFIG_ID]
+                or self._name != config[CONFIG_NAME]
+                or self._type != config[CONFIG_TYPE]
+            ):
+                await self._remove_entities()
+
+            self._mac = config[CONFIG_MAC]
+            self._id = config[CONFIG_ID]
+            self._name = config[CONFIG_NAME]
+            self._type = config[CONFIG_TYPE]
+            self._parameters = parameters
+            self._hash = config_hash
+
+            # initialize the specific type of device
+            if self.is_eboard:
+                await self._config_eboard(mqtt)
+
+        if subscribe and not self._subscribed:
+            await self.subscribe_topics()
+
+        return True
+
+    async def _config_eboard(self, mqtt: Client) -> None:
+        """Create the e-board entities missing and remove the ones not available anymore."""
+
+        shutters = self._parameters.get(CONFIG_EBOARD_SHUTTERS)
+
+        # every shutter uses two relays
+        shutter_indexes = [
+            index for index in range(0, shutters)
+            if await self.is_relay_connected(index * 2)
+        ]
+        relay_indexes = [
+            index for index in range(2 * shutters, 64)
+            if await self.is_relay_connected(index)
+        ]
+
+        # prepare all shutters
+        self._shutters = await self._update_entities(
+            self._shutters, shutter_indexes, CreateShutter, mqtt
+        )
+
+        # prepare all relays
+        if self._relay_bank is None:
+            self._relay_bank = RelayBank(self._name)
+
+        self._relays = await self._update_entities(
+            self._relays, relay_indexes, partial(CreateRelay, bank=self._relay_bank), mqtt
+        )
+        self._relay_bank.assign(self._relays)
+
+        # prepare the sensor
+        if self._status_sensor is None:
             self._status_sensor = await CreateStatusSensor(
                 self._id, self._name, STATUS_SENSOR_CONFIG[self._type], mqtt
             )
-            
-            if subscribe:
+            self._status_sensor.set_event_hub(self._events)
+            if self._sensor_history:
+                self._status_sensor.enable_history(self._sensor_history)
+
+            if self._subscribed:
                 await self._status_sensor.subscribe_topics()
-        
-        return True
+
+    async def _update_entities(self, entities: list, indexes: list, create, mqtt: Client) -> list:
+        """Return the entities for the indexes, keeping the existing ones."""
+        current = {entity.id: entity for entity in entities}
+
+        updated = []
+        for index in indexes:
+            entity = current.pop(index, None)
+            if entity is None:
+                entity = await create(self._id, self._name, index, mqtt, self._scheduler)
+                entity.set_event_hub(self._events)
+                if self._subscribed:
+                    await entity.subscribe_topics()
+            updated.append(entity)
+
+        # the remaining entities are not available anymore
+        if self._subscribed:
+            for entity in current.values():
+                await entity.unsubscribe_topics()
+
+        return updated
+
+    async def _remove_entities(self) -> None:
+        """Remove all the device entities."""
+        if self._subscribed:
+            for entity in self.entities:
+                await entity.unsubscribe_topics()
+
+        self._shutters = []
+        self._relays = []
+        self._relay_bank = None
+        self._status_sensor = None
+
+    async def set_relays(
+        self,
+        states: dict[int, bool],
+        confirm: bool = False,
+        timeout: float = COMMAND_TIMEOUT,
+        retries: int = COMMAND_RETRIES,
+    ) -> bool:
+        """Change the state of many relays with a single burst of commands.
+
+        states maps the relay index to the new relay state. The commands are
+        released in order as fast as the device command rate limit allows.
+        With confirm wait until the device confirms all the commands, return
+        false if a relay is not available or a command is not confirmed.
+        """
+        commands = []
+        available = True
+        for index, state in states.items():
+            relay = self._relay_bank.get(index) if self._relay_bank else None
+            if relay is None:
+                LOGGER.warning("Relay %s not available in device %s", index, self._name)
+                available = False
+                continue
+            commands.append(
+                relay.set_state(RELAY_STATE_ON if state else RELAY_STATE_OFF, confirm, timeout, retries)
+            )
+
+        results = await asyncio.gather(*commands)
+        return available and all(results)
+
+    async def all_relays_on(
+        self, confirm: bool = False, timeout: float = COMMAND_TIMEOUT, retries: int = COMMAND_RETRIES
+    ) -> bool:
+        """Turn all the relays on."""
+        return await self.set_relays({relay.id: True for relay in self._relays}, confirm, timeout, retries)
+
+    async def all_relays_off(
+        self, confirm: bool = False, timeout: float = COMMAND_TIMEOUT, retries: int = COMMAND_RETRIES
+    ) -> bool:
+        """Turn all the relays off."""
+        return await self.set_relays({relay.id: False for relay in self._relays}, confirm, timeout, retries)
+
+    def events(
+        self,
+        maxsize: int = EVENT_STREAM_SIZE,
+        overflow: str = OVERFLOW_DROP_OLDEST,
+        filter: Event_Filter | None = None,
+    ) -> EventStream:
+        """Return a stream of the device state events.
+
+        async with device.events() as events:
+            async for event in events:
+                ...
+        """
+        return self._events.stream(maxsize, overflow, filter)
+
+    def set_command_rate(self, rate: float, burst: int = 1) -> None:
+        """Change the limit of commands per second sent to the device."""
+        self._command_rate_limit = (rate, burst)
+        self._scheduler.configure(rate, burst)
+
+    async def subscribe_topics(self) -> None:
+        """Subscribe all the device entities to their MQTT topics."""
+        for entity in self.entities:
+            await entity.subscribe_topics()
+        self._subscribed = True
+
+    async def unsubscribe_topics(self) -> None:
+        """Unsubscribe all the device entities from their MQTT topics."""
+        for entity in self.entities:
+            await entity.unsubscribe_topics()
+        self._subscribed = False
 
     async def is_relay_connected(self, index):
         """Return if a specific relay is connected to e-board and available to use."""
@@ -209,11 +411,34 @@ class Device:
         """Get the relay array."""
         return self._relays
 
+    @property
+    def relay_states(self) -> int:
+        """Get the state of all relays, the bit at relay index is set when the relay is on."""
+        return self._relay_bank.states if self._relay_bank else 0
+
+    @property
+    def relay_bank(self) -> RelayBank | None:
+        """Get the relay bank storing the relays state."""
+        return self._relay_bank
+
     @property
     def shutters(self):
         """Get the shutter array."""
         return self._shutters
 
+    @property
+    def entities(self) -> list:
+        """Get all the device entities."""
+        entities = [*self._shutters, *self._relays]
+        if self._status_sensor:
+            entities.append(self._status_sensor)
+        return entities
+
+    @property
+    def scheduler(self) -> CommandScheduler:
+        """Get the scheduler limiting the rate of the device commands."""
+        return self._scheduler
+
     @property
     def status_sensor(self):
         """Get the device status sensor."""
@@ -259,6 +484,16 @@ class Device:
         """Device firmware version."""
         return cast(str, self._firmware_version)
 
+    @property
+    def parameters(self) -> dict | None:
+        """Device specific parameters, like the E-Board shutters and boards."""
+        return self._parameters
+
+    @property
+    def tags(self) -> set[str]:
+        """Device tags, used by the fleet commands selectors."""
+        return self._tags
+
     @property
     def hash(self) -> int:
         """Return device HASH."""
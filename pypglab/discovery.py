@@ -0,0 +1,110 @@
+"""Discovery pipeline for pypglab"""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable, Coroutine
+from typing import Any
+
+from . import codec
+from .const import CONFIG_ID, LOGGER
+
+# configure a device from a discovery message
+Configure_Device = Callable[[dict], Coroutine[Any, Any, Any]]
+
+
+class DiscoveryPipeline:
+    """Configure the discovered devices in the background, one at a time.
+
+    The discovery payloads are queued and deduplicated by device id: a device
+    discovered again before its configuration started is configured only once
+    with the latest message. The worker yields to the event loop after every
+    device, so the other messages are dispatched during a discovery burst.
+    """
+
+    def __init__(self, configure: Configure_Device) -> None:
+        """Initialize"""
+        self._configure = configure
+
+        # latest discovery message of the devices waiting to be configured
+        self._pending: dict[Any, dict] = {}
+
+        # the devices in configuration
+        self._active: set = set()
+
+        self._queue: asyncio.Queue = None
+        self._task: asyncio.Task = None
+
+    def start(self) -> None:
+        """Start the worker, to be called in the event loop"""
+        if self._task is not None:
+            return
+
+        self._queue = asyncio.Queue()
+        for key in self._pending:
+            if key not in self._active:
+                self._queue.put_nowait(key)
+
+        self._task = asyncio.get_running_loop().create_task(self._worker())
+
+    async def stop(self) -> None:
+        """Stop the worker, the devices not configured yet are kept for the next start"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+        self._task = None
+        self._active.clear()
+
+    def put(self, payload: bytes | str) -> None:
+        """Queue a discovery message, to be called in the event loop"""
+        try:
+            discovery_msg = codec.loads(payload)
+        except ValueError as e:
+            LOGGER.warning("Invalid discovery message (%s)", e)
+            return
+
+        key = discovery_msg.get(CONFIG_ID) if isinstance(discovery_msg, dict) else None
+        if key is None:
+            # not possible to deduplicate, the configuration reports the error
+            key = object()
+        elif not isinstance(key, str):
+            key = str(key)
+
+        queued = key in self._pending or key in self._active
+        self._pending[key] = discovery_msg
+
+        if not queued and self._queue is not None:
+            self._queue.put_nowait(key)
+
+    async def join(self) -> None:
+        """Wait until all the queued devices are configured"""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def _worker(self) -> None:
+        while True:
+            key = await self._queue.get()
+            discovery_msg = self._pending.pop(key)
+            self._active.add(key)
+
+            try:
+                await self._configure(discovery_msg)
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.exception("Error during the device configuration")
+            finally:
+                self._active.discard(key)
+
+                # a new message of the same device arrived during the configuration
+                if key in self._pending:
+                    self._queue.put_nowait(key)
+
+                self._queue.task_done()
+
+            # let the event loop dispatch the other messages
+            await asyncio.sleep(0)
+
+    @property
+    def pending(self) -> int:
+        """Return the number of devices waiting to be configured"""
+        return len(self._pending)
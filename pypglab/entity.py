@@ -1,17 +1,55 @@
 """A base class entity for pypglab"""
 
+from __future__ import annotations
+
 import asyncio
+import time
 from collections.abc import Callable
+from typing import Union
 
-from .const import ENTITY_SENSOR, ENTITY_TOPIC, TOPIC_PGLAB
+from .const import COMMAND_RETRIES, COMMAND_TIMEOUT, ENTITY_SENSOR, ENTITY_TOPIC, LOGGER, TOPIC_PGLAB
+from .events import EventHub, StateEvent
+from .loop import resolve_future
 from .mqtt import Client
+from .scheduler import CommandScheduler
 
 State_Update = Callable[[str], None]
 
+# a MQTT payload, as received or given as text
+Payload = Union[bytes, str]
+
+
+def entity_topic(device_name: str, entity_type: str, entity_id: int, cmd: str) -> str:
+    """Return the topic of an entity command"""
+    if entity_type is ENTITY_SENSOR:
+        return f"{TOPIC_PGLAB}/{device_name}/{entity_type}/{cmd}"
+    return f"{TOPIC_PGLAB}/{device_name}/{entity_type}/{entity_id}/{cmd}"
+
+
+def payload_text(payload: Payload) -> str:
+    """Return the payload decoded, a text payload is returned as is"""
+    return payload if isinstance(payload, str) else str(payload, "utf-8")
+
 
 class Entity:
     """Base class for PG LAB entities"""
 
+    __slots__ = (
+        "_device_id",
+        "_device_name",
+        "_id",
+        "_type",
+        "_mqtt",
+        "_scheduler",
+        "_on_state_update_callback",
+        "_raw_callback",
+        "_set_topic",
+        "_hash",
+        "_waiters",
+        "_latency",
+        "_events",
+    )
+
     # define a global id incremented for every instance
     entity_id: int = 0
 
@@ -22,6 +60,8 @@ class Entity:
         entity_id: int,
         entity_type: str,
         mqtt: Client,
+        scheduler: CommandScheduler | None = None,
+        set_topic: str | None = None,
     ) -> None:
         """Initialize"""
 
@@ -40,14 +80,27 @@ class Entity:
         # mqtt client interface
         self._mqtt = mqtt
 
-        # external status update callback
+        # limit the rate of the commands sent to the device
+        self._scheduler = scheduler
+
+        # external status update callback, given the payload as received when raw
         self._on_state_update_callback: State_Update = None
+        self._raw_callback = False
+
+        # topic used for change entity status, computed only once for the commands
+        set_cmd, state_cmd = ENTITY_TOPIC[entity_type]
+        if set_topic is None and set_cmd:
+            set_topic = entity_topic(device_name, entity_type, entity_id, set_cmd)
+        self._set_topic = set_topic
 
-        # topic used for change entity status
-        if entity_type is ENTITY_SENSOR:
-            self._topic = f"{TOPIC_PGLAB}/{self._device_name}/{entity_type}/"
-        else:
-            self._topic = f"{TOPIC_PGLAB}/{self._device_name}/{entity_type}/{self._id}/"
+        # commands waiting for the confirmation, created on the first confirmed command
+        self._waiters: list[tuple[bytes, asyncio.Future]] | None = None
+
+        # round trip time of the last confirmed command
+        self._latency: float | None = None
+
+        # the state events of the device
+        self._events: EventHub | None = None
 
         # entity hash, it's a uniquie entity identifier
         self._hash: int = hash(
@@ -57,42 +110,147 @@ class Entity:
         # increment the global entity id
         Entity.entity_id = Entity.entity_id + 1
 
-    def status_change_received(self, payload: str) -> None:
-        """Call to notify a new status change, to be overwritten by child class"""
+    def status_change_received(self, payload: Payload) -> bool | None:
+        """Call to notify a new status change, to be overwritten by child class.
+
+        The payload is the bytes received, or text when the state is restored.
+        Return false if the state didn't change, the callback and the state
+        events are not notified.
+        """
+
+    def confirms(self, command: bytes, payload: bytes) -> bool:
+        """Return true if the state payload confirms the command, to be overwritten by child class"""
+        return payload == command
+
+    def _confirm_commands(self, payload: Payload) -> None:
+        """Wake up the commands confirmed by the state payload"""
+        received = time.perf_counter()
+        if isinstance(payload, str):
+            payload = payload.encode()
+        for command, future in list(self._waiters):
+            if self.confirms(command, payload):
+                resolve_future(future, received)
 
-    def set_on_state_callback(self, on_state_update: State_Update) -> None:
-        """Set a callback to inform about new state"""
+    def set_on_state_callback(self, on_state_update: State_Update, raw: bool = False) -> None:
+        """Set a callback to inform about new state, with raw it's given the payload bytes not decoded"""
         self._on_state_update_callback = on_state_update
+        self._raw_callback = raw
+
+    def set_event_hub(self, events: EventHub | None) -> None:
+        """Set the hub receiving the state events"""
+        self._events = events
 
     async def subscribe_topics(self) -> None:
         """PG LAB Entity subscribe to mqtt relay status changing"""
 
         def on_message(topic, payload) -> None:
-            self.status_change_received(payload)
+            changed = self.status_change_received(payload)
 
-            if self._on_state_update_callback:
-                self._on_state_update_callback(payload)
+            if self._waiters:
+                self._confirm_commands(payload)
 
-        set_cmd, state_cmd = ENTITY_TOPIC[self._type]
-        status_update_topic = self._topic + state_cmd
-        await self._mqtt.subscribe(self._hash, status_update_topic, on_message)
+            if changed is not False:
+                self._notify_state(payload)
+
+        await self._mqtt.subscribe(self._hash, self.state_topic, on_message)
+
+    def _notify_state(self, payload: Payload) -> None:
+        """Notify the state payload to the callback and to the state events"""
+        # the payload is decoded only once, and only when the callback or the events want the text
+        text = None
+        callback = self._on_state_update_callback
+        if callback is not None:
+            if self._raw_callback:
+                callback(payload)
+            else:
+                text = payload_text(payload)
+                callback(text)
+
+        events = self._events
+        if events is not None and events.active:
+            if text is None:
+                text = payload_text(payload)
+            events.publish(StateEvent(self._device_name, self, text))
 
     async def unsubscribe_topics(self) -> None:
         """Unsubscribe from all MQTT topics"""
+        await self._mqtt.unsubscribe(self._hash, self.state_topic)
 
-        set_cmd, state_cmd = ENTITY_TOPIC[self._type]
-        status_update_topic = self._topic + state_cmd
-        await self._mqtt.unsubscribe(self._hash, status_update_topic)
+    async def _send(self, payload: str, waiter: tuple[bytes, asyncio.Future] | None = None) -> float:
+        """Send a command when the device is ready to accept it, return the time it was sent.
 
-    async def set_state(self, payload: str) -> None:
-        """Change the entity state"""
-        set_cmd, state_cmd = ENTITY_TOPIC[self._type]
+        The waiter of a confirmed command is added only when the command is
+        sent, the states received while waiting for the device are not its
+        confirmation.
+        """
+        if self._scheduler:
+            await self._scheduler.acquire()
+
+        if waiter is not None:
+            self._waiters.append(waiter)
+        sent = time.perf_counter()
+        await self._mqtt.publish(self._set_topic, payload)
+        return sent
+
+    async def set_state(
+        self,
+        payload: str,
+        confirm: bool = False,
+        timeout: float = COMMAND_TIMEOUT,
+        retries: int = COMMAND_RETRIES,
+    ) -> bool:
+        """Change the entity state.
+
+        With confirm, wait until the device publishes the state confirming the
+        command. The command is sent again up to retries times when it is not
+        confirmed within timeout seconds. Return false if the command was not
+        sent or not confirmed.
+        """
         # check if the entity allows to change status
-        if set_cmd:
-            topic = self._topic + set_cmd
-            await self._mqtt.publish(topic, payload)
-            # add a small delay to allows the device to process the message
-            await asyncio.sleep(0.001)
+        if not self._set_topic:
+            return False
+
+        if not confirm:
+            await self._send(payload)
+            return True
+
+        if self._waiters is None:
+            self._waiters = []
+
+        # the states received are compared with the command without decoding them
+        command = payload.encode()
+        loop = asyncio.get_running_loop()
+        for attempt in range(retries + 1):
+            waiter = (command, loop.create_future())
+            try:
+                sent = await self._send(payload, waiter)
+                received = await asyncio.wait_for(waiter[1], timeout)
+                self._latency = received - sent
+                return True
+            except asyncio.TimeoutError:
+                LOGGER.debug("Command %s to %s not confirmed, attempt %s", payload, self._set_topic, attempt + 1)
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
+        LOGGER.warning("Command %s to %s not confirmed after %s attempts", payload, self._set_topic, retries + 1)
+        return False
+
+    @property
+    def set_topic(self) -> str | None:
+        """Return the topic to change the entity state, None for read only entities"""
+        return self._set_topic
+
+    @property
+    def state_topic(self) -> str:
+        """Return the topic with the entity state updates"""
+        set_cmd, state_cmd = ENTITY_TOPIC[self._type]
+        return entity_topic(self._device_name, self._type, self._id, state_cmd)
+
+    @property
+    def latency(self) -> float | None:
+        """Return the round trip time in seconds of the last confirmed command"""
+        return self._latency
 
     @property
     def hash(self) -> int:
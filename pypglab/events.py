@@ -0,0 +1,190 @@
+"""State change event streams for pypglab"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from collections.abc import Callable
+from typing import Any
+
+from .loop import call_in_loop
+
+# overflow policy of a full event stream
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_COALESCE_LATEST = "coalesce_latest"
+
+# default number of events buffered by a stream
+EVENT_STREAM_SIZE = 256
+
+Event_Filter = Callable[["StateEvent"], bool]
+
+
+class StateEvent:
+    """A state received for an entity"""
+
+    __slots__ = ("device_name", "entity", "payload", "timestamp")
+
+    def __init__(self, device_name: str, entity: Any, payload: str) -> None:
+        """Initialize"""
+        self.device_name = device_name
+        self.entity = entity
+        self.payload = payload
+        self.timestamp = time.monotonic()
+
+    def __repr__(self) -> str:
+        return f"StateEvent({self.device_name}, {self.entity.state_topic}, {self.payload!r})"
+
+
+class EventStream:
+    """An async iterator over the state events with a bounded buffer.
+
+    When the consumer is slower than the events, drop_oldest discards the
+    oldest buffered event, coalesce_latest keeps only the latest event of
+    every entity and discards the least recently updated one when full.
+    The events can be published from any thread, they are consumed in the
+    event loop the stream was created in.
+    """
+
+    def __init__(
+        self,
+        hub: EventHub,
+        maxsize: int = EVENT_STREAM_SIZE,
+        overflow: str = OVERFLOW_DROP_OLDEST,
+        filter: Event_Filter | None = None,
+    ) -> None:
+        """Initialize"""
+        if maxsize < 1:
+            raise ValueError("Event stream size must be at least one")
+        if overflow not in (OVERFLOW_DROP_OLDEST, OVERFLOW_COALESCE_LATEST):
+            raise ValueError(f"Unknown event stream overflow policy {overflow}")
+
+        self._hub = hub
+        self._loop = asyncio.get_running_loop()
+        self._maxsize = maxsize
+        self._filter = filter
+        self._coalesce = overflow == OVERFLOW_COALESCE_LATEST
+
+        # pending events, the coalesced ones by entity hash
+        self._events: deque[StateEvent] | dict[int, StateEvent] = {} if self._coalesce else deque(maxlen=maxsize)
+
+        self._waiter: asyncio.Future | None = None
+        self._closed = False
+        self._dropped = 0
+
+        hub.add_stream(self)
+
+    def put(self, event: StateEvent) -> None:
+        """Add an event, from any thread"""
+        if self._filter is not None and not self._filter(event):
+            return
+
+        call_in_loop(self._loop, self._put, event)
+
+    def _put(self, event: StateEvent) -> None:
+        if self._closed:
+            return
+
+        events = self._events
+        if self._coalesce:
+            # the latest event of an entity moves to the end of the queue
+            key = event.entity.hash
+            if key in events:
+                del events[key]
+                self._dropped += 1
+            elif len(events) >= self._maxsize:
+                del events[next(iter(events))]
+                self._dropped += 1
+            events[key] = event
+        else:
+            if len(events) == self._maxsize:
+                self._dropped += 1
+            events.append(event)
+
+        self._wake_up()
+
+    def _wake_up(self) -> None:
+        waiter = self._waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    def _pop(self) -> StateEvent:
+        if self._coalesce:
+            return self._events.pop(next(iter(self._events)))
+        return self._events.popleft()
+
+    def __aiter__(self) -> EventStream:
+        return self
+
+    async def __anext__(self) -> StateEvent:
+        while not self._events:
+            if self._closed:
+                raise StopAsyncIteration
+            self._waiter = self._loop.create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+        return self._pop()
+
+    def close(self) -> None:
+        """Stop receiving events, the iteration ends after the buffered events"""
+        if not self._closed:
+            self._closed = True
+            self._hub.remove_stream(self)
+            self._wake_up()
+
+    async def __aenter__(self) -> EventStream:
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    @property
+    def dropped(self) -> int:
+        """Return the number of events dropped or coalesced because the stream was full"""
+        return self._dropped
+
+    @property
+    def pending(self) -> int:
+        """Return the number of buffered events"""
+        return len(self._events)
+
+
+class EventHub:
+    """Deliver the state events to all the open streams and to the parent hub"""
+
+    __slots__ = ("_streams", "_parent")
+
+    def __init__(self, parent: EventHub | None = None) -> None:
+        """Initialize"""
+        self._streams: list[EventStream] = []
+        self._parent = parent
+
+    @property
+    def active(self) -> bool:
+        """Return true if some stream is receiving the events"""
+        return bool(self._streams) or (self._parent is not None and self._parent.active)
+
+    def publish(self, event: StateEvent) -> None:
+        """Deliver an event to all streams"""
+        for stream in self._streams:
+            stream.put(event)
+        if self._parent is not None:
+            self._parent.publish(event)
+
+    def stream(
+        self,
+        maxsize: int = EVENT_STREAM_SIZE,
+        overflow: str = OVERFLOW_DROP_OLDEST,
+        filter: Event_Filter | None = None,
+    ) -> EventStream:
+        """Return a new stream of the events, to be called in the consumer event loop"""
+        return EventStream(self, maxsize, overflow, filter)
+
+    def add_stream(self, stream: EventStream) -> None:
+        # copy on write, the events can be published from another thread
+        self._streams = [*self._streams, stream]
+
+    def remove_stream(self, stream: EventStream) -> None:
+        self._streams = [item for item in self._streams if item is not stream]
@@ -0,0 +1,295 @@
+"""Fleet wide commands for pypglab"""
+
+from __future__ import annotations
+
+import asyncio
+import fnmatch
+import re
+import time
+from collections.abc import Iterable
+
+from .const import (
+    COMMAND_RETRIES,
+    COMMAND_TIMEOUT,
+    ENTITY_RELAY,
+    ENTITY_SHUTTER,
+    LOGGER,
+    RELAY_STATE_OFF,
+    RELAY_STATE_ON,
+    SHUTTER_CMD_CLOSE,
+    SHUTTER_CMD_OPEN,
+    SHUTTER_CMD_STOP,
+)
+from .device import Device
+from .entity import Entity
+from .sensor import numpy
+
+# the commands accepted by every entity type
+FLEET_COMMANDS = {
+    ENTITY_RELAY: (RELAY_STATE_ON, RELAY_STATE_OFF),
+    ENTITY_SHUTTER: (SHUTTER_CMD_OPEN, SHUTTER_CMD_CLOSE, SHUTTER_CMD_STOP),
+}
+
+
+class Selector:
+    """Select the entities of a type in the devices matching all the criteria.
+
+    device_type is the device type name (E-BOARD, E-RELAY...), name a shell
+    pattern of the device name like "E-BOARD-1*", tags the tags every device
+    must have and indexes the entity indexes. A criterion not given matches
+    all devices.
+    """
+
+    __slots__ = ("_entity_type", "_device_type", "_name", "_tags", "_indexes")
+
+    def __init__(
+        self,
+        entity_type: str = ENTITY_RELAY,
+        device_type: str | None = None,
+        name: str | None = None,
+        tags: Iterable[str] = (),
+        indexes: Iterable[int] | None = None,
+    ) -> None:
+        """Initialize"""
+        if entity_type not in FLEET_COMMANDS:
+            raise ValueError(f"Entity type {entity_type} can't be commanded")
+
+        self._entity_type = entity_type
+        self._device_type = device_type
+        self._name = re.compile(fnmatch.translate(name)).match if name is not None else None
+        self._tags = frozenset(tags)
+        self._indexes = frozenset(indexes) if indexes is not None else None
+
+    def match(self, device: Device) -> bool:
+        """Return true if the device is selected"""
+        if self._device_type is not None and device.type != self._device_type:
+            return False
+        if self._name is not None and not self._name(device.name):
+            return False
+        return self._tags <= device.tags
+
+    def entities(self, device: Device) -> list[Entity]:
+        """Return the selected entities of a device"""
+        entities = device.relays if self._entity_type == ENTITY_RELAY else device.shutters
+        if self._indexes is None:
+            return list(entities)
+        return [entity for entity in entities if entity.id in self._indexes]
+
+    def select(self, devices: Iterable[Device]) -> list[tuple[Device, Entity]]:
+        """Return the selected entities of all devices with their device"""
+        return [
+            (device, entity)
+            for device in devices
+            if self.match(device)
+            for entity in self.entities(device)
+        ]
+
+    @property
+    def entity_type(self) -> str:
+        """Get the type of the selected entities"""
+        return self._entity_type
+
+
+class BroadcastResult:
+    """The outcome of a command sent to many entities"""
+
+    __slots__ = ("_command", "_results", "_elapsed")
+
+    def __init__(self, command: str, results: list[tuple[Device, Entity, bool]], elapsed: float) -> None:
+        """Initialize"""
+        self._command = command
+        self._results = results
+        self._elapsed = elapsed
+
+    def __bool__(self) -> bool:
+        """Return true if the command succeeded for all entities"""
+        return all(ok for _, _, ok in self._results)
+
+    def __len__(self) -> int:
+        """Return the number of entities commanded"""
+        return len(self._results)
+
+    def __repr__(self) -> str:
+        return (
+            f"BroadcastResult({self._command}, {len(self.succeeded)}/{len(self._results)} succeeded, "
+            f"{self._elapsed * 1000:.1f} ms)"
+        )
+
+    @property
+    def command(self) -> str:
+        """Get the command sent"""
+        return self._command
+
+    @property
+    def results(self) -> list[tuple[Device, Entity, bool]]:
+        """Get the result of every entity, sent or confirmed with confirm"""
+        return self._results
+
+    @property
+    def succeeded(self) -> list[tuple[Device, Entity]]:
+        """Get the entities the command succeeded for"""
+        return [(device, entity) for device, entity, ok in self._results if ok]
+
+    @property
+    def failed(self) -> list[tuple[Device, Entity]]:
+        """Get the entities the command failed for"""
+        return [(device, entity) for device, entity, ok in self._results if not ok]
+
+    @property
+    def elapsed(self) -> float:
+        """Get the seconds from the first command sent to the last result"""
+        return self._elapsed
+
+
+async def broadcast_command(
+    devices: Iterable[Device],
+    selector: Selector,
+    command: str,
+    confirm: bool = False,
+    timeout: float = COMMAND_TIMEOUT,
+    retries: int = COMMAND_RETRIES,
+) -> BroadcastResult:
+    """Send a command to all the selected entities.
+
+    The commands of all devices are sent concurrently, the commands of a
+    device are released by its scheduler as fast as the device accepts them.
+    With confirm every result tells if the device confirmed the command.
+    """
+    if command not in FLEET_COMMANDS[selector.entity_type]:
+        raise ValueError(f"Command {command} not valid for {selector.entity_type}")
+
+    selected = selector.select(devices)
+
+    start = time.perf_counter()
+    outcomes = await asyncio.gather(
+        *(entity.set_state(command, confirm, timeout, retries) for _, entity in selected),
+        return_exceptions=True,
+    )
+    elapsed = time.perf_counter() - start
+
+    results = []
+    for (device, entity), outcome in zip(selected, outcomes):
+        if isinstance(outcome, BaseException):
+            LOGGER.warning("Command %s to %s failed (%s)", command, entity.set_topic, outcome)
+            outcome = False
+        results.append((device, entity, outcome))
+
+    return BroadcastResult(command, results, elapsed)
+
+
+class SensorStatistics:
+    """The statistics of a sensor type across many devices"""
+
+    __slots__ = ("_sensor_type", "_min", "_max", "_mean", "_samples", "_devices", "_min_device", "_max_device")
+
+    def __init__(
+        self,
+        sensor_type: str,
+        minimum: float | None = None,
+        maximum: float | None = None,
+        mean: float | None = None,
+        samples: int = 0,
+        devices: int = 0,
+        min_device: Device | None = None,
+        max_device: Device | None = None,
+    ) -> None:
+        """Initialize"""
+        self._sensor_type = sensor_type
+        self._min = minimum
+        self._max = maximum
+        self._mean = mean
+        self._samples = samples
+        self._devices = devices
+        self._min_device = min_device
+        self._max_device = max_device
+
+    def __repr__(self) -> str:
+        return (
+            f"SensorStatistics({self._sensor_type}, min={self._min}, max={self._max}, mean={self._mean}, "
+            f"{self._samples} samples of {self._devices} devices)"
+        )
+
+    @property
+    def sensor_type(self) -> str:
+        """Get the sensor type"""
+        return self._sensor_type
+
+    @property
+    def min(self) -> float | None:
+        """Get the minimum value of all devices, None without values"""
+        return self._min
+
+    @property
+    def max(self) -> float | None:
+        """Get the maximum value of all devices, None without values"""
+        return self._max
+
+    @property
+    def mean(self) -> float | None:
+        """Get the mean of all the values, None without values"""
+        return self._mean
+
+    @property
+    def samples(self) -> int:
+        """Get the number of values used"""
+        return self._samples
+
+    @property
+    def devices(self) -> int:
+        """Get the number of devices with values"""
+        return self._devices
+
+    @property
+    def min_device(self) -> Device | None:
+        """Get the device with the minimum value"""
+        return self._min_device
+
+    @property
+    def max_device(self) -> Device | None:
+        """Get the device with the maximum value"""
+        return self._max_device
+
+
+def aggregate_sensors(
+    devices: Iterable[Device],
+    sensor_type: str,
+    window: float | None = None,
+    selector: Selector | None = None,
+) -> SensorStatistics:
+    """Return the statistics of a sensor type from the history of all devices.
+
+    Only the values of the last window seconds are used, if given, and only
+    the devices matching the selector. The devices without sensor history are
+    skipped.
+    """
+    statistics = SensorStatistics(sensor_type)
+    total = 0.0
+
+    for device in devices:
+        if selector is not None and not selector.match(device):
+            continue
+        sensor = device.status_sensor
+        history = sensor.history(sensor_type) if sensor is not None else None
+        if history is None:
+            continue
+
+        _, values = history.samples(window)
+        count = len(values)
+        if not count:
+            continue
+
+        if numpy is not None:
+            minimum, maximum, total = float(values.min()), float(values.max()), total + float(values.sum())
+        else:
+            minimum, maximum, total = min(values), max(values), total + sum(values)
+
+        if statistics._min is None or minimum < statistics._min:
+            statistics._min, statistics._min_device = minimum, device
+        if statistics._max is None or maximum > statistics._max:
+            statistics._max, statistics._max_device = maximum, device
+        statistics._samples += count
+        statistics._devices += 1
+
+    if statistics._samples:
+        statistics._mean = total / statistics._samples
+    return statistics
@@ -1,22 +1,307 @@
 """Helper to find pglab device"""
 
+from __future__ import annotations
+
 import asyncio
+import threading
 import time
+import zlib
 import paho.mqtt.client as mqtt
 import paho.mqtt.subscribe as subscribe
-import json
 
-from .const import PGLAB_DISCOVERY_TOPIC
+from .cache import DeviceCache, restore_states
+from .const import COMMAND_RETRIES, COMMAND_TIMEOUT, CONFIG_ID, CONFIG_NAME, LOGGER, PGLAB_DISCOVERY_TOPIC, TOPIC_PGLAB
 from .device import Device
-from .mqtt import Client, Subscribe_CallBack, Sub_State
+from .discovery import DiscoveryPipeline
+from .events import EVENT_STREAM_SIZE, OVERFLOW_DROP_OLDEST, Event_Filter, EventHub, EventStream
+from .fleet import BroadcastResult, Selector, SensorStatistics, aggregate_sensors, broadcast_command
+from .loop import call_in_loop
+from .metrics import Metrics
+from .mqtt import Client, OfflineQueue, Subscribe_CallBack, Sub_State
+from .registry import DeviceRegistry
+from .router import TopicRouter
+
+
+def _broker_topic(topic: str) -> str:
+    """ return the broker subscription covering the topic, one for the entity states of every PG LAB device
+
+    The set topics are not covered, so the commands published are not received back.
+    """
+    levels = topic.split("/")
+    if len(levels) == 5 and levels[0] == TOPIC_PGLAB and levels[4] == "state":
+        return f"{levels[0]}/{levels[1]}/+/+/state"
+    return topic
+
+
+def shard_index(device_name: str, shards: int) -> int:
+    """ return the shard of a device, always the same for a device name """
+    return zlib.crc32(device_name.encode("utf-8")) % shards
+
+
+class _BasePgLab():
+    """ MQTT subscriptions and message dispatching shared by the pyPgLab helpers """
+
+    def __init__(
+        self,
+        mqtt_client = None,
+        metrics: Metrics | None = None,
+        cache = None,
+        registry: DeviceRegistry | None = None,
+        events: EventHub | None = None,
+        shard: tuple[int, int] | None = None,
+        sensor_history: int = 0,
+    ):
+        # the registry can be shared by many helpers, one for every shard of the devices
+        self._registry = registry if registry is not None else DeviceRegistry()
+
+        # (index, number of shards), only the devices of this shard are configured
+        if shard is not None and not 0 <= shard[0] < shard[1]:
+            raise ValueError(f"Shard {shard[0]} not in range of {shard[1]} shards")
+        self._shard = shard
+
+        # the number of sensor values stored for every device, disabled when zero
+        self._sensor_history = sensor_history
+
+        # the devices configured are stored in the cache file, if given
+        self._cache = DeviceCache(cache) if cache is not None else None
+
+        # a paho compatible client can be given, like the simulator one
+        if mqtt_client is None:
+            mqtt_client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+        self._mqtt_client = mqtt_client
+
+        # route the received messages to the subscribed callbacks
+        self._router = TopicRouter()
+        self._router.add(PGLAB_DISCOVERY_TOPIC + "/#", self._on_discovery)
+
+        # broker subscriptions with the number of topics routed through them
+        self._broker_topics: dict[str, int] = {}
+
+        # a single client interface shared by all devices
+        self._client = Client(self._publish, self._subscribe, self._unsubscribe)
+
+        # the commands published while the broker connection is down
+        self._offline = OfflineQueue()
+
+        # the state events of all devices, forwarded to the events hub if given
+        self._events = EventHub(events)
+
+        # the discovered devices are configured in the background
+        self._discovery = DiscoveryPipeline(self._configure_device)
+
+        # the instrumentation is disabled without metrics
+        self._metrics = metrics
+        if metrics is not None:
+            metrics.add_gauge("devices", "Devices discovered", lambda: len(self._registry))
+            metrics.add_gauge("discovery_pending", "Devices waiting to be configured", lambda: self._discovery.pending)
+            metrics.add_gauge(
+                "commands_queued",
+                "Commands waiting for the device rate limit",
+                lambda: sum(device.scheduler.queued for device in self._registry),
+            )
+            metrics.add_gauge("commands_offline", "Commands waiting for the broker connection", lambda: len(self._offline))
+
+    def _on_discovery(self, topic: str, payload: bytes) -> None:
+        """ callback for a PG LAB device discovery message, to be overwritten by child class """
+
+    def _restore_session(self) -> None:
+        """ subscribe all the topics again with a single request and send the commands queued while offline """
+        topics = [PGLAB_DISCOVERY_TOPIC + "/#", *self._broker_topics]
+        self._mqtt_client.subscribe([(topic, 0) for topic in topics])
+
+        for topic, payload, qos, retain in self._offline.drain():
+            self._mqtt_client.publish(topic, payload, qos, retain)
+            if self._metrics is not None:
+                self._metrics.message_published(topic)
+
+    def _in_shard(self, config: dict) -> bool:
+        """ return true if the device of the discovery message belongs to this helper shard """
+        if self._shard is None:
+            return True
+        index, shards = self._shard
+        return shard_index(str(config.get(CONFIG_NAME)), shards) == index
+
+    async def _configure_device(self, discovery_msg: dict) -> Device | None:
+        """ create or update the PG LAB Electronics device from the discovery message and register it """
+        if isinstance(discovery_msg, dict) and not self._in_shard(discovery_msg):
+            return None
+
+        device_id = discovery_msg.get(CONFIG_ID) if isinstance(discovery_msg, dict) else None
+
+        # a device discovered again is reconfigured incrementally
+        device = self._registry.get(id=str(device_id)) if device_id is not None else None
+        if device is None:
+            device = Device(events=self._events, sensor_history=self._sensor_history)
+
+        metrics = self._metrics
+        if metrics is not None:
+            start = time.perf_counter()
+            valid = await device.config(self._client, discovery_msg, True)
+            metrics.device_configured(valid, time.perf_counter() - start)
+        else:
+            valid = await device.config(self._client, discovery_msg, True)
+
+        if not valid:
+            return None
+
+        self._registry.add(device)
+        return device
+
+    async def _restore_cache(self) -> int:
+        """ configure the devices stored in the cache, return the number of devices restored """
+        if self._cache is None:
+            return 0
+
+        restored = 0
+        for snapshot in self._cache.load():
+            if await self._restore_device(snapshot):
+                restored += 1
 
-class pyPgLab():
-    def __init__(self):
-        self._devices = []
-        self._subscribe_topic_callback = {}
-        self._mqtt_client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+        return restored
+
+    async def _restore_device(self, snapshot: dict) -> bool:
+        """ configure a cached device not registered yet and restore its states """
+        config = snapshot["config"]
+        if not self._in_shard(config) or self._registry.get(id=str(config.get(CONFIG_ID))) is not None:
+            return False
+
+        device = Device(events=self._events, sensor_history=self._sensor_history)
+        if not await device.config(self._client, config, True):
+            return False
+
+        restore_states(device, snapshot)
+        self._registry.add(device)
+        return True
+
+    def save_cache(self) -> None:
+        """ store the configured devices and their states in the cache file """
+        if self._cache is not None:
+            self._cache.save(self._registry)
+
+    def _dispatch(self, topic: str, payload: bytes) -> bool:
+        """ call all callbacks subscribed to the topic, return false if nobody is interested """
+        metrics = self._metrics
+        if metrics is None:
+            return self._route(topic, payload)
+
+        received = time.perf_counter()
+        routed = self._route(topic, payload)
+        metrics.message_received(topic, routed, received, time.perf_counter() - received)
+        return routed
+
+    def _route(self, topic: str, payload: bytes) -> bool:
+        handlers = self._router.match(topic)
+        if not handlers:
+            return False
+
+        # the payload bytes are passed through, they are decoded only when needed
+        for handler in handlers:
+            handler(topic, payload)
+
+        return True
+
+    async def _publish(self, topic: str, payload: str, qos: int | None = 0, retain: bool | None = False) -> None:
+        # without the connection only the latest command of every topic is kept, to be sent on reconnection
+        if not self._mqtt_client.is_connected():
+            self._offline.put(topic, payload, qos, retain)
+            return
+
+        info = self._mqtt_client.publish(topic, payload, qos, retain)
+        if info is not None and info.rc == mqtt.MQTT_ERR_NO_CONN:
+            self._offline.put(topic, payload, qos, retain)
+        elif self._metrics is not None:
+            # the round trip time starts when the command reaches the client, not the offline queue
+            self._metrics.message_published(topic)
+
+    async def _subscribe(self, sub_state: Sub_State, topic: str, callback_func: Subscribe_CallBack) -> Sub_State:
+        if sub_state:
+            # the same topic is subscribed again, just replace the callback
+            self._router.remove(sub_state["topic"], sub_state["callback"])
+        else:
+            # all the topics of a device are received with a single broker subscription
+            broker_topic = _broker_topic(topic)
+            count = self._broker_topics.get(broker_topic, 0)
+            if count == 0:
+                self._mqtt_client.subscribe(broker_topic)
+            self._broker_topics[broker_topic] = count + 1
+
+        self._router.add(topic, callback_func)
+        sub_state = { "topic": topic, "callback": callback_func}
+        return sub_state
+
+    async def _unsubscribe(self, sub_state: Sub_State):
+        topic = sub_state["topic"]
+        if not self._router.remove(topic, sub_state["callback"]):
+            return
+
+        broker_topic = _broker_topic(topic)
+        count = self._broker_topics[broker_topic] - 1
+        if count == 0:
+            self._mqtt_client.unsubscribe(broker_topic)
+            del self._broker_topics[broker_topic]
+        else:
+            self._broker_topics[broker_topic] = count
+
+    async def broadcast(
+        self,
+        selector: Selector,
+        command: str,
+        confirm: bool = False,
+        timeout: float = COMMAND_TIMEOUT,
+        retries: int = COMMAND_RETRIES,
+    ) -> BroadcastResult:
+        """ send a command to the entities of all the devices selected, concurrently across devices """
+        return await broadcast_command(self._registry, selector, command, confirm, timeout, retries)
+
+    def sensor_statistics(
+        self, sensor_type: str, window: float | None = None, selector: Selector | None = None
+    ) -> SensorStatistics:
+        """ return the statistics of a sensor type from the sensor history of all devices selected """
+        return aggregate_sensors(self._registry, sensor_type, window, selector)
+
+    def events(
+        self,
+        maxsize: int = EVENT_STREAM_SIZE,
+        overflow: str = OVERFLOW_DROP_OLDEST,
+        filter: Event_Filter | None = None,
+    ) -> EventStream:
+        """ return a stream of the state events of all devices, filter selects the events """
+        return self._events.stream(maxsize, overflow, filter)
+
+    @property
+    def devices(self):
+        """Get the device array."""
+        return list(self._registry)
+
+    @property
+    def registry(self) -> DeviceRegistry:
+        """Get the registry of the discovered devices."""
+        return self._registry
+
+    @property
+    def offline_queue(self) -> OfflineQueue:
+        """Get the commands waiting for the broker connection."""
+        return self._offline
+
+    @property
+    def metrics(self) -> Metrics | None:
+        """Get the metrics, None if the instrumentation is disabled."""
+        return self._metrics
+
+
+class pyPgLab(_BasePgLab):
+    def __init__(
+        self,
+        mqtt_client = None,
+        metrics: Metrics | None = None,
+        cache = None,
+        sensor_history: int = 0,
+    ):
+        super().__init__(mqtt_client, metrics, cache, sensor_history=sensor_history)
+        self._loop: asyncio.AbstractEventLoop = None
+        self._loop_thread: threading.Thread = None
         self._mqtt_client.on_message = pyPgLab.on_mqtt_message
-        self._mqtt_client.on_connect = pyPgLab.on_mqtt_connect        
+        self._mqtt_client.on_connect = pyPgLab.on_mqtt_connect
         self._mqtt_client.user_data_set(self)
         self._mqtt_server_host = ''
         self._mqtt_server_port = 0
@@ -28,75 +313,349 @@ class pyPgLab():
 
         # Subscribing in on_connect() means that if we lose the connection and
         # reconnect then subscriptions will be renewed.
-        client.subscribe(PGLAB_DISCOVERY_TOPIC + "/#")
+        userdata._restore_session()
 
     def on_mqtt_message(client, userdata, msg):
-        """ callback from mqtt client when a new message is been received """   
-
-        async def publish( topic: str, payload: str, qos: int | None = 0, retain: bool | None = False) -> None:
-            client.publish(topic, payload, qos, retain)
-
-        async def subscribe(sub_state: Sub_State, topic: str, callback_func: Subscribe_CallBack) -> Sub_State:
-            userdata._subscribe_topic_callback[topic] = callback_func
-            client.subscribe(topic)
-            sub_state = { "topic": topic, "callback": callback_func}
-            return sub_state
+        """ callback from mqtt client when a new message is been received """
+        userdata._dispatch(msg.topic, msg.payload)
 
-        async def unsubscribe(sub_state: Sub_State):
-            topic = sub_state["topic"]            
-            client.unsubscribe(topic)
-            del userdata._subscribe_topic_callback[topic]
-
-        # check if there is a callback to call for the received message
-        if msg.topic in userdata._subscribe_topic_callback:
-            callback  =  userdata._subscribe_topic_callback[msg.topic]
-            callback(msg.topic, msg.payload.decode("utf-8"))
-            return None                
-
-        # check if the message is a discovery of a new PG LAB device
-        if msg.topic.startswith(PGLAB_DISCOVERY_TOPIC):
-            discovery_msg = json.loads(msg.payload)
-
-            # create the PG LAB Electronics device
-            device = Device()
-            asyncio.run( device.config(Client(publish, subscribe, unsubscribe), discovery_msg, True) )
-            userdata._devices.append(device)
+    def _on_discovery(self, topic, payload):
+        """ queue the discovery message, the devices are configured in the discovery thread """
+        self._loop.call_soon_threadsafe(self._discovery.put, payload)
 
     def start(self, host, port = 1883, username = '', password = ''):
         """ start the client loop with mqtt broker """
         self._mqtt_server_host = host
         self._mqtt_server_port = port
         self._mqtt_server_username = username
-        self._mqtt_server_password = password        
+        self._mqtt_server_password = password
+
+        # configure the devices out of the paho thread, so the state messages keep flowing
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            self._loop_thread = threading.Thread(target=self._loop.run_forever, name="pypglab-discovery", daemon=True)
+            self._loop_thread.start()
+            self._loop.call_soon_threadsafe(self._discovery.start)
+
         self._mqtt_client.loop_start()
 
     def connect(self):
-        """ connect to the mqtt broker """        
+        """ connect to the mqtt broker """
         self._mqtt_client.username_pw_set(self._mqtt_server_username, self._mqtt_server_password)
         self._mqtt_client.connect(self._mqtt_server_host, self._mqtt_server_port, 60)
 
+        # the cached devices are usable before their discovery messages are received
+        if self._cache is not None:
+            asyncio.run_coroutine_threadsafe(self._restore_cache(), self._loop).result()
+
     def stop(self):
         """ stop the client loop with mqtt broker """
         self._mqtt_client.loop_stop()
+        self.save_cache()
+
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self._discovery.stop(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop_thread.join()
+            self._loop.close()
+            self._loop = None
+            self._loop_thread = None
+
+    def wait_discovery(self, timeout = None):
+        """ wait until all the received discovery messages are processed """
+        asyncio.run_coroutine_threadsafe(self._discovery.join(), self._loop).result(timeout)
 
     def get_device_by_name(self, name, timeout = 2):
-        """ get a pg lab device by the name """
-        start = time.time()
+        """ get a pg lab device by the name, wait up to timeout seconds for its discovery """
+        return self._registry.wait(name=name, timeout=timeout)
+
+
+class AsyncPgLab(_BasePgLab):
+    """Asyncio native helper to discover and control PG LAB Electronics devices.
+
+    The MQTT socket is driven by the running event loop instead of the paho
+    network thread: received messages are dispatched in the loop and the
+    devices are configured one at a time by a background discovery worker,
+    so no event loop is created for each message.
+    """
+
+    def __init__(
+        self,
+        mqtt_client = None,
+        metrics: Metrics | None = None,
+        cache = None,
+        registry: DeviceRegistry | None = None,
+        events: EventHub | None = None,
+        shard: tuple[int, int] | None = None,
+        sensor_history: int = 0,
+    ):
+        super().__init__(mqtt_client, metrics, cache, registry, events, shard, sensor_history)
+        self._loop: asyncio.AbstractEventLoop = None
+        self._connected: asyncio.Event = None
+        self._misc_task: asyncio.Task = None
+        self._stopping = False
+        self._mqtt_client.on_message = self._on_mqtt_message
+        self._mqtt_client.on_connect = self._on_mqtt_connect
+        self._mqtt_client.on_disconnect = self._on_mqtt_disconnect
+        self._mqtt_client.on_socket_open = self._on_socket_open
+        self._mqtt_client.on_socket_close = self._on_socket_close
+        self._mqtt_client.on_socket_register_write = self._on_socket_register_write
+        self._mqtt_client.on_socket_unregister_write = self._on_socket_unregister_write
+
+    def _on_socket_open(self, client, userdata, sock):
+        call_in_loop(self._loop, self._loop.add_reader, sock, client.loop_read)
+
+    def _on_socket_close(self, client, userdata, sock):
+        call_in_loop(self._loop, self._loop.remove_reader, sock)
+
+    def _on_socket_register_write(self, client, userdata, sock):
+        call_in_loop(self._loop, self._loop.add_writer, sock, client.loop_write)
+
+    def _on_socket_unregister_write(self, client, userdata, sock):
+        call_in_loop(self._loop, self._loop.remove_writer, sock)
+
+    def _on_mqtt_connect(self, client, userdata, flags, reason_code, properties):
+        """ callback from mqtt client when connection is been established """
+        self._restore_session()
+        self._connected.set()
+
+    def _on_mqtt_disconnect(self, client, userdata, flags, reason_code, properties):
+        """ callback from mqtt client when connection is been lost """
+        self._connected.clear()
+
+    def _on_mqtt_message(self, client, userdata, msg):
+        """ callback from mqtt client when a new message is been received, it runs in the event loop """
+        self._dispatch(msg.topic, msg.payload)
+
+    def _on_discovery(self, topic, payload):
+        """ queue the configuration of the PG LAB Electronics device """
+        self._discovery.put(payload)
+
+    async def _misc_loop(self):
+        """ paho housekeeping (keep alive, retries) and reconnection """
+        while not self._stopping:
+            if self._mqtt_client.loop_misc() == mqtt.MQTT_ERR_NO_CONN:
+                try:
+                    await self._loop.run_in_executor(None, self._mqtt_client.reconnect)
+                except OSError as e:
+                    LOGGER.warning("MQTT reconnection failed (%s)", e)
+            await asyncio.sleep(1)
+
+    async def connect(self, host, port = 1883, username = '', password = '', timeout = 10) -> bool:
+        """ connect to the mqtt broker and wait for the connection acknowledge """
+        await self._start(host, port, username, password)
+
+        # the cached devices are usable before their discovery messages are received
+        await self._restore_cache()
+
+        return await self._wait_connected(timeout)
+
+    async def _start(self, host, port, username, password) -> None:
+        """ open the connection to the broker and start processing the messages """
+        self._loop = asyncio.get_running_loop()
+        self._connected = asyncio.Event()
+        self._stopping = False
+
+        self._mqtt_client.username_pw_set(username, password)
+
+        # a connection retried after a timeout has a single reconnection loop
+        self._cancel_misc_task()
+
+        # the TCP connection is blocking, keep it out of the event loop
+        await self._loop.run_in_executor(None, self._mqtt_client.connect, host, port, 60)
+        self._misc_task = self._loop.create_task(self._misc_loop())
+        self._discovery.start()
+
+    async def _wait_connected(self, timeout) -> bool:
+        """ wait for the connection acknowledge, on timeout stop the connection and return false """
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout)
+        except asyncio.TimeoutError:
+            await self._stop()
+            return False
+
+        return True
+
+    def _cancel_misc_task(self) -> None:
+        if self._misc_task:
+            self._misc_task.cancel()
+        self._misc_task = None
 
-        while 1:
-            for device in self._devices:
-                if device.name == name:
-                    return device
+    async def _stop(self) -> None:
+        """ close the connection, stop the reconnection and the discovery worker """
+        self._stopping = True
+        self._mqtt_client.disconnect()
+        self._cancel_misc_task()
+        await self._discovery.stop()
 
-            if (time.time() - start) > timeout:
-                 return None
-            
-            # wait a bit before to check again if the device is been discovered
-            time.sleep(0.1)
+    async def disconnect(self):
+        """ disconnect from the mqtt broker """
+        await self._stop()
+        self.save_cache()
 
-        return None
+    async def wait_discovery(self):
+        """ wait until all the received discovery messages are processed """
+        await self._discovery.join()
+
+    async def get_device_by_name(self, name, timeout = 2):
+        """ get a pg lab device by the name, wait up to timeout seconds for its discovery """
+        return await self._registry.wait_for(name=name, timeout=timeout)
+
+    @property
+    def connected(self) -> bool:
+        """Return true if the connection with the broker is established."""
+        return self._connected is not None and self._connected.is_set()
+
+
+class ShardedPgLab():
+    """Asyncio helper spreading the PG LAB Electronics devices over many broker connections.
+
+    Every shard is an AsyncPgLab with its own MQTT client, a device belongs
+    to the shard selected by the crc32 of its name: only that shard configures
+    the device, receives its states and sends its commands. The devices of
+    all shards are in a single registry and the state events in a single hub.
+    """
+
+    def __init__(
+        self,
+        shards = 2,
+        mqtt_clients = None,
+        metrics: Metrics | None = None,
+        cache = None,
+        sensor_history: int = 0,
+    ):
+        # a paho compatible client can be given for every shard
+        if mqtt_clients is not None:
+            shards = len(mqtt_clients)
+        else:
+            mqtt_clients = [None] * shards
+        if shards < 1:
+            raise ValueError("At least one shard is required")
+
+        self._registry = DeviceRegistry()
+        self._events = EventHub()
+        self._metrics = metrics
+
+        # the cache is loaded and saved once for all shards
+        self._cache = DeviceCache(cache) if cache is not None else None
+
+        self._shards = [
+            AsyncPgLab(
+                mqtt_client,
+                metrics,
+                registry=self._registry,
+                events=self._events,
+                shard=(index, shards),
+                sensor_history=sensor_history,
+            )
+            for index, mqtt_client in enumerate(mqtt_clients)
+        ]
+
+        # the gauges of every shard are replaced by the total of all shards
+        if metrics is not None:
+            metrics.add_gauge(
+                "discovery_pending",
+                "Devices waiting to be configured",
+                lambda: sum(shard._discovery.pending for shard in self._shards),
+            )
+            metrics.add_gauge(
+                "commands_offline",
+                "Commands waiting for the broker connection",
+                lambda: sum(len(shard.offline_queue) for shard in self._shards),
+            )
+
+    def shard(self, device_name: str) -> AsyncPgLab:
+        """ return the shard of a device """
+        return self._shards[shard_index(device_name, len(self._shards))]
+
+    async def connect(self, host, port = 1883, username = '', password = '', timeout = 10) -> bool:
+        """ connect all shards, to the same broker or to the broker of every shard if host is a list """
+        hosts = host if isinstance(host, (list, tuple)) else [host] * len(self._shards)
+        if len(hosts) != len(self._shards):
+            raise ValueError(f"{len(hosts)} brokers for {len(self._shards)} shards")
+
+        started = await asyncio.gather(
+            *(shard._start(host, port, username, password) for shard, host in zip(self._shards, hosts)),
+            return_exceptions=True,
+        )
+
+        # the cached devices are restored by their shard, also when its broker is not reachable
+        if self._cache is not None:
+            for snapshot in self._cache.load():
+                await self.shard(str(snapshot["config"].get(CONFIG_NAME)))._restore_device(snapshot)
+
+        for result in started:
+            if isinstance(result, BaseException):
+                raise result
+
+        results = await asyncio.gather(*(shard._wait_connected(timeout) for shard in self._shards))
+        return all(results)
+
+    async def disconnect(self):
+        """ disconnect all shards from the mqtt brokers """
+        await asyncio.gather(*(shard.disconnect() for shard in self._shards))
+        self.save_cache()
+
+    def save_cache(self) -> None:
+        """ store the configured devices and their states in the cache file """
+        if self._cache is not None:
+            self._cache.save(self._registry)
+
+    async def wait_discovery(self):
+        """ wait until all the received discovery messages are processed by all shards """
+        await asyncio.gather(*(shard.wait_discovery() for shard in self._shards))
+
+    async def get_device_by_name(self, name, timeout = 2):
+        """ get a pg lab device by the name, wait up to timeout seconds for its discovery """
+        return await self._registry.wait_for(name=name, timeout=timeout)
+
+    async def broadcast(
+        self,
+        selector: Selector,
+        command: str,
+        confirm: bool = False,
+        timeout: float = COMMAND_TIMEOUT,
+        retries: int = COMMAND_RETRIES,
+    ) -> BroadcastResult:
+        """ send a command to the entities of all the devices selected, concurrently across devices """
+        return await broadcast_command(self._registry, selector, command, confirm, timeout, retries)
+
+    def sensor_statistics(
+        self, sensor_type: str, window: float | None = None, selector: Selector | None = None
+    ) -> SensorStatistics:
+        """ return the statistics of a sensor type from the sensor history of all devices selected """
+        return aggregate_sensors(self._registry, sensor_type, window, selector)
+
+    def events(
+        self,
+        maxsize: int = EVENT_STREAM_SIZE,
+        overflow: str = OVERFLOW_DROP_OLDEST,
+        filter: Event_Filter | None = None,
+    ) -> EventStream:
+        """ return a stream of the state events of all devices, filter selects the events """
+        return self._events.stream(maxsize, overflow, filter)
+
+    @property
+    def shards(self) -> list[AsyncPgLab]:
+        """Get the helpers of all shards."""
+        return list(self._shards)
 
     @property
     def devices(self):
         """Get the device array."""
-        return self._devices
\ No newline at end of file
+        return list(self._registry)
+
+    @property
+    def registry(self) -> DeviceRegistry:
+        """Get the registry of the devices of all shards."""
+        return self._registry
+
+    @property
+    def metrics(self) -> Metrics | None:
+        """Get the metrics, None if the instrumentation is disabled."""
+        return self._metrics
+
+    @property
+    def connected(self) -> bool:
+        """Return true if all shards are connected."""
+        return all(shard.connected for shard in self._shards)
@@ -0,0 +1,34 @@
+"""Event loop helpers for pypglab"""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable
+
+
+def call_in_loop(loop: asyncio.AbstractEventLoop, callback: Callable[..., object], *args) -> None:
+    """Run the callback in the loop thread, at once when called from the loop.
+
+    The messages can be received in the paho network thread and the socket
+    callbacks run in the executor during the (re)connection. The callback is
+    dropped if the loop is closed.
+    """
+    try:
+        running_loop = asyncio.get_running_loop()
+    except RuntimeError:
+        running_loop = None
+
+    if running_loop is loop:
+        callback(*args)
+    elif not loop.is_closed():
+        loop.call_soon_threadsafe(callback, *args)
+
+
+def _set_future_result(future: asyncio.Future, result) -> None:
+    if not future.done():
+        future.set_result(result)
+
+
+def resolve_future(future: asyncio.Future, result) -> None:
+    """Set the future result from any thread, if not done yet"""
+    call_in_loop(future.get_loop(), _set_future_result, future, result)
@@ -0,0 +1,290 @@
+"""Instrumentation and metrics export for pypglab"""
+
+from __future__ import annotations
+
+import asyncio
+import bisect
+import threading
+import time
+from collections.abc import Callable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .const import LOGGER, PGLAB_DISCOVERY_TOPIC, TOPIC_PGLAB
+
+# an exporter receives the metrics snapshot
+Exporter = Callable[[dict], None]
+
+# histogram upper bounds in seconds, from 100 us to 10 s
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+METRICS_PREFIX = "pypglab"
+
+# counters
+MESSAGES_RECEIVED = "messages_received"
+MESSAGES_UNROUTED = "messages_unrouted"
+MESSAGES_PUBLISHED = "messages_published"
+DEVICES_CONFIGURED = "devices_configured"
+DEVICES_INVALID = "devices_invalid"
+
+# histograms
+DISPATCH_SECONDS = "dispatch_seconds"
+DISCOVERY_SECONDS = "discovery_seconds"
+COMMAND_RTT_SECONDS = "command_rtt_seconds"
+
+METRICS_HELP = {
+    MESSAGES_RECEIVED: "MQTT messages received",
+    MESSAGES_UNROUTED: "MQTT messages received without any subscriber",
+    MESSAGES_PUBLISHED: "MQTT messages published",
+    DEVICES_CONFIGURED: "Devices configured from a discovery message",
+    DEVICES_INVALID: "Discovery messages with an invalid configuration",
+    DISPATCH_SECONDS: "Time to dispatch a received message to the entities",
+    DISCOVERY_SECONDS: "Time to configure a device from its discovery message",
+    COMMAND_RTT_SECONDS: "Time from a set command to the matching state message",
+}
+
+# the level after pglab/ of the discovery topics
+DISCOVERY = PGLAB_DISCOVERY_TOPIC.split("/")[1]
+
+# the state topic of a command is the set topic with a different last level
+COMMAND_SET = "/set"
+COMMAND_STATE = "/state"
+
+
+def device_name(topic: str) -> str | None:
+    """Return the device name of a pglab/<device name>/... topic, None for the discovery topics"""
+    levels = topic.split("/", 2)
+    if len(levels) == 3 and levels[0] == TOPIC_PGLAB and levels[1] != DISCOVERY:
+        return levels[1]
+    return None
+
+
+def label_value(value: str) -> str:
+    """Return a Prometheus label value with the backslash, the double quote and the new line escaped"""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histogram:
+    """Count the observed values in cumulative buckets, like a Prometheus histogram"""
+
+    __slots__ = ("bounds", "counts", "count", "sum")
+
+    def __init__(self, bounds: tuple = LATENCY_BUCKETS) -> None:
+        """Initialize"""
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """Add a value"""
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self) -> dict:
+        """Return the count, the sum and the cumulative count of every bucket"""
+        buckets = {}
+        total = 0
+        for bound, count in zip(self.bounds, self.counts):
+            total += count
+            buckets[bound] = total
+        return {"count": self.count, "sum": self.sum, "buckets": buckets}
+
+
+class DeviceStats:
+    """Statistics of a single device"""
+
+    __slots__ = ("messages", "commands", "rtt_count", "rtt_sum", "rtt_max", "rtt_last")
+
+    def __init__(self) -> None:
+        """Initialize"""
+        self.messages = 0
+        self.commands = 0
+        self.rtt_count = 0
+        self.rtt_sum = 0.0
+        self.rtt_max = 0.0
+        self.rtt_last = 0.0
+
+    def observe_rtt(self, rtt: float) -> None:
+        """Add a command round trip time"""
+        self.rtt_count += 1
+        self.rtt_sum += rtt
+        self.rtt_last = rtt
+        if rtt > self.rtt_max:
+            self.rtt_max = rtt
+
+    def snapshot(self) -> dict:
+        """Return the statistics as a dict"""
+        return {
+            "messages": self.messages,
+            "commands": self.commands,
+            "rtt_count": self.rtt_count,
+            "rtt_average": self.rtt_sum / self.rtt_count if self.rtt_count else None,
+            "rtt_max": self.rtt_max,
+            "rtt_last": self.rtt_last,
+        }
+
+
+class Metrics:
+    """Counters, histograms, gauges and per device statistics of a pypglab helper.
+
+    A helper collects the metrics only when created with a Metrics instance,
+    without it the hot paths only test for None. The values are updated
+    without locks: they are statistics, a rare lost update between threads
+    is accepted to keep the cost of the instrumentation low.
+    """
+
+    def __init__(self) -> None:
+        """Initialize"""
+        self.counters: dict[str, int] = dict.fromkeys(
+            (MESSAGES_RECEIVED, MESSAGES_UNROUTED, MESSAGES_PUBLISHED, DEVICES_CONFIGURED, DEVICES_INVALID), 0
+        )
+        self.histograms: dict[str, Histogram] = {
+            DISPATCH_SECONDS: Histogram(),
+            DISCOVERY_SECONDS: Histogram(),
+            COMMAND_RTT_SECONDS: Histogram(),
+        }
+        self.devices: dict[str, DeviceStats] = {}
+
+        # gauges are read when exported
+        self._gauges: dict[str, tuple[str, Callable[[], float]]] = {}
+        self._exporters: list[Exporter] = []
+
+        # the send time of the commands waiting for their state, by state topic
+        self._commands: dict[str, float] = {}
+
+    def _device(self, name: str) -> DeviceStats:
+        stats = self.devices.get(name)
+        if stats is None:
+            stats = self.devices[name] = DeviceStats()
+        return stats
+
+    def message_received(self, topic: str, routed: bool, received: float, elapsed: float) -> None:
+        """Record a received message, the time it was received and its dispatch time"""
+        self.counters[MESSAGES_RECEIVED] += 1
+        if not routed:
+            self.counters[MESSAGES_UNROUTED] += 1
+            return
+
+        self.histograms[DISPATCH_SECONDS].observe(elapsed)
+
+        name = device_name(topic)
+        if name is None:
+            return
+
+        stats = self._device(name)
+        stats.messages += 1
+
+        sent = self._commands.pop(topic, None)
+        if sent is not None:
+            rtt = received - sent
+            self.histograms[COMMAND_RTT_SECONDS].observe(rtt)
+            stats.observe_rtt(rtt)
+
+    def message_published(self, topic: str) -> None:
+        """Record a message published to the broker, a command waits for its state from now on"""
+        self.counters[MESSAGES_PUBLISHED] += 1
+
+        if topic.endswith(COMMAND_SET):
+            name = device_name(topic)
+            if name is not None:
+                self._device(name).commands += 1
+                self._commands[topic[: -len(COMMAND_SET)] + COMMAND_STATE] = time.perf_counter()
+
+    def device_configured(self, valid: bool, elapsed: float) -> None:
+        """Record the configuration of a device from a discovery message"""
+        if valid:
+            self.counters[DEVICES_CONFIGURED] += 1
+            self.histograms[DISCOVERY_SECONDS].observe(elapsed)
+        else:
+            self.counters[DEVICES_INVALID] += 1
+
+    def add_gauge(self, name: str, help: str, read: Callable[[], float]) -> None:
+        """Add a gauge, its value is read when the metrics are exported"""
+        self._gauges[name] = (help, read)
+
+    def add_exporter(self, exporter: Exporter) -> None:
+        """Add an exporter called with the snapshot by export()"""
+        self._exporters.append(exporter)
+
+    def snapshot(self) -> dict:
+        """Return all metrics as a dict"""
+        return {
+            "counters": dict(self.counters),
+            "gauges": {name: read() for name, (_, read) in self._gauges.items()},
+            "histograms": {name: histogram.snapshot() for name, histogram in self.histograms.items()},
+            "devices": {name: stats.snapshot() for name, stats in list(self.devices.items())},
+        }
+
+    def export(self) -> dict:
+        """Call all exporters with the metrics snapshot and return it"""
+        snapshot = self.snapshot()
+        for exporter in self._exporters:
+            try:
+                exporter(snapshot)
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.exception("Error exporting the metrics")
+        return snapshot
+
+    async def export_every(self, interval: float) -> None:
+        """Export the metrics every interval seconds until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            self.export()
+
+    def prometheus(self) -> str:
+        """Return the metrics in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = []
+
+        for name, value in snapshot["counters"].items():
+            metric = f"{METRICS_PREFIX}_{name}_total"
+            lines.append(f"# HELP {metric} {METRICS_HELP[name]}")
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+
+        for name, value in snapshot["gauges"].items():
+            metric = f"{METRICS_PREFIX}_{name}"
+            lines.append(f"# HELP {metric} {self._gauges[name][0]}")
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {value}")
+
+        for name, histogram in snapshot["histograms"].items():
+            metric = f"{METRICS_PREFIX}_{name}"
+            lines.append(f"# HELP {metric} {METRICS_HELP[name]}")
+            lines.append(f"# TYPE {metric} histogram")
+            for bound, count in histogram["buckets"].items():
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {count}')
+            lines.append(f'{metric}_bucket{{le="+Inf"}} {histogram["count"]}')
+            lines.append(f"{metric}_sum {histogram['sum']}")
+            lines.append(f"{metric}_count {histogram['count']}")
+
+        devices = snapshot["devices"]
+        if devices:
+            for field, kind in (("messages", "counter"), ("commands", "counter"), ("rtt_max", "gauge")):
+                metric = f"{METRICS_PREFIX}_device_{field}" + ("_total" if kind == "counter" else "_seconds")
+                lines.append(f"# TYPE {metric} {kind}")
+                for name, stats in devices.items():
+                    lines.append(f'{metric}{{device="{label_value(name)}"}} {stats[field]}')
+
+        return "\n".join(lines) + "\n"
+
+
+def serve_prometheus(metrics: Metrics, port: int, host: str = "") -> ThreadingHTTPServer:
+    """Serve the metrics in the Prometheus text format from a daemon thread, return the server"""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):  # noqa: N802
+            body = metrics.prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="pypglab-metrics", daemon=True).start()
+    return server
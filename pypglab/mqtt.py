@@ -2,11 +2,14 @@
 
 from __future__ import annotations
 
+import threading
 from collections.abc import Callable, Coroutine
 from typing import Any
 
+from .const import LOGGER, OFFLINE_QUEUE_SIZE
+
 # define a mqtt subscribe callback ... the input argument are payload and the topic string
-Subscribe_CallBack = Callable[[str, str], None]
+Subscribe_CallBack = Callable[[str, bytes], None]
 
 Sub_State = dict[str, Any]
 Sub_States = dict[int, Sub_State]
@@ -70,3 +73,48 @@ class Client:
 
             # update the substate
             del self._substates[hash_value]
+
+
+class OfflineQueue:
+    """The messages published while the broker connection is down.
+
+    Only the latest message of every topic is kept, so an entity commanded
+    many times while offline receives only the final state, in the order of
+    the latest commands. When the queue is full the oldest message is lost.
+    """
+
+    def __init__(self, maxsize: int = OFFLINE_QUEUE_SIZE) -> None:
+        """Initialize"""
+        if maxsize < 1:
+            raise ValueError("Offline queue size must be at least one")
+
+        self._maxsize = maxsize
+        self._messages: dict[str, tuple[Any, int | None, bool | None]] = {}
+        self._dropped = 0
+
+        # the messages are queued and sent from different threads
+        self._lock = threading.Lock()
+
+    def put(self, topic: str, payload: Any, qos: int | None = 0, retain: bool | None = False) -> None:
+        """Queue a message, replacing the message queued with the same topic"""
+        with self._lock:
+            if self._messages.pop(topic, None) is None and len(self._messages) >= self._maxsize:
+                del self._messages[next(iter(self._messages))]
+                self._dropped += 1
+                LOGGER.warning("Offline queue full, the oldest message is lost")
+            self._messages[topic] = (payload, qos, retain)
+
+    def drain(self) -> list[tuple[str, Any, int | None, bool | None]]:
+        """Remove and return all the queued messages, oldest first"""
+        with self._lock:
+            messages, self._messages = self._messages, {}
+        return [(topic, payload, qos, retain) for topic, (payload, qos, retain) in messages.items()]
+
+    def __len__(self) -> int:
+        """Return the number of queued messages"""
+        return len(self._messages)
+
+    @property
+    def dropped(self) -> int:
+        """Return the number of messages lost because the queue was full"""
+        return self._dropped
@@ -0,0 +1,160 @@
+"""Registry of the discovered devices for pypglab"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from collections.abc import Iterator
+
+from .device import Device
+from .loop import resolve_future
+
+# device registry indexes
+INDEX_NAME = "name"
+INDEX_ID = "id"
+INDEX_MAC = "mac"
+
+
+def _normalize_mac(mac: str) -> str:
+    """Return the mac address in a single format to be used as key"""
+    return mac.lower().replace("-", ":")
+
+
+def _lookup_key(name: str | None, id: str | None, mac: str | None) -> tuple[str, str]:
+    """Return the index and the key to lookup a device"""
+    keys = [
+        (index, value)
+        for index, value in ((INDEX_NAME, name), (INDEX_ID, id), (INDEX_MAC, mac))
+        if value is not None
+    ]
+    if len(keys) != 1:
+        raise ValueError("Lookup a device by one of name, id or mac")
+
+    index, value = keys[0]
+    if index == INDEX_MAC:
+        value = _normalize_mac(value)
+    return index, value
+
+
+class DeviceRegistry:
+    """The discovered PG LAB devices indexed by name, id and mac address.
+
+    A device is unique by id: a new device replaces the registered one with
+    the same id, unless the configuration hash is the same. Lookups are O(1)
+    and wait_for() wakes up as soon as the device is added.
+    """
+
+    def __init__(self) -> None:
+        """Initialize"""
+        self._indexes: dict[str, dict[str, Device]] = {
+            INDEX_NAME: {},
+            INDEX_ID: {},
+            INDEX_MAC: {},
+        }
+
+        # the index keys of every device, by device id
+        self._device_keys: dict[str, list[tuple[str, str]]] = {}
+
+        # futures waiting for a device, by index and key
+        self._waiters: dict[tuple[str, str], list[asyncio.Future]] = {}
+
+        # the devices can be added from the mqtt thread
+        self._condition = threading.Condition()
+
+    def _keys(self, device: Device) -> list[tuple[str, str]]:
+        """Return the index keys of a device"""
+        keys = [(INDEX_NAME, device.name), (INDEX_ID, device.id)]
+        if device.mac:
+            keys.append((INDEX_MAC, _normalize_mac(device.mac)))
+        return keys
+
+    def _unindex(self, device: Device) -> None:
+        # the device name or mac address can be changed since it was indexed
+        for index, key in self._device_keys.pop(device.id, []):
+            if self._indexes[index].get(key) is device:
+                del self._indexes[index][key]
+
+    def add(self, device: Device) -> bool:
+        """Add a device, return false if it is already registered with the same configuration"""
+        with self._condition:
+            existing = self._indexes[INDEX_ID].get(device.id)
+            if existing is not None and existing is not device and existing.hash == device.hash:
+                return False
+
+            if existing is not None:
+                self._unindex(existing)
+
+            waiters = []
+            keys = self._keys(device)
+            for index, key in keys:
+                self._indexes[index][key] = device
+                waiters.extend(self._waiters.pop((index, key), []))
+            self._device_keys[device.id] = keys
+
+            self._condition.notify_all()
+
+        # wake up all coroutines waiting for this device
+        for future in waiters:
+            resolve_future(future, device)
+
+        return True
+
+    def remove(self, device: Device) -> None:
+        """Remove a device"""
+        with self._condition:
+            self._unindex(device)
+
+    def get(self, name: str | None = None, id: str | None = None, mac: str | None = None) -> Device | None:
+        """Return the device with the name, id or mac address"""
+        index, key = _lookup_key(name, id, mac)
+        return self._indexes[index].get(key)
+
+    def wait(
+        self,
+        name: str | None = None,
+        id: str | None = None,
+        mac: str | None = None,
+        timeout: float | None = None,
+    ) -> Device | None:
+        """Block the calling thread until the device is added, return None on timeout"""
+        index, key = _lookup_key(name, id, mac)
+        with self._condition:
+            self._condition.wait_for(lambda: key in self._indexes[index], timeout)
+            return self._indexes[index].get(key)
+
+    async def wait_for(
+        self,
+        name: str | None = None,
+        id: str | None = None,
+        mac: str | None = None,
+        timeout: float | None = None,
+    ) -> Device | None:
+        """Wait until the device is added, return None on timeout"""
+        index, key = _lookup_key(name, id, mac)
+        future = asyncio.get_running_loop().create_future()
+
+        with self._condition:
+            device = self._indexes[index].get(key)
+            if device is not None:
+                return device
+            self._waiters.setdefault((index, key), []).append(future)
+
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            with self._condition:
+                waiters = self._waiters.get((index, key))
+                if waiters and future in waiters:
+                    waiters.remove(future)
+                    if not waiters:
+                        del self._waiters[(index, key)]
+
+    def __iter__(self) -> Iterator[Device]:
+        """Iterate over the registered devices"""
+        return iter(list(self._indexes[INDEX_ID].values()))
+
+    def __len__(self) -> int:
+        """Return the number of registered devices"""
+        return len(self._indexes[INDEX_ID])
@@ -1,52 +1,172 @@
 """Relay for pypglab"""
 
-from .const import ENTITY_RELAY, RELAY_STATE_OFF, RELAY_STATE_ON
-from .entity import Entity
+from __future__ import annotations
+
+from collections.abc import Iterator
+
+from .const import (
+    COMMAND_RETRIES,
+    COMMAND_TIMEOUT,
+    ENTITY_RELAY,
+    ENTITY_TOPIC,
+    RELAY_PAYLOAD_ON,
+    RELAY_STATE_OFF,
+    RELAY_STATE_ON,
+)
+from .entity import Entity, Payload, entity_topic
 from .mqtt import Client
+from .scheduler import CommandScheduler
+
+# maximum number of relays of a device
+RELAY_BANK_SIZE = 64
+
+
+class RelayBank:
+    """The relays of a device with their state stored in a single structure.
+
+    The relay states are two bit masks, one of the relays with a known state
+    and one of the relays turned on, so the state of all the device relays is
+    read with a single operation. The relays and their topics are stored in
+    tables indexed by relay index.
+    """
+
+    __slots__ = ("_device_name", "_known", "_on", "_relays", "_topics")
+
+    def __init__(self, device_name: str) -> None:
+        """Initialize"""
+        self._device_name = device_name
+
+        # bit masks of the relays with a known state and of the relays on
+        self._known = 0
+        self._on = 0
+
+        self._relays: list[Relay | None] = [None] * RELAY_BANK_SIZE
+        self._topics: list[str | None] = [None] * RELAY_BANK_SIZE
+
+    def set_topic(self, index: int) -> str:
+        """Return the topic used to change the relay status"""
+        topic = self._topics[index]
+        if topic is None:
+            set_cmd, state_cmd = ENTITY_TOPIC[ENTITY_RELAY]
+            topic = entity_topic(self._device_name, ENTITY_RELAY, index, set_cmd)
+            self._topics[index] = topic
+        return topic
+
+    def assign(self, relays: list[Relay]) -> None:
+        """Set the relays of the bank, the state of the relays removed is forgotten"""
+        self._relays = [None] * RELAY_BANK_SIZE
+
+        mask = 0
+        for relay in relays:
+            self._relays[relay.id] = relay
+            mask |= 1 << relay.id
+
+        self._known &= mask
+        self._on &= mask
+
+    def get(self, index: int) -> Relay | None:
+        """Return the relay with the index"""
+        if 0 <= index < RELAY_BANK_SIZE:
+            return self._relays[index]
+        return None
+
+    def get_state(self, index: int) -> bool | None:
+        """Return the relay state, None if unknown"""
+        bit = 1 << index
+        if not self._known & bit:
+            return None
+        return bool(self._on & bit)
+
+    def set_state(self, index: int, state: bool) -> None:
+        """Store a new relay state"""
+        bit = 1 << index
+        self._known |= bit
+        if state:
+            self._on |= bit
+        else:
+            self._on &= ~bit
+
+    def __iter__(self) -> Iterator[Relay]:
+        """Iterate over the relays of the bank"""
+        return (relay for relay in self._relays if relay is not None)
+
+    @property
+    def device_name(self) -> str:
+        """Get the name of the device with the relays"""
+        return self._device_name
+
+    @property
+    def states(self) -> int:
+        """Get the state of all relays, the bit at relay index is set when the relay is on"""
+        return self._on
+
+    @property
+    def known(self) -> int:
+        """Get the relays with a known state, the bit at relay index is set when it is known"""
+        return self._known
 
 
 class Relay(Entity):
     """It's a PG LAB Electronics relay"""
 
+    __slots__ = ("_bank",)
+
     def __init__(
         self,
         device_id: str,
         device_name: str,
         index: int,
         mqtt: Client,
+        scheduler: CommandScheduler | None = None,
+        bank: RelayBank | None = None,
     ) -> None:
         """Initialize"""
-        super().__init__(device_id, device_name, index, ENTITY_RELAY, mqtt)
+        # the relay state is stored in the bank of the device relays
+        if bank is None:
+            bank = RelayBank(device_name)
+
+        super().__init__(
+            device_id, device_name, index, ENTITY_RELAY, mqtt, scheduler, bank.set_topic(index)
+        )
 
-        self._state: bool = None
+        self._bank = bank
 
-    def status_change_received(self, payload: str) -> None:
+    def status_change_received(self, payload: Payload) -> None:
         """Callback to notify a new status change"""
-        self._state = True if payload == RELAY_STATE_ON else False
+        self._bank.set_state(self._id, payload == RELAY_PAYLOAD_ON or payload == RELAY_STATE_ON)
 
-    async def __set_state(self, state: bool) -> None:
+    async def __set_state(self, state: bool, confirm: bool, timeout: float, retries: int) -> bool:
         """Turn the relay on or off"""
         payload = RELAY_STATE_ON if state else RELAY_STATE_OFF
-        await super().set_state(payload)
+        return await super().set_state(payload, confirm, timeout, retries)
 
-    async def turn_on(self) -> None:
-        """Turn the relay on"""
-        await self.__set_state(True)
+    async def turn_on(
+        self, confirm: bool = False, timeout: float = COMMAND_TIMEOUT, retries: int = COMMAND_RETRIES
+    ) -> bool:
+        """Turn the relay on, with confirm wait until the relay is on"""
+        return await self.__set_state(True, confirm, timeout, retries)
 
-    async def turn_off(self) -> None:
-        """Turn the relay on"""
-        await self.__set_state(False)
+    async def turn_off(
+        self, confirm: bool = False, timeout: float = COMMAND_TIMEOUT, retries: int = COMMAND_RETRIES
+    ) -> bool:
+        """Turn the relay off, with confirm wait until the relay is off"""
+        return await self.__set_state(False, confirm, timeout, retries)
 
     @property
     def state(self) -> bool:
         """Get relay status"""
-        return self._state
+        return self._bank.get_state(self._id)
 
 
 async def CreateRelay(
-    device_id: str, device_name: str, index: int, mqtt: Client
+    device_id: str,
+    device_name: str,
+    index: int,
+    mqtt: Client,
+    scheduler: CommandScheduler | None = None,
+    bank: RelayBank | None = None,
 ) -> Relay:
     """Create and initialize a PG LAB relay instance"""
 
-    relay = Relay(device_id, device_name, index, mqtt)
+    relay = Relay(device_id, device_name, index, mqtt, scheduler, bank)
     return relay
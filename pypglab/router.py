@@ -0,0 +1,116 @@
+"""MQTT topic router for pypglab"""
+
+from __future__ import annotations
+
+from typing import Any
+
+# MQTT topic wildcards
+TOPIC_SEPARATOR = "/"
+WILDCARD_SINGLE_LEVEL = "+"
+WILDCARD_MULTI_LEVEL = "#"
+
+
+class _Node:
+    """A topic level in the router trie"""
+
+    __slots__ = ("children", "handlers")
+
+    def __init__(self) -> None:
+        """Initialize"""
+        self.children: dict[str, _Node] = {}
+        self.handlers: list = []
+
+
+class TopicRouter:
+    """Route a MQTT topic to all handlers subscribed with a matching topic filter.
+
+    The topic filters are stored in a trie with a node for every topic level,
+    the MQTT wildcards '+' and '#' are supported and a topic filter can have
+    more than one handler. Matching a topic costs O(topic depth) and doesn't
+    depend on the number of subscribed filters.
+    """
+
+    def __init__(self) -> None:
+        """Initialize"""
+        self._root = _Node()
+        self._size = 0
+
+    def add(self, topic_filter: str, handler: Any) -> None:
+        """Add a handler for a topic filter"""
+        node = self._root
+        for level in topic_filter.split(TOPIC_SEPARATOR):
+            child = node.children.get(level)
+            if child is None:
+                child = node.children[level] = _Node()
+            node = child
+
+        node.handlers.append(handler)
+        self._size = self._size + 1
+
+    def remove(self, topic_filter: str, handler: Any) -> bool:
+        """Remove a handler from a topic filter, return false if not found"""
+        path = []
+        node = self._root
+        for level in topic_filter.split(TOPIC_SEPARATOR):
+            child = node.children.get(level)
+            if child is None:
+                return False
+            path.append((node, level))
+            node = child
+
+        try:
+            node.handlers.remove(handler)
+        except ValueError:
+            return False
+
+        self._size = self._size - 1
+
+        # prune the empty branches
+        for parent, level in reversed(path):
+            child = parent.children[level]
+            if child.handlers or child.children:
+                break
+            del parent.children[level]
+
+        return True
+
+    def match(self, topic: str) -> list:
+        """Return all handlers with a topic filter matching the topic"""
+        handlers = []
+        nodes = [self._root]
+
+        for level in topic.split(TOPIC_SEPARATOR):
+            next_nodes = []
+            for node in nodes:
+                children = node.children
+
+                # the multi level wildcard matches all remaining levels
+                child = children.get(WILDCARD_MULTI_LEVEL)
+                if child is not None:
+                    handlers.extend(child.handlers)
+
+                child = children.get(level)
+                if child is not None:
+                    next_nodes.append(child)
+
+                child = children.get(WILDCARD_SINGLE_LEVEL)
+                if child is not None:
+                    next_nodes.append(child)
+
+            nodes = next_nodes
+            if not nodes:
+                return handlers
+
+        for node in nodes:
+            handlers.extend(node.handlers)
+
+            # the multi level wildcard matches also the parent level
+            child = node.children.get(WILDCARD_MULTI_LEVEL)
+            if child is not None:
+                handlers.extend(child.handlers)
+
+        return handlers
+
+    def __len__(self) -> int:
+        """Return the number of subscribed handlers"""
+        return self._size
@@ -0,0 +1,109 @@
+"""Command scheduler for pypglab"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+
+from .const import COMMAND_RATE_LIMITS, DEFAULT_COMMAND_RATE_LIMIT
+
+
+def _version_tuple(version: str) -> tuple:
+    """Convert a version string like 1.2.3 to a comparable tuple"""
+    return tuple(int(number) for number in version.split(".") if number)
+
+
+def command_rate_limit(device_type: str, firmware_version: str | None) -> tuple[float, int]:
+    """Return the (rate, burst) command limit for a device type and firmware version"""
+    limits = COMMAND_RATE_LIMITS.get(device_type)
+    if not limits or not firmware_version:
+        return DEFAULT_COMMAND_RATE_LIMIT
+
+    firmware = _version_tuple(firmware_version)
+
+    # use the limit of the newest firmware version not greater than the device one
+    selected = DEFAULT_COMMAND_RATE_LIMIT
+    selected_version = ()
+    for version, limit in limits.items():
+        version = _version_tuple(version)
+        if selected_version <= version <= firmware:
+            selected = limit
+            selected_version = version
+
+    return selected
+
+
+class CommandScheduler:
+    """Token bucket limiting the rate of commands sent to a PG LAB device.
+
+    The bucket is refilled with rate tokens per second up to burst tokens and
+    every command takes one. When the bucket is empty a command waits for its
+    own time slot, so the commands are released in arrival order as fast as
+    the device accepts them, without blocking the commands for other devices.
+    """
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        """Initialize"""
+        self._lock = threading.Lock()
+        self._rate: float = 0
+        self._burst: int = 0
+        self._tokens: float = burst
+        self._updated: float = time.monotonic()
+        self.configure(rate, burst)
+
+    def configure(self, rate: float, burst: int = 1) -> None:
+        """Change the command rate (commands per second) and burst size"""
+        if rate <= 0:
+            raise ValueError("Command rate must be greater than zero")
+        if burst < 1:
+            raise ValueError("Command burst must be at least one")
+
+        with self._lock:
+            now = time.monotonic()
+            if self._rate:
+                # refill with the old rate up to now
+                self._tokens = min(
+                    self._burst, self._tokens + (now - self._updated) * self._rate
+                )
+            self._rate = rate
+            self._burst = burst
+            self._tokens = min(self._tokens, burst)
+            self._updated = now
+
+    def reserve(self) -> float:
+        """Take a token, return how many seconds to wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self._burst, self._tokens + (now - self._updated) * self._rate
+            )
+            self._updated = now
+            self._tokens = self._tokens - 1
+
+            if self._tokens >= 0:
+                return 0
+            return -self._tokens / self._rate
+
+    async def acquire(self) -> None:
+        """Wait until a new command can be sent to the device"""
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    @property
+    def rate(self) -> float:
+        """Return the number of commands per second"""
+        return self._rate
+
+    @property
+    def burst(self) -> int:
+        """Return the number of commands that can be sent without waiting"""
+        return self._burst
+
+    @property
+    def queued(self) -> int:
+        """Return the number of commands waiting for their time slot"""
+        with self._lock:
+            tokens = self._tokens + (time.monotonic() - self._updated) * self._rate
+        return max(0, -int(tokens // 1))
@@ -1,12 +1,25 @@
 """Sensor for pypglab"""
 
-import json
+from __future__ import annotations
+
+import asyncio
+import bisect
+import time
+from array import array
 from typing import Any, cast
 
-from .const import ENTITY_SENSOR, SENSOR_REBOOT_TIME, SENSOR_TEMPERATURE, SENSOR_VOLTAGE
-from .entity import Entity
+from . import codec
+from .const import ENTITY_SENSOR, SENSOR_HISTORY_SIZE, SENSOR_REBOOT_TIME, SENSOR_TEMPERATURE, SENSOR_VOLTAGE
+from .entity import Entity, Payload
+from .loop import call_in_loop
 from .mqtt import Client
 
+# numpy is optional, the history queries are vectorized when it is installed
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 def SensorDefaultValue(sensor_type: str) -> Any:
     """Return a default value for a sensor type"""
@@ -30,8 +43,148 @@ def SensorValueCast(sensor_type: str, value: Any) -> Any:
     return None
 
 
+class SensorHistory:
+    """The last values of a sensor with their monotonic timestamps.
+
+    The values are stored in a fixed size ring buffer of two arrays of
+    doubles, the oldest value is overwritten when full. The queries use the
+    values received in the last window seconds, or all of them, and are
+    vectorized with numpy when installed.
+    """
+
+    __slots__ = ("_times", "_values", "_size", "_count", "_next")
+
+    def __init__(self, size: int = SENSOR_HISTORY_SIZE) -> None:
+        """Initialize"""
+        if size < 2:
+            raise ValueError("Sensor history size must be at least two")
+
+        self._times = array("d", bytes(8 * size))
+        self._values = array("d", bytes(8 * size))
+        self._size = size
+
+        # number of values stored and the position of the next one
+        self._count = 0
+        self._next = 0
+
+    def append(self, value: float, timestamp: float | None = None) -> None:
+        """Store a value, received now if timestamp is not given"""
+        index = self._next
+        self._times[index] = time.monotonic() if timestamp is None else timestamp
+        self._values[index] = value
+        self._next = (index + 1) % self._size
+        if self._count < self._size:
+            self._count += 1
+
+    def samples(self, window: float | None = None) -> tuple[Any, Any]:
+        """Return the timestamps and the values of the last window seconds, oldest first.
+
+        They are numpy arrays when numpy is installed, views of the buffer if
+        not wrapped around, otherwise arrays of doubles.
+        """
+        size = self._size
+        count = self._count
+        start = (self._next - count) % size
+        end = start + count
+
+        if numpy is not None:
+            times = numpy.frombuffer(self._times, dtype=numpy.float64)
+            values = numpy.frombuffer(self._values, dtype=numpy.float64)
+            if end <= size:
+                times, values = times[start:end], values[start:end]
+            else:
+                times = numpy.concatenate((times[start:], times[: end - size]))
+                values = numpy.concatenate((values[start:], values[: end - size]))
+            first = int(numpy.searchsorted(times, time.monotonic() - window)) if window is not None else 0
+        else:
+            if end <= size:
+                times, values = self._times[start:end], self._values[start:end]
+            else:
+                times = self._times[start:] + self._times[: end - size]
+                values = self._values[start:] + self._values[: end - size]
+            first = bisect.bisect_left(times, time.monotonic() - window) if window is not None else 0
+
+        return times[first:], values[first:]
+
+    def min(self, window: float | None = None) -> float | None:
+        """Return the minimum value, None without values"""
+        _, values = self.samples(window)
+        if not len(values):
+            return None
+        return float(values.min()) if numpy is not None else min(values)
+
+    def max(self, window: float | None = None) -> float | None:
+        """Return the maximum value, None without values"""
+        _, values = self.samples(window)
+        if not len(values):
+            return None
+        return float(values.max()) if numpy is not None else max(values)
+
+    def mean(self, window: float | None = None) -> float | None:
+        """Return the mean value, None without values"""
+        _, values = self.samples(window)
+        if not len(values):
+            return None
+        return float(values.mean()) if numpy is not None else sum(values) / len(values)
+
+    def rate(self, window: float | None = None) -> float | None:
+        """Return the change per second, the slope of the least squares line of the values"""
+        times, values = self.samples(window)
+        count = len(values)
+        if count < 2:
+            return None
+
+        if numpy is not None:
+            times = times - times.mean()
+            variance = float(numpy.dot(times, times))
+            covariance = float(numpy.dot(times, values - values.mean()))
+        else:
+            time_mean = sum(times) / count
+            value_mean = sum(values) / count
+            variance = sum((t - time_mean) ** 2 for t in times)
+            covariance = sum((t - time_mean) * (v - value_mean) for t, v in zip(times, values))
+
+        if variance == 0:
+            return None
+        return covariance / variance
+
+    def clear(self) -> None:
+        """Remove all values"""
+        self._count = 0
+        self._next = 0
+
+    def __len__(self) -> int:
+        """Return the number of values stored"""
+        return self._count
+
+    @property
+    def size(self) -> int:
+        """Return the maximum number of values stored"""
+        return self._size
+
+
 class StatusSensor(Entity):
-    """It's a PG LAB Electronics device status sensor"""
+    """It's a PG LAB Electronics device status sensor.
+
+    The sensor values are always updated, but a change is notified to the
+    callback and to the event streams only if it is bigger than the deadband
+    of the sensor type and the previous notification of that type is older
+    than its throttle window. A change held back by the throttle is notified
+    at the end of the window, or with the first message after the window when
+    the sensor is not created in an event loop.
+    """
+
+    __slots__ = (
+        "_state",
+        "_payload",
+        "_notified",
+        "_notified_at",
+        "_filters",
+        "_held",
+        "_held_timer",
+        "_loop",
+        "_history",
+    )
 
     def __init__(
         self,
@@ -48,20 +201,148 @@ class StatusSensor(Entity):
         for sensor_type in config:
             self._state[sensor_type] = SensorDefaultValue(sensor_type)
 
+        # the last payload received, the same payload is not decoded again
+        self._payload: Payload | None = None
+
+        # the last notified value of every sensor type and when it was notified
+        self._notified: dict = dict(self._state)
+        self._notified_at: dict[str, float] = {}
+
+        # (throttle seconds, deadband) by sensor type
+        self._filters: dict[str, tuple[float, float]] = {}
+
+        # true when a change is held back by the throttle, notified by the timer at the end of the window
+        self._held = False
+        self._held_timer: asyncio.TimerHandle | None = None
+
+        # the loop running the held changes timer, the device is configured in it
+        try:
+            self._loop: asyncio.AbstractEventLoop | None = asyncio.get_running_loop()
+        except RuntimeError:
+            self._loop = None
+
+        # the history of every sensor type, when enabled
+        self._history: dict[str, SensorHistory] | None = None
+
     def _getSensorValue(self, sensor_type: str, values: dict) -> Any:
         if sensor_type in values:
             return SensorValueCast(sensor_type, values[sensor_type])
 
         return None
 
-    def status_change_received(self, payload: str) -> None:
-        """Call to notify a new status change"""
-        values = json.loads(payload)
+    def set_filter(self, sensor_type: str, throttle: float = 0, deadband: float = 0) -> None:
+        """Notify the changes of a sensor type at most every throttle seconds and only if bigger than deadband"""
+        if sensor_type not in self._state:
+            raise ValueError(f"Unknown sensor type {sensor_type}")
+        if throttle < 0 or deadband < 0:
+            raise ValueError("Sensor throttle and deadband can't be negative")
+
+        if throttle or deadband:
+            self._filters[sensor_type] = (throttle, deadband)
+        else:
+            self._filters.pop(sensor_type, None)
+
+    def enable_history(self, size: int = SENSOR_HISTORY_SIZE) -> None:
+        """Store the last size values received of every sensor type"""
+        self._history = {sensor_type: SensorHistory(size) for sensor_type in self._state}
+
+    def history(self, sensor_type: str) -> SensorHistory | None:
+        """Return the history of a sensor type, None if not enabled"""
+        if self._history is None:
+            return None
+        return self._history.get(sensor_type)
+
+    def restore(self, values: dict) -> None:
+        """Set the last known values, without recording them in the history"""
+        for sensor_type in self._state:
+            value = self._getSensorValue(sensor_type, values)
+            if value is not None:
+                self._state[sensor_type] = value
+                self._notified[sensor_type] = value
+
+    def status_change_received(self, payload: Payload) -> bool:
+        """Call to notify a new status change, return true if a change has to be notified"""
+        if payload == self._payload and not self._held:
+            if self._history is not None:
+                self._store_history(self._state)
+            return False
+        self._payload = payload
+
+        values = codec.loads(payload)
+        if not isinstance(values, dict):
+            return False
 
+        notify = self._update(values)
+
+        if self._history is not None:
+            self._store_history(values)
+
+        return notify
+
+    def _update(self, values: dict) -> bool:
+        """Store the values, return true if a change has to be notified now"""
+        now = None
+        notify = False
+        held_until = None
+        self._held = False
         for s in self._state:
             newValue = self._getSensorValue(s, values)
-            if newValue:
-                self._state[s] = newValue
+            if newValue is None:
+                continue
+            self._state[s] = newValue
+
+            notified = self._notified[s]
+            if newValue == notified:
+                continue
+
+            sensor_filter = self._filters.get(s)
+            if sensor_filter is not None:
+                throttle, deadband = sensor_filter
+                if (
+                    deadband
+                    and isinstance(newValue, (int, float))
+                    and isinstance(notified, (int, float))
+                    and abs(newValue - notified) <= deadband
+                ):
+                    continue
+
+                if throttle:
+                    now = now or time.monotonic()
+                    window_end = self._notified_at.get(s, -throttle) + throttle
+                    if now < window_end:
+                        self._held = True
+                        held_until = window_end if held_until is None else min(held_until, window_end)
+                        continue
+                    self._notified_at[s] = now
+
+            self._notified[s] = newValue
+            notify = True
+
+        if held_until is not None and self._held_timer is None and self._loop is not None:
+            call_in_loop(self._loop, self._schedule_held, held_until - now)
+
+        return notify
+
+    def _schedule_held(self, delay: float) -> None:
+        if self._held_timer is None:
+            self._held_timer = self._loop.call_later(delay, self._notify_held)
+
+    def _notify_held(self) -> None:
+        """Notify the changes held back by the throttle, at the end of the window"""
+        self._held_timer = None
+        if self._held and self._update(self._state):
+            self._notify_state(self._payload)
+
+    def _store_history(self, values: dict) -> None:
+        now = time.monotonic()
+        for sensor_type, history in self._history.items():
+            value = self._getSensorValue(sensor_type, values)
+            if value is not None:
+                history.append(value, now)
+
+    def value(self, sensor_type: str) -> Any:
+        """Return the last value received of a sensor type"""
+        return self._state.get(sensor_type)
 
     @property
     def state(self) -> dict:
@@ -1,21 +1,170 @@
 """Shutter for pypglab"""
 
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import time
+import weakref
+from collections.abc import Callable, Iterable
+
 from .const import (
+    COMMAND_RETRIES,
+    COMMAND_TIMEOUT,
     ENTITY_SHUTTER,
+    LOGGER,
     SHUTTER_CMD_CLOSE,
     SHUTTER_CMD_OPEN,
     SHUTTER_CMD_STOP,
-    SHUTTER_STATE_CLOSED,
-    SHUTTER_STATE_CLOSING,
-    SHUTTER_STATE_OPEN,
-    SHUTTER_STATE_OPENING,
+    SHUTTER_MAX_TRAVEL_TIME,
+    SHUTTER_PAYLOAD_CLOSED,
+    SHUTTER_PAYLOAD_CLOSING,
+    SHUTTER_PAYLOAD_OPEN,
+    SHUTTER_PAYLOAD_OPENING,
+    SHUTTER_POSITION_TOLERANCE,
 )
-from .entity import Entity
+from .entity import Entity, Payload
+from .loop import call_in_loop, resolve_future
 from .mqtt import Client
+from .scheduler import CommandScheduler
+
+# the state payloads confirming a shutter command
+SHUTTER_COMMAND_STATES = {
+    SHUTTER_CMD_OPEN.encode(): (SHUTTER_PAYLOAD_OPENING, SHUTTER_PAYLOAD_OPEN),
+    SHUTTER_CMD_CLOSE.encode(): (SHUTTER_PAYLOAD_CLOSING, SHUTTER_PAYLOAD_CLOSED),
+    SHUTTER_CMD_STOP.encode(): (SHUTTER_PAYLOAD_OPEN, SHUTTER_PAYLOAD_CLOSED),
+}
+
+# the shutter positions in percent
+SHUTTER_POSITION_CLOSED = 0
+SHUTTER_POSITION_OPEN = 100
+
+# a timer is run when its deadline is within the clock resolution
+_CLOCK_RESOLUTION = time.get_clock_info("monotonic").resolution
+
+
+class ShutterTimerHandle:
+    """A call scheduled with the shutter timer"""
+
+    __slots__ = ("when", "_sequence", "_callback")
+
+    def __init__(self, when: float, sequence: int, callback: Callable[[], None]) -> None:
+        """Initialize"""
+        self.when = when
+        self._sequence = sequence
+        self._callback: Callable[[], None] | None = callback
+
+    def __lt__(self, other: ShutterTimerHandle) -> bool:
+        return (self.when, self._sequence) < (other.when, other._sequence)
+
+    def cancel(self) -> None:
+        """Cancel the call"""
+        self._callback = None
+
+    @property
+    def cancelled(self) -> bool:
+        """Return true if the call is cancelled or already run"""
+        return self._callback is None
+
+
+class ShutterTimer:
+    """A single event loop timer running the calls scheduled by all shutters.
+
+    The calls are kept in a heap by deadline and only the earliest one arms
+    the loop timer, so thousands of moving shutters cost one timer instead of
+    a task each. Every event loop has its own timer, returned by get().
+    """
+
+    _timers: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Initialize"""
+        self._loop = loop
+        self._heap: list[ShutterTimerHandle] = []
+        self._sequence = itertools.count()
+
+        # the loop timer armed for the earliest call
+        self._handle: asyncio.TimerHandle | None = None
+        self._armed: float | None = None
+
+    @classmethod
+    def get(cls, loop: asyncio.AbstractEventLoop | None = None) -> ShutterTimer:
+        """Return the timer of the loop, the running one when not given"""
+        loop = loop or asyncio.get_running_loop()
+        timer = cls._timers.get(loop)
+        if timer is None:
+            timer = cls._timers[loop] = cls(loop)
+        return timer
+
+    def call_later(self, delay: float, callback: Callable[[], None]) -> ShutterTimerHandle:
+        """Run the callback after delay seconds, to be called in the loop thread"""
+        handle = ShutterTimerHandle(self._loop.time() + delay, next(self._sequence), callback)
+        heapq.heappush(self._heap, handle)
+        if self._armed is None or handle.when < self._armed:
+            self._arm(handle.when)
+        return handle
+
+    def _arm(self, when: float) -> None:
+        if self._handle is not None:
+            self._handle.cancel()
+        self._armed = when
+        self._handle = self._loop.call_at(when, self._run)
+
+    def _run(self) -> None:
+        self._handle = None
+        self._armed = None
+
+        heap = self._heap
+        limit = self._loop.time() + _CLOCK_RESOLUTION
+        while heap and heap[0].when <= limit:
+            handle = heapq.heappop(heap)
+            callback = handle._callback
+            if callback is None:
+                continue
+            handle._callback = None
+            try:
+                callback()
+            except Exception:
+                LOGGER.exception("Shutter timer call failed")
+
+        # the cancelled calls don't arm the timer
+        while heap and heap[0].cancelled:
+            heapq.heappop(heap)
+        if heap:
+            self._arm(heap[0].when)
+
+    @property
+    def pending(self) -> int:
+        """Return the number of calls not run yet, the cancelled ones included until their deadline"""
+        return len(self._heap)
 
 
 class Shutter(Entity):
-    """It's a PG LAB Electronics shutter"""
+    """It's a PG LAB Electronics shutter.
+
+    The position is estimated from the state changes and the travel times,
+    learned from a full travel between the end stops or given with
+    set_travel_time(). A shutter opening or closing without a STOP command
+    sent by the library is assumed to reach its end stop.
+    """
+
+    __slots__ = (
+        "_state",
+        "_position",
+        "_open_time",
+        "_close_time",
+        "_travel_fixed",
+        "_direction",
+        "_move_start",
+        "_move_from",
+        "_stop_requested",
+        "_target",
+        "_stop_timer",
+        "_stop_task",
+        "_loop",
+        "_position_waiters",
+    )
 
     STATE_UNKNOWN = 0
     STATE_OPENING = 1
@@ -29,46 +178,372 @@ class Shutter(Entity):
         device_name: str,
         index: int,
         mqtt: Client,
+        scheduler: CommandScheduler | None = None,
     ) -> None:
         """Initialize"""
-        super().__init__(device_id, device_name, index, ENTITY_SHUTTER, mqtt)
+        super().__init__(device_id, device_name, index, ENTITY_SHUTTER, mqtt, scheduler)
 
         self._state = None
 
-    def status_change_received(self, payload: str) -> None:
+        # the last known position in percent and the seconds to fully open and close
+        self._position: float | None = None
+        self._open_time: float | None = None
+        self._close_time: float | None = None
+
+        # true when the travel times are given, they are not learned
+        self._travel_fixed = False
+
+        # the running movement, 1 opening, -1 closing, with its start time and position
+        self._direction = 0
+        self._move_start = 0.0
+        self._move_from: float | None = None
+
+        # true when the movement is stopped by a STOP command
+        self._stop_requested = False
+
+        # the position requested by set_position and its scheduled STOP command
+        self._target: float | None = None
+        self._stop_timer: ShutterTimerHandle | None = None
+        self._stop_task: asyncio.Task | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._position_waiters: list[asyncio.Future] | None = None
+
+    def status_change_received(self, payload: Payload) -> None:
         """Callback to notify a new status change"""
+        if isinstance(payload, str):
+            payload = payload.encode()
 
-        if payload == SHUTTER_STATE_OPENING:
+        if payload == SHUTTER_PAYLOAD_OPENING:
             self._state = Shutter.STATE_OPENING
-        elif payload == SHUTTER_STATE_OPEN:
+            self._moving(1)
+        elif payload == SHUTTER_PAYLOAD_OPEN:
             self._state = Shutter.STATE_OPEN
-        elif payload == SHUTTER_STATE_CLOSING:
+            self._stopped(SHUTTER_POSITION_OPEN)
+        elif payload == SHUTTER_PAYLOAD_CLOSING:
             self._state = Shutter.STATE_CLOSING
-        elif payload == SHUTTER_STATE_CLOSED:
+            self._moving(-1)
+        elif payload == SHUTTER_PAYLOAD_CLOSED:
+            self._state = Shutter.STATE_CLOSED
+            self._stopped(SHUTTER_POSITION_CLOSED)
+
+    def restore(self, payload: Payload, position: float | None = None) -> None:
+        """Set the last known state and position, a movement in progress is ignored"""
+        if isinstance(payload, str):
+            payload = payload.encode()
+
+        if payload == SHUTTER_PAYLOAD_OPEN:
+            self._state = Shutter.STATE_OPEN
+        elif payload == SHUTTER_PAYLOAD_CLOSED:
             self._state = Shutter.STATE_CLOSED
+            if position is None:
+                position = SHUTTER_POSITION_CLOSED
+        else:
+            return
+        self._position = position
+
+    def _travel_time(self, direction: int) -> float | None:
+        return self._open_time if direction > 0 else self._close_time
+
+    def _estimate(self, now: float) -> float | None:
+        """Return the position at the monotonic time now, None if unknown"""
+        if not self._direction:
+            return self._position
+
+        travel = self._travel_time(self._direction)
+        if self._move_from is None or travel is None:
+            return None
+
+        position = self._move_from + self._direction * (now - self._move_start) / travel * 100
+        return min(SHUTTER_POSITION_OPEN, max(SHUTTER_POSITION_CLOSED, position))
+
+    def _moving(self, direction: int) -> None:
+        """The shutter started moving, or it is still moving"""
+        if self._direction != direction:
+            now = time.monotonic()
+            self._move_from = self._estimate(now)
+            self._move_start = now
+            self._direction = direction
+
+        if self._target is not None:
+            call_in_loop(self._loop, self._schedule_stop)
+
+    def _stopped(self, end: int) -> None:
+        """The shutter stopped, end is the position of the end stop of the state"""
+        now = time.monotonic()
+        direction = self._direction
+        reached = direction == (1 if end == SHUTTER_POSITION_OPEN else -1) and not self._stop_requested
+
+        if end == SHUTTER_POSITION_CLOSED or reached:
+            # learn the travel time from a full travel between the end stops
+            if reached and self._move_from == SHUTTER_POSITION_OPEN - end and not self._travel_fixed:
+                if direction > 0:
+                    self._open_time = now - self._move_start
+                else:
+                    self._close_time = now - self._move_start
+            self._position = end
+        elif direction:
+            # stopped halfway
+            self._position = self._estimate(now)
+
+        self._direction = 0
+        self._stop_requested = False
+        self._target = None
+        if self._stop_timer is not None:
+            call_in_loop(self._loop, self._stop_timer.cancel)
+            self._stop_timer = None
 
-    async def open(self) -> None:
-        """Open the shutter"""
-        await self.set_state(SHUTTER_CMD_OPEN)
+        if self._position_waiters:
+            for waiter in self._position_waiters:
+                resolve_future(waiter, True)
 
-    async def close(self) -> None:
-        """Close the shutter"""
-        await self.set_state(SHUTTER_CMD_CLOSE)
+    def _schedule_stop(self) -> None:
+        """Schedule the STOP command when the shutter is estimated to reach the requested position"""
+        target = self._target
+        travel = self._travel_time(self._direction)
+        position = self._estimate(time.monotonic())
+        if target is None or travel is None or position is None:
+            return
 
-    async def stop(self) -> None:
-        """Stop the shutter"""
-        await self.set_state(SHUTTER_CMD_STOP)
+        if self._stop_timer is not None:
+            self._stop_timer.cancel()
+
+        delay = max(0.0, (target - position) * self._direction / 100 * travel)
+        self._stop_timer = ShutterTimer.get(self._loop).call_later(delay, self._stop_at_target)
+
+    def _stop_at_target(self) -> None:
+        self._stop_timer = None
+        self._stop_task = self._loop.create_task(self.stop())
+
+    def set_travel_time(self, open_time: float, close_time: float | None = None) -> None:
+        """Set the seconds to fully open and to fully close the shutter, they are not learned anymore"""
+        if open_time <= 0 or (close_time is not None and close_time <= 0):
+            raise ValueError("Shutter travel time must be greater than zero")
+
+        self._open_time = open_time
+        self._close_time = close_time or open_time
+        self._travel_fixed = True
+
+    async def set_position(
+        self, position: float, timeout: float = COMMAND_TIMEOUT, retries: int = COMMAND_RETRIES
+    ) -> bool:
+        """Move the shutter to position percent, 0 closed and 100 open, and wait until it stops.
+
+        The partial positions need the current position and the travel time,
+        return false if they are unknown, the shutter doesn't move or it is
+        stopped before reaching an end stop.
+        """
+        if not SHUTTER_POSITION_CLOSED <= position <= SHUTTER_POSITION_OPEN:
+            raise ValueError(f"Shutter position {position} not in range 0-100")
+
+        current = self._estimate(time.monotonic())
+        if current is not None and not self._direction and abs(position - current) <= SHUTTER_POSITION_TOLERANCE:
+            return True
+
+        end = position in (SHUTTER_POSITION_CLOSED, SHUTTER_POSITION_OPEN)
+        if current is None:
+            direction = 1 if position == SHUTTER_POSITION_OPEN else -1
+        else:
+            direction = 1 if position > current else -1
+
+        if not end and (current is None or self._travel_time(direction) is None):
+            LOGGER.warning("Position of %s unknown, open or close it fully first", self.state_topic)
+            return False
+
+        loop = asyncio.get_running_loop()
+        self._loop = loop
+        self._target = None if end else position
+        self._stop_requested = False
+
+        if self._position_waiters is None:
+            self._position_waiters = []
+        waiter = loop.create_future()
+        self._position_waiters.append(waiter)
+
+        try:
+            command = SHUTTER_CMD_OPEN if direction > 0 else SHUTTER_CMD_CLOSE
+            if not await self.set_state(command, True, timeout, retries):
+                self._target = None
+                return False
+
+            # the movement can be stopped by another command, the waiter is resolved at every stop
+            travel = self._travel_time(direction) or SHUTTER_MAX_TRAVEL_TIME
+            await asyncio.wait_for(waiter, travel + timeout)
+
+            # an end stop can be missed if the shutter is stopped by another command
+            return not end or self._position == position
+        except asyncio.TimeoutError:
+            LOGGER.warning("Shutter %s didn't stop at position %s", self.state_topic, position)
+            return False
+        finally:
+            self._position_waiters.remove(waiter)
+
+    def confirms(self, command: bytes, payload: bytes) -> bool:
+        """Return true if the state payload confirms the command"""
+        return payload in SHUTTER_COMMAND_STATES.get(command, ())
+
+    async def open(
+        self, confirm: bool = False, timeout: float = COMMAND_TIMEOUT, retries: int = COMMAND_RETRIES
+    ) -> bool:
+        """Open the shutter, with confirm wait until the shutter is opening"""
+        self._stop_requested = False
+        return await self.set_state(SHUTTER_CMD_OPEN, confirm, timeout, retries)
+
+    async def close(
+        self, confirm: bool = False, timeout: float = COMMAND_TIMEOUT, retries: int = COMMAND_RETRIES
+    ) -> bool:
+        """Close the shutter, with confirm wait until the shutter is closing"""
+        self._stop_requested = False
+        return await self.set_state(SHUTTER_CMD_CLOSE, confirm, timeout, retries)
+
+    async def stop(
+        self, confirm: bool = False, timeout: float = COMMAND_TIMEOUT, retries: int = COMMAND_RETRIES
+    ) -> bool:
+        """Stop the shutter, with confirm wait until the shutter is stopped"""
+        # an idle shutter may not report any state, the next movement must not look stopped
+        self._stop_requested = bool(self._direction)
+        return await self.set_state(SHUTTER_CMD_STOP, confirm, timeout, retries)
 
     @property
     def state(self) -> int:
         """Get shutter status"""
         return self._state
 
+    @property
+    def position(self) -> float | None:
+        """Get the estimated position in percent, 0 closed and 100 open, None if unknown"""
+        return self._estimate(time.monotonic())
+
+    @property
+    def travel_time(self) -> tuple[float | None, float | None]:
+        """Get the seconds to fully open and to fully close the shutter, None if unknown"""
+        return self._open_time, self._close_time
+
+
+class ShutterGroup:
+    """Move many shutters, of any device, limiting the motors started together.
+
+    The motors are started at least stagger seconds apart and at most
+    max_moving shutters are moving at the same time, a shutter leaves its
+    place to the next one when it stops. The shutters with the longest
+    expected travel are started first, so the group completes as soon as
+    the limits allow. A new operation cancels the shutters of the previous
+    one not started yet.
+    """
+
+    def __init__(self, shutters: Iterable[Shutter], stagger: float = 0, max_moving: int | None = None) -> None:
+        """Initialize"""
+        if stagger < 0:
+            raise ValueError("Shutter stagger can't be negative")
+        if max_moving is not None and max_moving < 1:
+            raise ValueError("At least one shutter must be allowed to move")
+
+        self._shutters = list(shutters)
+        self._stagger = stagger
+        self._max_moving = max_moving
+
+        # the operation running, the shutters waiting to start are skipped when it changes
+        self._operation = 0
+
+        # the earliest time the next motor can start
+        self._next_start = 0.0
+
+        # the shutters with a slot, waiting for the stagger or moving
+        self._started: set[Shutter] = set()
+
+    def _expected_travel(self, shutter: Shutter, position: float) -> float:
+        """Return the seconds the shutter is expected to move to reach the position"""
+        current = shutter.position
+        open_time, close_time = shutter.travel_time
+        travel = open_time if current is None or position > current else close_time
+        if travel is None:
+            return SHUTTER_MAX_TRAVEL_TIME
+        if current is None:
+            return travel
+        return abs(position - current) / 100 * travel
+
+    async def set_position(
+        self, position: float, timeout: float = COMMAND_TIMEOUT, retries: int = COMMAND_RETRIES
+    ) -> dict[Shutter, bool]:
+        """Move all shutters to position percent and wait until they stop, return the result of every shutter"""
+        if not SHUTTER_POSITION_CLOSED <= position <= SHUTTER_POSITION_OPEN:
+            raise ValueError(f"Shutter position {position} not in range 0-100")
+
+        self._operation += 1
+        operation = self._operation
+        loop = asyncio.get_running_loop()
+        slots = asyncio.Semaphore(self._max_moving or len(self._shutters) or 1)
+
+        async def move(shutter: Shutter) -> bool:
+            # a shutter already in position doesn't start its motor
+            current = shutter.position
+            moving = shutter.state in (Shutter.STATE_OPENING, Shutter.STATE_CLOSING)
+            if not moving and current is not None and abs(position - current) <= SHUTTER_POSITION_TOLERANCE:
+                return True
+
+            async with slots:
+                if operation != self._operation:
+                    return False
+
+                self._started.add(shutter)
+                try:
+                    now = loop.time()
+                    start = max(now, self._next_start)
+                    self._next_start = start + self._stagger
+                    if start > now:
+                        await asyncio.sleep(start - now)
+
+                        # the group can be stopped while waiting for the stagger
+                        if operation != self._operation:
+                            return False
+
+                    return await shutter.set_position(position, timeout, retries)
+                finally:
+                    self._started.discard(shutter)
+
+        # the longest travels first
+        shutters = sorted(self._shutters, key=lambda shutter: self._expected_travel(shutter, position), reverse=True)
+        results = await asyncio.gather(*(move(shutter) for shutter in shutters))
+        return dict(zip(shutters, results))
+
+    async def open(self, timeout: float = COMMAND_TIMEOUT, retries: int = COMMAND_RETRIES) -> dict[Shutter, bool]:
+        """Open all shutters and wait until they are open"""
+        return await self.set_position(SHUTTER_POSITION_OPEN, timeout, retries)
+
+    async def close(self, timeout: float = COMMAND_TIMEOUT, retries: int = COMMAND_RETRIES) -> dict[Shutter, bool]:
+        """Close all shutters and wait until they are closed"""
+        return await self.set_position(SHUTTER_POSITION_CLOSED, timeout, retries)
+
+    async def stop(self, timeout: float = COMMAND_TIMEOUT, retries: int = COMMAND_RETRIES) -> dict[Shutter, bool]:
+        """Stop all shutters at once, the shutters not started yet are not moved.
+
+        The STOP command is sent only to the shutters moving or started by the
+        group, the idle ones are already stopped.
+        """
+        self._operation += 1
+
+        async def stop(shutter: Shutter) -> bool:
+            moving = shutter.state in (Shutter.STATE_OPENING, Shutter.STATE_CLOSING)
+            if not moving and shutter not in self._started:
+                return True
+            return await shutter.stop(True, timeout, retries)
+
+        results = await asyncio.gather(*(stop(shutter) for shutter in self._shutters))
+        return dict(zip(self._shutters, results))
+
+    @property
+    def shutters(self) -> list[Shutter]:
+        """Get the shutters of the group"""
+        return list(self._shutters)
+
 
 async def CreateShutter(
-    device_id: str, device_name: str, index: int, mqtt: Client
+    device_id: str,
+    device_name: str,
+    index: int,
+    mqtt: Client,
+    scheduler: CommandScheduler | None = None,
 ) -> Shutter:
     """Create and initialize a PG LAB shutter instance"""
 
-    shutter = Shutter(device_id, device_name, index, mqtt)
+    shutter = Shutter(device_id, device_name, index, mqtt, scheduler)
     return shutter
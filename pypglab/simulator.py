@@ -0,0 +1,572 @@
+"""PG LAB devices simulator for pypglab"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import zlib
+from typing import Any
+
+from paho.mqtt.client import MQTT_ERR_NO_CONN, MQTT_ERR_SUCCESS, MQTTMessageInfo
+
+from .const import (
+    CONFIG_EBOARD_BOARDS,
+    CONFIG_EBOARD_SHUTTERS,
+    CONFIG_FIRMWARE_VERSION,
+    CONFIG_HARDWARE_VERSION,
+    CONFIG_ID,
+    CONFIG_IP,
+    CONFIG_MAC,
+    CONFIG_MANUFACTURER,
+    CONFIG_NAME,
+    CONFIG_PARAMETERS,
+    CONFIG_TYPE,
+    E_BOARD,
+    E_RELAY,
+    E_SWITCH,
+    ENTITY_RELAY,
+    ENTITY_SENSOR,
+    ENTITY_SHUTTER,
+    ENTITY_SWITCH,
+    MANUFACTURER,
+    PGLAB_DISCOVERY_TOPIC,
+    RELAY_STATE_OFF,
+    RELAY_STATE_ON,
+    SENSOR_REBOOT_TIME,
+    SENSOR_TEMPERATURE,
+    SENSOR_VOLTAGE,
+    SHUTTER_CMD_CLOSE,
+    SHUTTER_CMD_OPEN,
+    SHUTTER_CMD_STOP,
+    SHUTTER_STATE_CLOSED,
+    SHUTTER_STATE_CLOSING,
+    SHUTTER_STATE_OPEN,
+    SHUTTER_STATE_OPENING,
+)
+from .entity import entity_topic
+from .router import TOPIC_SEPARATOR, WILDCARD_MULTI_LEVEL, WILDCARD_SINGLE_LEVEL, TopicRouter
+
+# time in seconds for a simulated shutter to fully open or close
+SHUTTER_TRAVEL_TIME = 1.0
+
+
+def _topic_matches(topic_filter: str, topic: str) -> bool:
+    """Return true if the topic filter matches the topic"""
+    filter_levels = topic_filter.split(TOPIC_SEPARATOR)
+    topic_levels = topic.split(TOPIC_SEPARATOR)
+
+    for index, level in enumerate(filter_levels):
+        if level == WILDCARD_MULTI_LEVEL:
+            return True
+        if index == len(topic_levels):
+            return False
+        if level != WILDCARD_SINGLE_LEVEL and level != topic_levels[index]:
+            return False
+
+    return len(filter_levels) == len(topic_levels)
+
+
+class SimulatedMessage:
+    """A received MQTT message, with the same attributes as the paho one"""
+
+    __slots__ = ("topic", "payload", "qos", "retain")
+
+    def __init__(self, topic: str, payload: bytes, qos: int = 0, retain: bool = False) -> None:
+        """Initialize"""
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+
+
+class SimulatedBroker:
+    """An in-process stand-in of a MQTT broker.
+
+    The messages are routed with the same topic router used by pypglab and
+    delivered later in the event loop, as if they were received from a
+    socket. The retained messages are delivered to the new subscriptions.
+    The broker can be used from any thread, the loop is the running one when
+    not given, bound when the broker or its first client is created in it.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop | None = None) -> None:
+        """Initialize"""
+        self._loop = loop
+        self._bind_loop()
+        self._router = TopicRouter()
+        self._retained: dict[str, bytes] = {}
+        self._published = 0
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """Return the event loop delivering the messages"""
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+        return self._loop
+
+    def _bind_loop(self) -> None:
+        """Use the running loop, if any, the clients connect from executor threads"""
+        if self._loop is None:
+            try:
+                self._loop = asyncio.get_running_loop()
+            except RuntimeError:
+                pass
+
+    def client(self) -> SimulatedMqttClient:
+        """Return a new client connected to this broker"""
+        self._bind_loop()
+        return SimulatedMqttClient(self)
+
+    def publish(self, topic: str, payload: Any = None, retain: bool = False) -> None:
+        """Publish a message to all subscribed clients"""
+        if payload is None:
+            payload = b""
+        elif isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        elif not isinstance(payload, bytes):
+            payload = str(payload).encode("utf-8")
+
+        self.loop.call_soon_threadsafe(self._route, topic, payload, retain)
+
+    def subscribe(self, client: SimulatedMqttClient, topic_filter: str) -> None:
+        """Subscribe a client to a topic filter"""
+        self.loop.call_soon_threadsafe(self._subscribe, client, topic_filter)
+
+    def unsubscribe(self, client: SimulatedMqttClient, topic_filter: str) -> None:
+        """Unsubscribe a client from a topic filter"""
+        self.loop.call_soon_threadsafe(self._router.remove, topic_filter, client)
+
+    def _route(self, topic: str, payload: bytes, retain: bool) -> None:
+        self._published = self._published + 1
+
+        if retain:
+            if payload:
+                self._retained[topic] = payload
+            else:
+                self._retained.pop(topic, None)
+
+        # a client with overlapping subscriptions receives the message once
+        message = SimulatedMessage(topic, payload)
+        for client in dict.fromkeys(self._router.match(topic)):
+            client._deliver(message)
+
+    def _subscribe(self, client: SimulatedMqttClient, topic_filter: str) -> None:
+        self._router.add(topic_filter, client)
+
+        # only the topics starting with the filter levels before the first wildcard can match
+        prefix = topic_filter
+        for wildcard in (WILDCARD_SINGLE_LEVEL, WILDCARD_MULTI_LEVEL):
+            prefix = prefix.split(wildcard, 1)[0]
+
+        for topic, payload in list(self._retained.items()):
+            if topic.startswith(prefix) and _topic_matches(topic_filter, topic):
+                client._deliver(SimulatedMessage(topic, payload, retain=True))
+
+    @property
+    def published(self) -> int:
+        """Return the number of messages published to the broker"""
+        return self._published
+
+
+class SimulatedMqttClient:
+    """A client of the simulated broker with the paho client interface used by pypglab"""
+
+    def __init__(self, broker: SimulatedBroker) -> None:
+        """Initialize"""
+        self._broker = broker
+        self._userdata = None
+        self._connected = False
+        self._connecting = False
+        self._subscriptions: set[str] = set()
+
+        # number of subscribe requests sent to the broker
+        self.subscribe_requests = 0
+
+        self.on_connect = None
+        self.on_disconnect = None
+        self.on_message = None
+
+        # there is no socket, these callbacks are never called
+        self.on_socket_open = None
+        self.on_socket_close = None
+        self.on_socket_register_write = None
+        self.on_socket_unregister_write = None
+
+    def user_data_set(self, userdata: Any) -> None:
+        """Set the user data passed to the callbacks"""
+        self._userdata = userdata
+
+    def username_pw_set(self, username: str, password: str | None = None) -> None:
+        """Accept any credential"""
+
+    def connect(self, host: str = "", port: int = 1883, keepalive: int = 60) -> int:
+        """Connect to the simulated broker, host and port are ignored"""
+        self._connecting = True
+        self._broker.loop.call_soon_threadsafe(self._on_connected)
+        return MQTT_ERR_SUCCESS
+
+    def reconnect(self) -> int:
+        """Connect again to the simulated broker"""
+        return self.connect()
+
+    def disconnect(self) -> int:
+        """Disconnect from the simulated broker"""
+        self._connecting = False
+        self._broker.loop.call_soon_threadsafe(self._on_disconnected)
+        return MQTT_ERR_SUCCESS
+
+    def loop_start(self) -> int:
+        """The messages are delivered by the broker event loop"""
+        return MQTT_ERR_SUCCESS
+
+    def loop_stop(self) -> int:
+        """The messages are delivered by the broker event loop"""
+        return MQTT_ERR_SUCCESS
+
+    def loop_misc(self) -> int:
+        """Nothing to do without a socket"""
+        return MQTT_ERR_SUCCESS if self._connected else MQTT_ERR_NO_CONN
+
+    def subscribe(self, topic: str | list[tuple[str, int]], qos: int = 0) -> tuple[int, int | None]:
+        """Subscribe to a topic filter, or to a list of (topic filter, qos) with a single request"""
+        if not self._connected:
+            return MQTT_ERR_NO_CONN, None
+
+        self.subscribe_requests += 1
+        topics = [topic] if isinstance(topic, str) else [topic_filter for topic_filter, _ in topic]
+        for topic_filter in topics:
+            if topic_filter not in self._subscriptions:
+                self._subscriptions.add(topic_filter)
+                self._broker.subscribe(self, topic_filter)
+        return MQTT_ERR_SUCCESS, 0
+
+    def unsubscribe(self, topic: str) -> tuple[int, int]:
+        """Unsubscribe from a topic filter"""
+        if topic in self._subscriptions:
+            self._subscriptions.discard(topic)
+            self._broker.unsubscribe(self, topic)
+        return MQTT_ERR_SUCCESS, 0
+
+    def publish(self, topic: str, payload: Any = None, qos: int = 0, retain: bool = False) -> MQTTMessageInfo:
+        """Publish a message to the simulated broker, like paho it is lost without the connection"""
+        info = MQTTMessageInfo(0)
+        if self._connected:
+            self._broker.publish(topic, payload, retain)
+            info.rc = MQTT_ERR_SUCCESS
+        else:
+            info.rc = MQTT_ERR_NO_CONN
+        return info
+
+    def is_connected(self) -> bool:
+        """Return true if connected to the simulated broker"""
+        return self._connected
+
+    def _on_connected(self) -> None:
+        # disconnected before the connection was established
+        if not self._connecting:
+            return
+
+        self._connected = True
+        if self.on_connect:
+            self.on_connect(self, self._userdata, None, 0, None)
+
+    def _on_disconnected(self) -> None:
+        self._connected = False
+        for topic in self._subscriptions:
+            self._broker.unsubscribe(self, topic)
+        self._subscriptions.clear()
+
+        if self.on_disconnect:
+            self.on_disconnect(self, self._userdata, None, 0, None)
+
+    def _deliver(self, message: SimulatedMessage) -> None:
+        if self._connected and self.on_message:
+            self.on_message(self, self._userdata, message)
+
+
+class VirtualDevice:
+    """A simulated PG LAB device.
+
+    The device publishes its retained discovery message and echoes every
+    command received on a `set` topic to the `state` topic of the entity.
+    """
+
+    def __init__(
+        self,
+        broker: SimulatedBroker,
+        name: str,
+        device_type: str,
+        parameters: dict | None = None,
+        firmware_version: str = "1.0.0",
+    ) -> None:
+        """Initialize"""
+        self._broker = broker
+        self._name = name
+        self._type = device_type
+        self._parameters = parameters
+        self._firmware_version = firmware_version
+        self._client = broker.client()
+        self._client.on_connect = self._on_connect
+        self._client.on_message = self._on_message
+
+        # the last state published for every entity topic
+        self._states: dict[str, str] = {}
+
+        # number of the next commands lost, to simulate an unreliable network
+        self.drop_commands = 0
+
+    @property
+    def discovery_message(self) -> dict:
+        """Return the discovery message of the device"""
+        mac = zlib.crc32(self._name.encode("utf-8"))
+        message = {
+            CONFIG_IP: f"10.{mac >> 16 & 255}.{mac >> 8 & 255}.{mac & 255}",
+            CONFIG_MAC: ":".join(f"{byte:02X}" for byte in (0x02, 0, *mac.to_bytes(4, "big"))),
+            CONFIG_NAME: self._name,
+            CONFIG_HARDWARE_VERSION: "1.0.0",
+            CONFIG_FIRMWARE_VERSION: self._firmware_version,
+            CONFIG_TYPE: self._type,
+            CONFIG_ID: self._name.lower(),
+            CONFIG_MANUFACTURER: MANUFACTURER,
+        }
+        if self._parameters is not None:
+            message[CONFIG_PARAMETERS] = self._parameters
+        return message
+
+    def start(self) -> None:
+        """Connect the device to the broker, the discovery message is published once connected"""
+        self._client.connect()
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties) -> None:
+        self._client.subscribe(f"pglab/{self._name}/+/+/set")
+        self._client.publish(
+            f"{PGLAB_DISCOVERY_TOPIC}/{self._name}/config",
+            json.dumps(self.discovery_message),
+            retain=True,
+        )
+
+    def stop(self) -> None:
+        """Disconnect the device from the broker"""
+        self._client.disconnect()
+
+    def publish_state(self, entity_type: str, index: int, state: str) -> None:
+        """Publish the state of an entity"""
+        topic = entity_topic(self._name, entity_type, index, "state")
+        self._states[topic] = state
+        self._client.publish(topic, state)
+
+    def publish_sensor(self, temperature: int = 25, voltage: int = 230, reboot_time: int = 0) -> None:
+        """Publish the status sensor values"""
+        values = {
+            SENSOR_TEMPERATURE: temperature,
+            SENSOR_VOLTAGE: voltage,
+            SENSOR_REBOOT_TIME: reboot_time,
+        }
+        self._client.publish(entity_topic(self._name, ENTITY_SENSOR, 0, "value"), json.dumps(values))
+
+    def state(self, entity_type: str, index: int) -> str | None:
+        """Return the last state published for an entity"""
+        return self._states.get(entity_topic(self._name, entity_type, index, "state"))
+
+    def _on_message(self, client, userdata, message: SimulatedMessage) -> None:
+        if self.drop_commands > 0:
+            self.drop_commands = self.drop_commands - 1
+            return
+
+        # pglab/<name>/<entity type>/<index>/set
+        levels = message.topic.split("/")
+        try:
+            index = int(levels[3])
+        except (IndexError, ValueError):
+            return
+        self.command_received(levels[2], index, message.payload.decode("utf-8"))
+
+    def command_received(self, entity_type: str, index: int, command: str) -> None:
+        """Execute a command, echo the relay commands by default"""
+        if entity_type == ENTITY_RELAY and command in (RELAY_STATE_ON, RELAY_STATE_OFF):
+            self.publish_state(entity_type, index, command)
+
+    @property
+    def name(self) -> str:
+        """Return the device name"""
+        return self._name
+
+    @property
+    def type(self) -> str:
+        """Return the device type"""
+        return self._type
+
+
+class VirtualEBoard(VirtualDevice):
+    """A simulated E-Board with relays and shutters taking travel_time seconds for a full travel"""
+
+    def __init__(
+        self,
+        broker: SimulatedBroker,
+        name: str,
+        shutters: int = 0,
+        boards: str = "10000000",
+        travel_time: float = SHUTTER_TRAVEL_TIME,
+        firmware_version: str = "1.0.0",
+    ) -> None:
+        """Initialize"""
+        parameters = {CONFIG_EBOARD_SHUTTERS: shutters, CONFIG_EBOARD_BOARDS: boards}
+        super().__init__(broker, name, E_BOARD, parameters, firmware_version)
+        self._travel_time = travel_time
+
+        # the shutter positions in percent, 0 closed and 100 open, all start closed
+        self._positions: dict[int, float] = {}
+
+        # the running shutter movements by shutter index: timer, direction, start time and position
+        self._movements: dict[int, tuple[asyncio.TimerHandle, int, float, float]] = {}
+
+    def command_received(self, entity_type: str, index: int, command: str) -> None:
+        """Execute a relay or shutter command"""
+        if entity_type != ENTITY_SHUTTER:
+            super().command_received(entity_type, index, command)
+            return
+
+        if command == SHUTTER_CMD_OPEN:
+            self._move(index, 1)
+        elif command == SHUTTER_CMD_CLOSE:
+            self._move(index, -1)
+        elif command == SHUTTER_CMD_STOP:
+            if self._cancel_movement(index):
+                # a shutter stopped halfway is partially open
+                self.publish_state(ENTITY_SHUTTER, index, SHUTTER_STATE_OPEN)
+            else:
+                # already stopped, publish the state again
+                self.publish_state(ENTITY_SHUTTER, index, self.state(ENTITY_SHUTTER, index) or SHUTTER_STATE_OPEN)
+
+    def position(self, index: int) -> float:
+        """Return the current position of a shutter in percent"""
+        movement = self._movements.get(index)
+        if movement is None:
+            return self._positions.get(index, 0.0)
+
+        _, direction, start, start_position = movement
+        position = start_position + direction * (self._broker.loop.time() - start) / self._travel_time * 100
+        return min(100.0, max(0.0, position))
+
+    def _move(self, index: int, direction: int) -> None:
+        moving_state, final_state, end = (
+            (SHUTTER_STATE_OPENING, SHUTTER_STATE_OPEN, 100.0)
+            if direction > 0
+            else (SHUTTER_STATE_CLOSING, SHUTTER_STATE_CLOSED, 0.0)
+        )
+
+        movement = self._movements.get(index)
+        position = self.position(index)
+        if (movement is not None and movement[1] == direction) or (movement is None and position == end):
+            # already moving or arrived, publish the state again
+            self.publish_state(ENTITY_SHUTTER, index, moving_state if movement else final_state)
+            return
+
+        self._cancel_movement(index)
+        self.publish_state(ENTITY_SHUTTER, index, moving_state)
+
+        loop = self._broker.loop
+        travel = abs(end - position) / 100 * self._travel_time
+        timer = loop.call_later(travel, self._moved, index, final_state, end)
+        self._movements[index] = (timer, direction, loop.time(), position)
+
+    def _moved(self, index: int, final_state: str, end: float) -> None:
+        del self._movements[index]
+        self._positions[index] = end
+        self.publish_state(ENTITY_SHUTTER, index, final_state)
+
+    def _cancel_movement(self, index: int) -> bool:
+        if index not in self._movements:
+            return False
+        self._positions[index] = self.position(index)
+        self._movements.pop(index)[0].cancel()
+        return True
+
+    def stop(self) -> None:
+        """Stop the shutters and disconnect the device from the broker"""
+        for index in list(self._movements):
+            self._cancel_movement(index)
+        super().stop()
+
+
+class VirtualERelay(VirtualDevice):
+    """A simulated E-Relay"""
+
+    def __init__(self, broker: SimulatedBroker, name: str, firmware_version: str = "1.0.0") -> None:
+        """Initialize"""
+        super().__init__(broker, name, E_RELAY, None, firmware_version)
+
+
+class VirtualESwitch(VirtualDevice):
+    """A simulated E-Switch, its inputs are changed with set_switch()"""
+
+    def __init__(self, broker: SimulatedBroker, name: str, firmware_version: str = "1.0.0") -> None:
+        """Initialize"""
+        super().__init__(broker, name, E_SWITCH, None, firmware_version)
+
+    def set_switch(self, index: int, on: bool) -> None:
+        """Change the state of a switch input"""
+        self.publish_state(ENTITY_SWITCH, index, RELAY_STATE_ON if on else RELAY_STATE_OFF)
+
+
+class Simulator:
+    """A simulated broker with a fleet of virtual PG LAB devices.
+
+    The helpers are connected to the simulator with the client() mqtt client:
+
+        simulator = Simulator()
+        simulator.add_eboard("E-BOARD-1", shutters=1)
+        pglab = AsyncPgLab(mqtt_client=simulator.client())
+        await pglab.connect("simulator")
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop | None = None) -> None:
+        """Initialize"""
+        self._broker = SimulatedBroker(loop)
+        self._devices: dict[str, VirtualDevice] = {}
+
+    def client(self) -> SimulatedMqttClient:
+        """Return a new mqtt client connected to the simulated broker"""
+        return self._broker.client()
+
+    def add_device(self, device: VirtualDevice) -> VirtualDevice:
+        """Add a virtual device and start it"""
+        self._devices[device.name] = device
+        device.start()
+        return device
+
+    def add_eboard(self, name: str, shutters: int = 0, boards: str = "10000000", **kwargs) -> VirtualEBoard:
+        """Add a virtual E-Board"""
+        return self.add_device(VirtualEBoard(self._broker, name, shutters, boards, **kwargs))
+
+    def add_erelay(self, name: str, **kwargs) -> VirtualERelay:
+        """Add a virtual E-Relay"""
+        return self.add_device(VirtualERelay(self._broker, name, **kwargs))
+
+    def add_eswitch(self, name: str, **kwargs) -> VirtualESwitch:
+        """Add a virtual E-Switch"""
+        return self.add_device(VirtualESwitch(self._broker, name, **kwargs))
+
+    def add_eboards(self, count: int, prefix: str = "E-BOARD", **kwargs) -> list[VirtualEBoard]:
+        """Add many virtual E-Boards named prefix-000000, prefix-000001, ..."""
+        return [self.add_eboard(f"{prefix}-{index:06d}", **kwargs) for index in range(count)]
+
+    def remove_device(self, name: str) -> None:
+        """Stop a virtual device and remove its discovery message"""
+        device = self._devices.pop(name)
+        device.stop()
+        self._broker.publish(f"{PGLAB_DISCOVERY_TOPIC}/{name}/config", None, retain=True)
+
+    def device(self, name: str) -> VirtualDevice | None:
+        """Return a virtual device by name"""
+        return self._devices.get(name)
+
+    @property
+    def broker(self) -> SimulatedBroker:
+        """Return the simulated broker"""
+        return self._broker
+
+    @property
+    def devices(self) -> list[VirtualDevice]:
+        """Return the virtual devices"""
+        return list(self._devices.values())
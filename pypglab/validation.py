@@ -6,7 +6,36 @@ import ipaddress
 import re
 import voluptuous as vol
 
-from . const import PGLAB_DEVICE_TYPES, E_BOARD, E_RELAY, E_SWITCH, MANUFACTURER
+from . const import (
+    PGLAB_DEVICE_TYPES,
+    E_BOARD,
+    E_RELAY,
+    E_SWITCH,
+    MANUFACTURER,
+    CONFIG_MAC,
+    CONFIG_IP,
+    CONFIG_ID,
+    CONFIG_NAME,
+    CONFIG_TYPE,
+    CONFIG_MANUFACTURER,
+    CONFIG_HARDWARE_VERSION,
+    CONFIG_FIRMWARE_VERSION,
+    CONFIG_PARAMETERS,
+    CONFIG_EBOARD_SHUTTERS,
+    CONFIG_EBOARD_BOARDS,
+)
+
+# compiled only once, the discovery messages of the whole fleet are validated at every broker reconnection,
+# the fast path uses fullmatch since $ also matches before a trailing newline
+MAC_ADDRESS_REGEX = re.compile(r"([0-9a-fA-F]{2}[-:]){5}[0-9a-fA-F]{2}$")
+VERSION_REGEX = re.compile(r"^([0-9]+)\.([0-9]+)\.([0-9]+)?$")
+BOARDS_REGEX = re.compile(r"^[0-1]{8}$")
+IPV4_ADDRESS_REGEX = re.compile(
+    r"(25[0-5]|2[0-4][0-9]|1[0-9]{2}|[1-9]?[0-9])(\.(25[0-5]|2[0-4][0-9]|1[0-9]{2}|[1-9]?[0-9])){3}$"
+)
+
+# device type by lower case name
+DEVICE_TYPES_LOWER = {device.lower(): device for device in PGLAB_DEVICE_TYPES}
 
 def ipaddrs(value: Any)-> str:
     
@@ -24,7 +53,7 @@ def macaddrs(value: Any)-> str:
     if value is None:
         raise vol.Invalid("MAC address value is None")        
 
-    result = re.match(r"([0-9a-fA-F]{2}[-:]){5}[0-9a-fA-F]{2}$",value)
+    result = MAC_ADDRESS_REGEX.match(value)
 
     if result is None:
         raise vol.Invalid("MAC address is not valid")        
@@ -36,19 +65,17 @@ def devicetype(value: Any)-> str:
     if value is None:
         raise vol.Invalid("Device type value is None")        
 
-    for device in PGLAB_DEVICE_TYPES:
-        if value.lower() == device.lower():
-            return device
+    device = DEVICE_TYPES_LOWER.get(value.lower())
+    if device is None:
+        raise vol.Invalid("Device type is not valid")
 
-    raise vol.Invalid("Device type is not valid")        
-    
-    return None
+    return device
 
 def version(value: Any)-> str:
     if value is None:
         raise vol.Invalid("Version Number is None")
     
-    result = re.match(r"^([0-9]+)\.([0-9]+)\.([0-9]+)?$",value)
+    result = VERSION_REGEX.match(value)
     if result is None:
         raise vol.Invalid("Version Number is not valid") 
     
@@ -82,8 +109,78 @@ def boards(value:Any)-> str:
     if value is None:
         raise vol.Invalid("Boards connection string is None")
     
-    result = re.match(r"^[0-1]{8}$",value)
+    result = BOARDS_REGEX.match(value)
     if result is None:
         raise vol.Invalid("Invalid Boards connection string") 
 
-    return str(value)
\ No newline at end of file
+    return str(value)
+
+
+def fast_discovery(config: Any) -> dict | None:
+    """Validate a well formed discovery message in a single pass without voluptuous.
+
+    Return None if the message is not obviously valid, it has to be validated
+    by the voluptuous schema which reports the errors.
+    """
+    if type(config) is not dict:
+        return None
+
+    try:
+        ip = config[CONFIG_IP]
+        mac = config[CONFIG_MAC]
+        hardware_version = config[CONFIG_HARDWARE_VERSION]
+        firmware_version = config[CONFIG_FIRMWARE_VERSION]
+        device_type = config[CONFIG_TYPE]
+        device_manufacturer = config[CONFIG_MANUFACTURER]
+        device_name = config[CONFIG_NAME]
+        device_id = config[CONFIG_ID]
+    except KeyError:
+        return None
+
+    if (
+        type(ip) is not str
+        or type(mac) is not str
+        or type(hardware_version) is not str
+        or type(firmware_version) is not str
+        or type(device_type) is not str
+        or type(device_name) is not str
+        or type(device_id) is not str
+        or device_manufacturer != MANUFACTURER
+        or not IPV4_ADDRESS_REGEX.fullmatch(ip)
+        or not MAC_ADDRESS_REGEX.fullmatch(mac)
+        or not VERSION_REGEX.fullmatch(hardware_version)
+        or not VERSION_REGEX.fullmatch(firmware_version)
+    ):
+        return None
+
+    device = DEVICE_TYPES_LOWER.get(device_type.lower())
+    if device is None:
+        return None
+
+    config = dict(config)
+    config[CONFIG_TYPE] = device
+    return config
+
+
+def fast_eboard_parameters(config: dict) -> dict | None:
+    """Validate well formed E-Board parameters without voluptuous.
+
+    Return None if the parameters are not obviously valid, they have to be
+    validated by the voluptuous schema which reports the errors.
+    """
+    parameters = config.get(CONFIG_PARAMETERS)
+    if type(parameters) is not dict:
+        return None
+
+    shutters = parameters.get(CONFIG_EBOARD_SHUTTERS)
+    boards = parameters.get(CONFIG_EBOARD_BOARDS)
+
+    if (
+        type(shutters) is not int
+        or not 0 <= shutters <= 32
+        or type(boards) is not str
+        or not BOARDS_REGEX.fullmatch(boards)
+    ):
+        return None
+
+    return {CONFIG_EBOARD_SHUTTERS: shutters, CONFIG_EBOARD_BOARDS: boards}
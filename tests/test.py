@@ -18,6 +18,9 @@ UNIT_TEST_SHUTTER_CLOSE_TIMEOUT  = 25
 
 UNIT_TEST_SENSOR_TIMEOUT = 65
 
+# time to wait for the device to confirm a command
+UNIT_TEST_COMMAND_TIMEOUT = 1
+
 class TestPgLab(unittest.IsolatedAsyncioTestCase):
 
     async def asyncSetUp(self):
@@ -60,15 +63,12 @@ class TestPgLab(unittest.IsolatedAsyncioTestCase):
         r.set_on_state_callback(state_changed)
 
         # be sure that the relay is off
-        await r.turn_off()
-        time.sleep(1)
+        self.assertTrue(await r.turn_off(confirm=True, timeout=UNIT_TEST_COMMAND_TIMEOUT), "Relay command not confirmed.")
 
-        await r.turn_on()
-        time.sleep(1)
+        self.assertTrue(await r.turn_on(confirm=True, timeout=UNIT_TEST_COMMAND_TIMEOUT), "Relay command not confirmed.")
         self.assertTrue(r.state, "Unexpected relay state.")
 
-        await r.turn_off()
-        time.sleep(1)
+        self.assertTrue(await r.turn_off(confirm=True, timeout=UNIT_TEST_COMMAND_TIMEOUT), "Relay command not confirmed.")
         self.assertTrue( not r.state, "Unexpected relay state.")
 
         self.assertTrue(state_update_changed, "Relay Status update don't received.")
@@ -100,15 +100,13 @@ class TestPgLab(unittest.IsolatedAsyncioTestCase):
         self.assertTrue( s.state is Shutter.STATE_CLOSED, "Unexpected shutter state")
 
         # we are sure that the shutter is fully close
-        # open the shutter and check the state after 1 second
-        await s.open()
-        time.sleep(1)
+        # open the shutter and check the state as soon as the device confirms it
+        self.assertTrue(await s.open(confirm=True, timeout=UNIT_TEST_COMMAND_TIMEOUT), "Shutter command not confirmed.")
 
         self.assertTrue( s.state is Shutter.STATE_OPENING, "Unexpected shutter state")
 
         # the shutter is opening ... stop and check the state
-        await s.stop()
-        time.sleep(1)
+        self.assertTrue(await s.stop(confirm=True, timeout=UNIT_TEST_COMMAND_TIMEOUT), "Shutter command not confirmed.")
         self.assertTrue(s.state is Shutter.STATE_OPEN, "Unexpected shutter state")
         self.assertTrue(state_update_changed, "Shutter Status update don't received.")
 
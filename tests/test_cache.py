@@ -0,0 +1,139 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+from pypglab.cache import DeviceCache
+from pypglab.const import ENTITY_RELAY, ENTITY_SHUTTER, SENSOR_TEMPERATURE
+from pypglab.helper import AsyncPgLab
+from pypglab.shutter import Shutter
+from pypglab.simulator import Simulator
+
+from .test_simulator import wait_until
+
+
+class TestDeviceCache(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self._path = os.path.join(self._directory.name, "devices.json")
+
+    async def asyncTearDown(self):
+        self._directory.cleanup()
+
+    async def _save_eboard(self) -> None:
+        """Discover an E-Board with some known states and store it in the cache"""
+        simulator = Simulator()
+        virtual = simulator.add_eboard("E-BOARD-1", shutters=1, boards="11000000")
+        pglab = AsyncPgLab(mqtt_client=simulator.client(), cache=self._path)
+        self.assertTrue(await pglab.connect("simulator"))
+        e_board = await pglab.get_device_by_name("E-BOARD-1")
+
+        virtual.publish_state(ENTITY_RELAY, 3, "ON")
+        virtual.publish_state(ENTITY_SHUTTER, 0, "CLOSED")
+        virtual.publish_sensor(temperature=31)
+        self.assertTrue(await wait_until(lambda: e_board.status_sensor.value(SENSOR_TEMPERATURE) == 31))
+
+        await pglab.disconnect()
+
+    async def test_warm_start(self):
+        """Test the cached devices are usable before the discovery."""
+        await self._save_eboard()
+
+        simulator = Simulator()
+        pglab = AsyncPgLab(mqtt_client=simulator.client(), cache=self._path)
+        self.assertTrue(await pglab.connect("simulator"))
+
+        e_board = pglab.registry.get(name="E-BOARD-1")
+        self.assertIsNotNone(e_board)
+        self.assertEqual(len(e_board.shutters), 1)
+        self.assertEqual(len(e_board.relays), 14)
+        self.assertTrue(e_board.relays[1].state)
+        self.assertIsNone(e_board.relays[0].state)
+        self.assertEqual(e_board.shutters[0].state, Shutter.STATE_CLOSED)
+        self.assertEqual(e_board.shutters[0].position, 0)
+        self.assertEqual(e_board.status_sensor.value(SENSOR_TEMPERATURE), 31)
+
+        # the same discovery message doesn't replace the cached device and its entities
+        relays = list(e_board.relays)
+        virtual = simulator.add_eboard("E-BOARD-1", shutters=1, boards="11000000")
+        await asyncio.sleep(0.01)
+        await pglab.wait_discovery()
+        self.assertIs(pglab.registry.get(name="E-BOARD-1"), e_board)
+        self.assertEqual(e_board.relays, relays)
+
+        # the cached entities are subscribed to their states
+        virtual.publish_state(ENTITY_RELAY, 3, "OFF")
+        self.assertTrue(await wait_until(lambda: e_board.relays[1].state is False))
+
+        await pglab.disconnect()
+
+    async def test_sensor_history(self):
+        """Test the cached sensor values are not recorded in the history."""
+        await self._save_eboard()
+
+        simulator = Simulator()
+        pglab = AsyncPgLab(mqtt_client=simulator.client(), cache=self._path, sensor_history=16)
+        self.assertTrue(await pglab.connect("simulator"))
+
+        sensor = pglab.registry.get(name="E-BOARD-1").status_sensor
+        self.assertEqual(sensor.value(SENSOR_TEMPERATURE), 31)
+        self.assertEqual(len(sensor.history(SENSOR_TEMPERATURE)), 0)
+
+        # the cached value is the last notified one
+        self.assertFalse(sensor.status_change_received(b'{"temp": 31}'))
+        self.assertEqual(len(sensor.history(SENSOR_TEMPERATURE)), 1)
+
+        await pglab.disconnect()
+
+    async def test_shutter_moving(self):
+        """Test a shutter moving when the cache was saved is restored without its movement."""
+        await self._save_eboard()
+        with open(self._path, encoding="utf-8") as file:
+            data = json.load(file)
+        self.assertEqual(data["devices"][0]["positions"], {"0": 0})
+
+        data["devices"][0]["shutters"] = {"0": "OPENING"}
+        data["devices"][0]["positions"] = {}
+        with open(self._path, "w", encoding="utf-8") as file:
+            json.dump(data, file)
+
+        simulator = Simulator()
+        pglab = AsyncPgLab(mqtt_client=simulator.client(), cache=self._path)
+        self.assertTrue(await pglab.connect("simulator"))
+
+        shutter = pglab.registry.get(name="E-BOARD-1").shutters[0]
+        self.assertNotEqual(shutter.state, Shutter.STATE_OPENING)
+        self.assertIsNone(shutter.position)
+        self.assertIsNone(shutter._stop_timer)
+
+        await pglab.disconnect()
+
+    async def test_reconfigured(self):
+        """Test a discovery message with a different configuration updates the cached device."""
+        await self._save_eboard()
+
+        simulator = Simulator()
+        pglab = AsyncPgLab(mqtt_client=simulator.client(), cache=self._path)
+        self.assertTrue(await pglab.connect("simulator"))
+
+        e_board = pglab.registry.get(name="E-BOARD-1")
+        simulator.add_eboard("E-BOARD-1", shutters=0, boards="11000000")
+        self.assertTrue(await wait_until(lambda: not e_board.shutters))
+        self.assertEqual(len(e_board.relays), 16)
+
+        await pglab.disconnect()
+
+    def test_invalid_cache(self):
+        """Test a missing or damaged cache file is ignored."""
+        cache = DeviceCache(self._path)
+        self.assertEqual(cache.load(), [])
+
+        with open(self._path, "w", encoding="utf-8") as file:
+            file.write("{not json")
+        self.assertEqual(cache.load(), [])
+
+        with open(self._path, "w", encoding="utf-8") as file:
+            file.write('{"version": 0, "devices": []}')
+        self.assertEqual(cache.load(), [])
@@ -0,0 +1,37 @@
+import unittest
+
+from pypglab import codec
+from pypglab.const import SENSOR_TEMPERATURE, SENSOR_VOLTAGE
+from pypglab.sensor import StatusSensor
+
+
+class TestCodec(unittest.TestCase):
+
+    def tearDown(self):
+        codec.set_backend()
+
+    def test_backends(self):
+        """Test every backend installed decodes bytes and text the same way."""
+        for backend in codec.available_backends():
+            codec.set_backend(backend)
+            self.assertEqual(codec.backend, backend)
+            self.assertEqual(codec.loads(b'{"temp": 25, "volt": 230.5}'), {"temp": 25, "volt": 230.5})
+            self.assertEqual(codec.loads('{"id": "e-board-1"}'), {"id": "e-board-1"})
+
+            with self.assertRaises(ValueError):
+                codec.loads(b'{"temp": ')
+
+    def test_preferred_backend(self):
+        """Test the standard library is the last choice."""
+        self.assertEqual(codec.available_backends()[-1], codec.JSON_BACKEND_STDLIB)
+        self.assertEqual(codec.backend, codec.available_backends()[0])
+
+        with self.assertRaises(ValueError):
+            codec.set_backend("yaml")
+
+    def test_sensor(self):
+        """Test the sensor values are decoded with the backend in use."""
+        codec.set_backend(codec.JSON_BACKEND_STDLIB)
+        sensor = StatusSensor("e-board-1", "E-BOARD-1", [SENSOR_TEMPERATURE, SENSOR_VOLTAGE], None)
+        self.assertTrue(sensor.status_change_received(b'{"temp": 25, "volt": 230}'))
+        self.assertEqual(sensor.value(SENSOR_VOLTAGE), 230)
@@ -0,0 +1,150 @@
+import asyncio
+import threading
+import unittest
+
+from pypglab.helper import AsyncPgLab, pyPgLab
+from pypglab.mqtt import Client
+from pypglab.relay import Relay
+from pypglab.scheduler import CommandScheduler
+from pypglab.shutter import Shutter
+from pypglab.simulator import Simulator
+
+from .test_simulator import wait_until
+
+
+class TestConfirmedCommand(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self._simulator = Simulator()
+        self._virtual = self._simulator.add_eboard("E-BOARD-1", shutters=1, travel_time=0.05)
+        self._pglab = AsyncPgLab(mqtt_client=self._simulator.client())
+        self.assertTrue(await self._pglab.connect("simulator"))
+        self._device = await self._pglab.get_device_by_name("E-BOARD-1")
+
+    async def asyncTearDown(self):
+        await self._pglab.disconnect()
+
+    async def test_relay(self):
+        """Test a relay command resolves when the state is received."""
+        relay = self._device.relays[0]
+        self.assertIsNone(relay.latency)
+
+        self.assertTrue(await relay.turn_on(confirm=True))
+        self.assertTrue(relay.state)
+        self.assertGreater(relay.latency, 0)
+
+        self.assertTrue(await relay.turn_off(confirm=True))
+        self.assertFalse(relay.state)
+
+    async def test_retry(self):
+        """Test a lost command is sent again."""
+        self._virtual.drop_commands = 1
+        relay = self._device.relays[0]
+
+        self.assertTrue(await relay.turn_on(confirm=True, timeout=0.05, retries=1))
+        self.assertTrue(relay.state)
+
+    async def test_not_confirmed(self):
+        """Test a command never confirmed after all retries."""
+        self._virtual.drop_commands = 3
+        relay = self._device.relays[0]
+
+        with self.assertLogs("pypglab", "WARNING"):
+            self.assertFalse(await relay.turn_on(confirm=True, timeout=0.02, retries=2))
+        self.assertEqual(self._virtual.drop_commands, 0)
+        self.assertIsNone(relay.state)
+
+    async def test_shutter(self):
+        """Test the shutter commands are confirmed by the moving and stopped states."""
+        shutter = self._device.shutters[0]
+
+        self.assertTrue(await shutter.open(confirm=True))
+        self.assertEqual(shutter.state, Shutter.STATE_OPENING)
+
+        self.assertTrue(await shutter.stop(confirm=True))
+        self.assertEqual(shutter.state, Shutter.STATE_OPEN)
+
+        self.assertTrue(await shutter.close(confirm=True))
+        self.assertEqual(shutter.state, Shutter.STATE_CLOSING)
+
+    async def test_all_relays(self):
+        """Test many relay commands confirmed together."""
+        # the relays 0 and 1 are used by the shutter
+        self.assertTrue(await self._device.all_relays_on(confirm=True))
+        self.assertEqual(self._device.relay_states, 0xFC)
+
+        self.assertFalse(await self._device.set_relays({2: False, 99: True}, confirm=True))
+        self.assertEqual(self._device.relay_states, 0xF8)
+
+
+    async def test_state_callbacks(self):
+        """Test the callbacks are given the decoded payload, or the bytes received when raw."""
+        relay, shutter = self._device.relays[5], self._device.shutters[0]
+        relay_states, shutter_states = [], []
+        relay.set_on_state_callback(relay_states.append)
+        shutter.set_on_state_callback(shutter_states.append, raw=True)
+
+        async with self._pglab.events() as events:
+            self.assertTrue(await relay.turn_on(confirm=True))
+            self.assertTrue(await shutter.open(confirm=True))
+            event = await events.__anext__()
+
+        self.assertEqual(event.payload, "ON")
+        self.assertEqual(relay_states, ["ON"])
+        self.assertEqual(shutter_states[0], b"OPENING")
+
+
+class TestLateConfirmation(unittest.IsolatedAsyncioTestCase):
+
+    async def test_late_state(self):
+        """Test the late state of an attempt doesn't confirm the retry waiting for the rate limit."""
+        published, callbacks = [], []
+
+        async def publish(topic, payload, qos, retain):
+            published.append(payload)
+
+        async def subscribe(substate, topic, callback):
+            callbacks.append(callback)
+            return {}
+
+        relay = Relay("e-board-1", "E-BOARD-1", 0, Client(publish, subscribe, None), CommandScheduler(rate=5))
+        await relay.subscribe_topics()
+        command = asyncio.create_task(relay.turn_on(confirm=True, timeout=0.05, retries=1))
+
+        # the first attempt is not confirmed in time, the retry is sent after 0.2 seconds
+        await asyncio.sleep(0.1)
+        self.assertEqual(len(published), 1)
+        callbacks[0](relay.state_topic, b"ON")
+        await asyncio.sleep(0)
+        self.assertFalse(command.done())
+
+        self.assertTrue(await wait_until(lambda: len(published) == 2))
+        callbacks[0](relay.state_topic, b"ON")
+        self.assertTrue(await command)
+        self.assertGreaterEqual(relay.latency, 0)
+
+
+class TestConfirmedCommandThread(unittest.TestCase):
+
+    def test_pypglab(self):
+        """Test a command confirmed by a state received in another thread."""
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+
+        try:
+            simulator = Simulator(loop)
+            simulator.add_eboard("E-BOARD-1")
+
+            pglab = pyPgLab(mqtt_client=simulator.client())
+            pglab.start("simulator")
+            pglab.connect()
+
+            relay = pglab.get_device_by_name("E-BOARD-1").relays[0]
+            self.assertTrue(asyncio.run(relay.turn_on(confirm=True)))
+            self.assertTrue(relay.state)
+            pglab.stop()
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
@@ -0,0 +1,96 @@
+import unittest
+
+from pypglab.device import Device
+from pypglab.mqtt import Client
+
+from .test_registry import discovery
+
+
+class TestDeviceConfig(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self._subscribed = set()
+
+        async def subscribe(sub_state, topic, callback):
+            self._subscribed.add(topic)
+            return {"topic": topic}
+
+        async def unsubscribe(sub_state):
+            self._subscribed.remove(sub_state["topic"])
+
+        self._client = Client(None, subscribe, unsubscribe)
+
+    async def test_config(self):
+        """Test an E-Board configuration."""
+        device = Device()
+        self.assertTrue(await device.config(self._client, discovery("E-BOARD-1"), True))
+
+        self.assertEqual(len(device.shutters), 1)
+        self.assertEqual([r.id for r in device.relays], list(range(2, 16)))
+        self.assertIn("pglab/E-BOARD-1/relay/2/state", self._subscribed)
+        self.assertEqual(len(self._subscribed), 16)
+
+    async def test_invalid_config(self):
+        """Test an invalid configuration doesn't change the device."""
+        device = Device()
+        await device.config(self._client, discovery("E-BOARD-1"), True)
+
+        config = discovery("E-BOARD-1", "10000000")
+        config["mac"] = "invalid"
+        self.assertFalse(await device.config(self._client, config, True))
+        self.assertEqual(len(device.relays), 14)
+
+    async def test_same_config(self):
+        """Test the same configuration keeps all entities."""
+        device = Device()
+        await device.config(self._client, discovery("E-BOARD-1"), True)
+        entities = device.entities
+        device_hash = device.hash
+
+        self.assertTrue(await device.config(self._client, discovery("E-BOARD-1"), True))
+        self.assertEqual(device.hash, device_hash)
+        self.assertEqual(len(device.entities), len(entities))
+        self.assertTrue(all(a is b for a, b in zip(device.entities, entities)))
+
+    async def test_incremental_config(self):
+        """Test only the entities affected by the new configuration are changed."""
+        device = Device()
+        await device.config(self._client, discovery("E-BOARD-1"), True)
+        relay = device.relays[0]
+
+        self.assertTrue(await device.config(self._client, discovery("E-BOARD-1", "10000000"), True))
+        self.assertIs(device.relays[0], relay)
+        self.assertEqual([r.id for r in device.relays], list(range(2, 8)))
+        self.assertNotIn("pglab/E-BOARD-1/relay/8/state", self._subscribed)
+        self.assertEqual(len(self._subscribed), 8)
+
+    async def test_renamed_device(self):
+        """Test all entities are replaced when the device name changes."""
+        device = Device()
+        await device.config(self._client, discovery("E-BOARD-1"), True)
+
+        config = discovery("E-BOARD-1")
+        config["name"] = "E-BOARD-2"
+        self.assertTrue(await device.config(self._client, config, True))
+        self.assertEqual(len(self._subscribed), 16)
+        self.assertTrue(all(topic.startswith("pglab/E-BOARD-2/") for topic in self._subscribed))
+
+    async def test_relay_states(self):
+        """Test the snapshot of all relays state."""
+        device = Device()
+        await device.config(self._client, discovery("E-BOARD-1"), True)
+        self.assertEqual(device.relay_states, 0)
+        self.assertIsNone(device.relays[0].state)
+
+        # the states are received as bytes, or restored as text
+        device.relay_bank.get(2).status_change_received(b"ON")
+        device.relay_bank.get(5).status_change_received("ON")
+        device.relay_bank.get(6).status_change_received(b"OFF")
+        self.assertEqual(device.relay_states, (1 << 2) | (1 << 5))
+        self.assertEqual(device.relay_bank.known, (1 << 2) | (1 << 5) | (1 << 6))
+        self.assertTrue(device.relays[0].state)
+        self.assertFalse(device.relays[4].state)
+
+        # the state of the relays removed is forgotten
+        await device.config(self._client, discovery("E-BOARD-1", "00000000"), True)
+        self.assertEqual(device.relay_states, 0)
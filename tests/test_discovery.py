@@ -0,0 +1,86 @@
+import asyncio
+import json
+import unittest
+
+from pypglab.discovery import DiscoveryPipeline
+
+from .test_registry import discovery
+
+
+class TestDiscoveryPipeline(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self._configured = []
+        self._running = 0
+        self._max_running = 0
+        self._pipeline = DiscoveryPipeline(self._configure)
+
+    async def asyncTearDown(self):
+        await self._pipeline.stop()
+
+    async def _configure(self, discovery_msg: dict) -> None:
+        self._running = self._running + 1
+        self._max_running = max(self._max_running, self._running)
+        await asyncio.sleep(0.01)
+        self._configured.append(discovery_msg)
+        self._running = self._running - 1
+
+    async def test_deduplicate(self):
+        """Test a device discovered many times before its configuration is configured once."""
+        self._pipeline.put(json.dumps(discovery("E-BOARD-1", "10000000")))
+        self._pipeline.put(json.dumps(discovery("E-BOARD-2")))
+        self._pipeline.put(json.dumps(discovery("E-BOARD-1", "11000000")))
+        self.assertEqual(self._pipeline.pending, 2)
+
+        self._pipeline.start()
+        await self._pipeline.join()
+
+        self.assertEqual([msg["name"] for msg in self._configured], ["E-BOARD-1", "E-BOARD-2"])
+        self.assertEqual(self._configured[0]["params"]["boards"], "11000000")
+
+    async def test_one_at_a_time(self):
+        """Test the devices are configured one at a time, in order."""
+        self._pipeline.start()
+        for index in range(10):
+            self._pipeline.put(json.dumps(discovery(f"E-BOARD-{index}")))
+        await self._pipeline.join()
+
+        self.assertEqual([msg["name"] for msg in self._configured], [f"E-BOARD-{index}" for index in range(10)])
+        self.assertEqual(self._max_running, 1)
+
+    async def test_yield_between_devices(self):
+        """Test the event loop runs other tasks between two configurations."""
+
+        async def configure(discovery_msg: dict) -> None:
+            # a message dispatched during the configuration
+            asyncio.get_running_loop().call_soon(self._configured.append, "other")
+            self._configured.append(discovery_msg["name"])
+
+        await self._pipeline.stop()
+        self._pipeline = DiscoveryPipeline(configure)
+        self._pipeline.put(json.dumps(discovery("E-BOARD-1")))
+        self._pipeline.put(json.dumps(discovery("E-BOARD-2")))
+        self._pipeline.start()
+        await self._pipeline.join()
+
+        self.assertEqual(self._configured, ["E-BOARD-1", "other", "E-BOARD-2", "other"])
+
+    async def test_rediscovery_during_configuration(self):
+        """Test a device discovered again during its configuration is configured again later."""
+        self._pipeline.start()
+        self._pipeline.put(json.dumps(discovery("E-BOARD-1", "10000000")))
+        await asyncio.sleep(0)
+        self._pipeline.put(json.dumps(discovery("E-BOARD-1", "11000000")))
+        await self._pipeline.join()
+
+        self.assertEqual([msg["params"]["boards"] for msg in self._configured], ["10000000", "11000000"])
+        self.assertEqual(self._max_running, 1)
+
+    async def test_invalid_payload(self):
+        """Test an invalid JSON payload is discarded."""
+        self._pipeline.start()
+        with self.assertLogs("pypglab", "WARNING"):
+            self._pipeline.put(b"{not json")
+        await self._pipeline.join()
+
+        self.assertEqual(self._configured, [])
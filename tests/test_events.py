@@ -0,0 +1,112 @@
+import asyncio
+import unittest
+
+from pypglab.const import ENTITY_RELAY
+from pypglab.events import OVERFLOW_COALESCE_LATEST, EventHub, StateEvent
+from pypglab.helper import AsyncPgLab
+from pypglab.relay import Relay
+from pypglab.simulator import Simulator
+
+
+class TestEventStream(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self._hub = EventHub()
+        self._relays = [Relay("e-board-1", "E-BOARD-1", index, None) for index in range(3)]
+
+    def _publish(self, index: int, payload: str) -> None:
+        self._hub.publish(StateEvent("E-BOARD-1", self._relays[index], payload))
+
+    async def _receive(self, stream, count: int) -> list:
+        events = []
+        async for event in stream:
+            events.append((event.entity.id, event.payload))
+            if len(events) == count:
+                break
+        return events
+
+    async def test_drop_oldest(self):
+        """Test a full stream drops the oldest events."""
+        stream = self._hub.stream(maxsize=2)
+        for payload in ("ON", "OFF", "ON"):
+            self._publish(0, payload)
+
+        self.assertEqual(stream.dropped, 1)
+        self.assertEqual(await self._receive(stream, 2), [(0, "OFF"), (0, "ON")])
+
+    async def test_coalesce_latest(self):
+        """Test a full stream keeps the latest event of every entity."""
+        stream = self._hub.stream(maxsize=2, overflow=OVERFLOW_COALESCE_LATEST)
+        self._publish(0, "ON")
+        self._publish(1, "ON")
+        self._publish(0, "OFF")
+        self.assertEqual(stream.pending, 2)
+
+        # a new entity drops the oldest one
+        self._publish(2, "ON")
+        self.assertEqual(stream.dropped, 2)
+        self.assertEqual(await self._receive(stream, 2), [(0, "OFF"), (2, "ON")])
+
+    async def test_many_consumers(self):
+        """Test every stream receives all events."""
+        streams = [self._hub.stream() for _ in range(3)]
+        consumers = [asyncio.create_task(self._receive(stream, 2)) for stream in streams]
+        await asyncio.sleep(0)
+
+        self._publish(0, "ON")
+        self._publish(1, "OFF")
+
+        for events in await asyncio.gather(*consumers):
+            self.assertEqual(events, [(0, "ON"), (1, "OFF")])
+
+    async def test_close(self):
+        """Test a closed stream ends the iteration and is removed from the hub."""
+        async with self._hub.stream() as stream:
+            self.assertTrue(self._hub.active)
+            self._publish(0, "ON")
+        self.assertFalse(self._hub.active)
+
+        self.assertEqual([event.payload async for event in stream], ["ON"])
+
+    async def test_invalid_stream(self):
+        """Test invalid stream size and overflow policy."""
+        with self.assertRaises(ValueError):
+            self._hub.stream(maxsize=0)
+        with self.assertRaises(ValueError):
+            self._hub.stream(overflow="drop_newest")
+
+
+class TestDeviceEvents(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self._simulator = Simulator()
+        self._virtual = self._simulator.add_eboard("E-BOARD-1")
+        self._simulator.add_eboard("E-BOARD-2")
+        self._pglab = AsyncPgLab(mqtt_client=self._simulator.client())
+        self.assertTrue(await self._pglab.connect("simulator"))
+        self._device = await self._pglab.get_device_by_name("E-BOARD-1")
+        await self._pglab.get_device_by_name("E-BOARD-2")
+
+    async def asyncTearDown(self):
+        await self._pglab.disconnect()
+
+    async def test_device_events(self):
+        """Test the state events of a device."""
+        async with self._device.events() as events:
+            self._virtual.publish_state(ENTITY_RELAY, 3, "ON")
+            event = await asyncio.wait_for(events.__anext__(), 1)
+
+        self.assertEqual(event.device_name, "E-BOARD-1")
+        self.assertIs(event.entity, self._device.relays[3])
+        self.assertEqual(event.payload, "ON")
+
+    async def test_filtered_events(self):
+        """Test the state events of all devices with a filter."""
+        other = self._simulator.device("E-BOARD-2")
+        async with self._pglab.events(filter=lambda event: event.device_name == "E-BOARD-2") as events:
+            self._virtual.publish_state(ENTITY_RELAY, 0, "ON")
+            other.publish_state(ENTITY_RELAY, 1, "ON")
+            event = await asyncio.wait_for(events.__anext__(), 1)
+
+        self.assertEqual(event.device_name, "E-BOARD-2")
+        self.assertEqual(event.entity.id, 1)
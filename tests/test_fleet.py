@@ -0,0 +1,79 @@
+import unittest
+
+from pypglab.const import E_BOARD, ENTITY_RELAY, ENTITY_SHUTTER, ENTITY_SWITCH
+from pypglab.fleet import Selector
+from pypglab.helper import AsyncPgLab
+from pypglab.simulator import Simulator
+
+from .test_simulator import wait_until
+
+
+class TestFleet(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self._simulator = Simulator()
+        self._simulator.add_eboards(3, prefix="BUILDING-A", shutters=1, boards="11000000")
+        self._simulator.add_eboards(2, prefix="BUILDING-B")
+        self._simulator.add_erelay("E-RELAY-1")
+        self._pglab = AsyncPgLab(mqtt_client=self._simulator.client())
+        self.assertTrue(await self._pglab.connect("simulator"))
+        self.assertTrue(await wait_until(lambda: len(self._pglab.registry) == 6))
+        await self._pglab.wait_discovery()
+
+    async def asyncTearDown(self):
+        await self._pglab.disconnect()
+
+    def _devices(self, pattern: str) -> list:
+        selector = Selector(name=pattern)
+        return [device for device in self._pglab.devices if selector.match(device)]
+
+    async def test_selector(self):
+        """Test the entities selected by device type, name pattern, tags and indexes."""
+        self.assertEqual(len(self._devices("BUILDING-A-*")), 3)
+        self.assertEqual(len(self._devices("*")), 6)
+
+        selected = Selector(device_type=E_BOARD).select(self._pglab.devices)
+        self.assertEqual(len(selected), 3 * 14 + 2 * 8)
+
+        for device in self._devices("BUILDING-B-*"):
+            device.tags.add("lights")
+        selected = Selector(tags=["lights"], indexes=[0, 1]).select(self._pglab.devices)
+        self.assertEqual(sorted(device.name for device, _ in selected), ["BUILDING-B-000000"] * 2 + ["BUILDING-B-000001"] * 2)
+
+        selected = Selector(ENTITY_SHUTTER, name="BUILDING-A-*").select(self._pglab.devices)
+        self.assertEqual(len(selected), 3)
+
+    async def test_broadcast(self):
+        """Test a command sent to all the selected relays and confirmed."""
+        result = await self._pglab.broadcast(Selector(name="BUILDING-A-*"), "ON", confirm=True, timeout=0.5)
+        self.assertTrue(result)
+        self.assertEqual(len(result), 3 * 14)
+        self.assertEqual(result.failed, [])
+
+        for device in self._devices("BUILDING-A-*"):
+            self.assertTrue(all(relay.state for relay in device.relays))
+        for device in self._devices("BUILDING-B-*"):
+            self.assertFalse(any(relay.state for relay in device.relays))
+
+    async def test_failed_confirmation(self):
+        """Test the entities not confirming the command are reported."""
+        self._simulator.device("BUILDING-B-000001").drop_commands = 100
+        result = await self._pglab.broadcast(
+            Selector(name="BUILDING-B-*", indexes=[0]), "OFF", confirm=True, timeout=0.1, retries=0
+        )
+        self.assertFalse(result)
+        self.assertEqual([device.name for device, _ in result.succeeded], ["BUILDING-B-000000"])
+        self.assertEqual([device.name for device, _ in result.failed], ["BUILDING-B-000001"])
+
+    async def test_shutters(self):
+        """Test a shutter command sent to all shutters."""
+        result = await self._pglab.broadcast(Selector(ENTITY_SHUTTER), "CLOSE", confirm=True, timeout=0.5)
+        self.assertTrue(result)
+        self.assertEqual(len(result), 3)
+
+    async def test_invalid_command(self):
+        """Test a command not valid for the selected entities."""
+        with self.assertRaises(ValueError):
+            await self._pglab.broadcast(Selector(ENTITY_RELAY), "OPEN")
+        with self.assertRaises(ValueError):
+            Selector(ENTITY_SWITCH)
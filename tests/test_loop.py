@@ -0,0 +1,40 @@
+import asyncio
+import threading
+import unittest
+
+from pypglab.loop import call_in_loop, resolve_future
+
+
+class TestCallInLoop(unittest.IsolatedAsyncioTestCase):
+
+    async def test_same_loop(self):
+        """Test a call from the loop runs at once."""
+        calls = []
+        call_in_loop(asyncio.get_running_loop(), calls.append, 1)
+        self.assertEqual(calls, [1])
+
+    async def test_other_thread(self):
+        """Test a call from another thread runs in the loop thread."""
+        loop = asyncio.get_running_loop()
+        threads = []
+        thread = threading.Thread(target=call_in_loop, args=(loop, lambda: threads.append(threading.current_thread())))
+        thread.start()
+        thread.join()
+
+        self.assertEqual(threads, [])
+        await asyncio.sleep(0)
+        self.assertEqual(threads, [threading.main_thread()])
+
+    async def test_resolve_future(self):
+        """Test a future resolved from another thread, only once."""
+        future = asyncio.get_running_loop().create_future()
+        thread = threading.Thread(target=lambda: (resolve_future(future, 1), resolve_future(future, 2)))
+        thread.start()
+        thread.join()
+        self.assertEqual(await future, 1)
+
+    def test_closed_loop(self):
+        """Test a call to a closed loop is dropped."""
+        loop = asyncio.new_event_loop()
+        loop.close()
+        call_in_loop(loop, self.fail)
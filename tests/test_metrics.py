@@ -0,0 +1,138 @@
+import asyncio
+import json
+import unittest
+import urllib.request
+
+from pypglab.helper import AsyncPgLab
+from pypglab.metrics import (
+    COMMAND_RTT_SECONDS,
+    DEVICES_CONFIGURED,
+    DEVICES_INVALID,
+    DISCOVERY_SECONDS,
+    MESSAGES_PUBLISHED,
+    MESSAGES_UNROUTED,
+    Histogram,
+    Metrics,
+    label_value,
+    serve_prometheus,
+)
+from pypglab.simulator import Simulator
+
+from .test_simulator import wait_until
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_buckets(self):
+        """Test the cumulative bucket counts."""
+        histogram = Histogram((0.1, 1))
+        for value in (0.05, 0.1, 0.5, 2):
+            histogram.observe(value)
+
+        snapshot = histogram.snapshot()
+        self.assertEqual(snapshot["buckets"], {0.1: 2, 1: 3})
+        self.assertEqual(snapshot["count"], 4)
+        self.assertAlmostEqual(snapshot["sum"], 2.65)
+
+
+class TestMetrics(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self._simulator = Simulator()
+        self._metrics = Metrics()
+        self._pglab = AsyncPgLab(mqtt_client=self._simulator.client(), metrics=self._metrics)
+
+    async def asyncTearDown(self):
+        await self._pglab.disconnect()
+
+    async def test_disabled(self):
+        """Test the helpers without metrics."""
+        self.assertIsNone(AsyncPgLab(mqtt_client=self._simulator.client()).metrics)
+
+    async def test_discovery(self):
+        """Test the configuration of valid and invalid devices is counted."""
+        self._simulator.add_eboard("E-BOARD-1")
+        self._simulator.broker.publish("pglab/discovery/E-BOARD-2/config", json.dumps({"id": "e-board-2"}), retain=True)
+        self.assertTrue(await self._pglab.connect("simulator"))
+        self.assertTrue(await wait_until(lambda: self._metrics.counters[DEVICES_INVALID] == 1))
+        await self._pglab.wait_discovery()
+
+        snapshot = self._metrics.snapshot()
+        self.assertEqual(snapshot["counters"][DEVICES_CONFIGURED], 1)
+        self.assertEqual(snapshot["histograms"][DISCOVERY_SECONDS]["count"], 1)
+        self.assertEqual(snapshot["gauges"]["devices"], 1)
+        self.assertEqual(snapshot["gauges"]["discovery_pending"], 0)
+
+    async def test_command_rtt(self):
+        """Test the round trip time from a command to the state echo."""
+        self._simulator.add_eboard("E-BOARD-1")
+        self.assertTrue(await self._pglab.connect("simulator"))
+        e_board = await self._pglab.get_device_by_name("E-BOARD-1")
+
+        relay = e_board.relays[0]
+        await relay.turn_on()
+        self.assertTrue(await wait_until(lambda: relay.state is True))
+
+        self.assertEqual(self._metrics.counters[MESSAGES_PUBLISHED], 1)
+        self.assertEqual(self._metrics.histograms[COMMAND_RTT_SECONDS].count, 1)
+
+        # our own command is not received back
+        self.assertEqual(self._metrics.counters[MESSAGES_UNROUTED], 0)
+
+        stats = self._metrics.devices["E-BOARD-1"].snapshot()
+        self.assertEqual(stats["commands"], 1)
+        self.assertEqual(stats["rtt_count"], 1)
+        self.assertGreater(stats["rtt_max"], 0)
+
+    async def test_offline_command_rtt(self):
+        """Test the round trip time of a command queued while offline starts when it is published."""
+        client = self._simulator.client()
+        pglab = AsyncPgLab(mqtt_client=client, metrics=self._metrics)
+        self._simulator.add_eboard("E-BOARD-1")
+        self.assertTrue(await pglab.connect("simulator"))
+        relay = (await pglab.get_device_by_name("E-BOARD-1")).relays[0]
+
+        client.disconnect()
+        self.assertTrue(await wait_until(lambda: not pglab.connected))
+        await relay.turn_on()
+        self.assertEqual(self._metrics.counters[MESSAGES_PUBLISHED], 0)
+        await asyncio.sleep(0.3)
+
+        client.reconnect()
+        self.assertTrue(await wait_until(lambda: relay.state is True))
+        self.assertEqual(self._metrics.counters[MESSAGES_PUBLISHED], 1)
+        self.assertLess(self._metrics.histograms[COMMAND_RTT_SECONDS].sum, 0.3)
+
+        await pglab.disconnect()
+
+    async def test_exporters(self):
+        """Test the callback and the Prometheus exporters."""
+        exported = []
+        self._metrics.add_exporter(exported.append)
+        virtual = self._simulator.add_eboard("E-BOARD-1")
+        self.assertTrue(await self._pglab.connect("simulator"))
+        await self._pglab.get_device_by_name("E-BOARD-1")
+        virtual.publish_sensor()
+        self.assertTrue(await wait_until(lambda: "E-BOARD-1" in self._metrics.devices))
+
+        self._metrics.export()
+        self.assertEqual(exported[0]["gauges"]["devices"], 1)
+
+        text = self._metrics.prometheus()
+        self.assertIn("# TYPE pypglab_messages_received_total counter", text)
+        self.assertIn('pypglab_dispatch_seconds_bucket{le="+Inf"}', text)
+        self.assertIn('pypglab_device_messages_total{device="E-BOARD-1"}', text)
+
+        # the label values are escaped
+        self._metrics.devices['E-BOARD-"2"\\\n'] = self._metrics.devices["E-BOARD-1"]
+        self.assertIn('pypglab_device_messages_total{device="E-BOARD-\\"2\\"\\\\\\n"}', self._metrics.prometheus())
+        self.assertEqual(label_value('a"b\\c\nd'), 'a\\"b\\\\c\\nd')
+
+        server = serve_prometheus(self._metrics, 0, "127.0.0.1")
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+            with urllib.request.urlopen(url, timeout=2) as response:
+                self.assertIn("pypglab_devices 1", response.read().decode())
+        finally:
+            server.shutdown()
+            server.server_close()
@@ -0,0 +1,82 @@
+import unittest
+
+from pypglab.const import ENTITY_RELAY
+from pypglab.helper import AsyncPgLab
+from pypglab.mqtt import OfflineQueue
+from pypglab.simulator import Simulator
+
+from .test_simulator import wait_until
+
+
+class TestOfflineQueue(unittest.TestCase):
+
+    def test_last_write_wins(self):
+        """Test only the latest message of a topic is kept, in the order of the latest writes."""
+        queue = OfflineQueue()
+        queue.put("pglab/a/relay/0/set", "ON")
+        queue.put("pglab/a/relay/1/set", "ON")
+        queue.put("pglab/a/relay/0/set", "OFF")
+
+        self.assertEqual(len(queue), 2)
+        self.assertEqual(
+            queue.drain(),
+            [("pglab/a/relay/1/set", "ON", 0, False), ("pglab/a/relay/0/set", "OFF", 0, False)],
+        )
+        self.assertEqual(len(queue), 0)
+
+    def test_bounded(self):
+        """Test a full queue drops the oldest message."""
+        queue = OfflineQueue(2)
+        for index in range(3):
+            queue.put(f"pglab/a/relay/{index}/set", "ON")
+
+        self.assertEqual(queue.dropped, 1)
+        self.assertEqual([topic for topic, *_ in queue.drain()], ["pglab/a/relay/1/set", "pglab/a/relay/2/set"])
+
+
+class TestReconnection(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self._simulator = Simulator()
+        self._virtual = self._simulator.add_eboard("E-BOARD-1")
+        self._client = self._simulator.client()
+        self._pglab = AsyncPgLab(mqtt_client=self._client)
+        self.assertTrue(await self._pglab.connect("simulator"))
+        self._device = await self._pglab.get_device_by_name("E-BOARD-1")
+
+    async def asyncTearDown(self):
+        await self._pglab.disconnect()
+
+    async def test_offline_commands(self):
+        """Test the commands sent while offline are replayed on reconnection with the final state."""
+        self._client.disconnect()
+        self.assertTrue(await wait_until(lambda: not self._pglab.connected))
+
+        relays = self._device.relays
+        await relays[3].turn_on()
+        await relays[3].turn_off()
+        await relays[4].turn_on()
+        self.assertEqual(len(self._pglab.offline_queue), 2)
+        self.assertIsNone(self._virtual.state(ENTITY_RELAY, 3))
+
+        self._client.reconnect()
+        self.assertTrue(await wait_until(lambda: self._virtual.state(ENTITY_RELAY, 4) == "ON"))
+        self.assertEqual(self._virtual.state(ENTITY_RELAY, 3), "OFF")
+        self.assertEqual(len(self._pglab.offline_queue), 0)
+
+        # the echoed states are received with the restored subscriptions
+        self.assertTrue(await wait_until(lambda: relays[4].state is True))
+        self.assertIs(relays[3].state, False)
+
+    async def test_batched_resubscribe(self):
+        """Test all subscriptions are restored with a single request."""
+        self._client.disconnect()
+        self.assertTrue(await wait_until(lambda: not self._pglab.connected))
+
+        requests = self._client.subscribe_requests
+        self._client.reconnect()
+        self.assertTrue(await wait_until(lambda: self._pglab.connected))
+        self.assertEqual(self._client.subscribe_requests, requests + 1)
+
+        self._virtual.publish_state(ENTITY_RELAY, 5, "ON")
+        self.assertTrue(await wait_until(lambda: self._device.relays[5].state is True))
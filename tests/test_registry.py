@@ -0,0 +1,68 @@
+import asyncio
+import unittest
+
+from pypglab.device import Device
+from pypglab.mqtt import Client
+from pypglab.registry import DeviceRegistry
+
+
+def discovery(name: str, boards: str = "11000000") -> dict:
+    return {
+        "ip": "192.168.1.10",
+        "mac": "AA:BB:CC:DD:EE:FF",
+        "name": name,
+        "hw": "1.0.0",
+        "fw": "1.0.0",
+        "type": "E-BOARD",
+        "id": name.lower(),
+        "manufacturer": "PG LAB Electronics",
+        "params": {"shutters": 1, "boards": boards},
+    }
+
+
+class TestDeviceRegistry(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self._registry = DeviceRegistry()
+        self._client = Client(None, None, None)
+
+    async def _create_device(self, name: str, boards: str = "11000000") -> Device:
+        device = Device()
+        self.assertTrue(await device.config(self._client, discovery(name, boards)))
+        return device
+
+    async def test_lookup(self):
+        """Test a device lookup by name, id and mac address."""
+        device = await self._create_device("E-BOARD-1")
+        self.assertTrue(self._registry.add(device))
+
+        self.assertIs(self._registry.get(name="E-BOARD-1"), device)
+        self.assertIs(self._registry.get(id="e-board-1"), device)
+        self.assertIs(self._registry.get(mac="aa-bb-cc-dd-ee-ff"), device)
+        self.assertIsNone(self._registry.get(name="E-BOARD-2"))
+
+        with self.assertRaises(ValueError):
+            self._registry.get(name="E-BOARD-1", id="e-board-1")
+
+    async def test_rediscovery(self):
+        """Test the same device discovered again is not duplicated."""
+        device = await self._create_device("E-BOARD-1")
+        self.assertTrue(self._registry.add(device))
+        self.assertFalse(self._registry.add(await self._create_device("E-BOARD-1")))
+
+        reconfigured = await self._create_device("E-BOARD-1", "10000000")
+        self.assertTrue(self._registry.add(reconfigured))
+        self.assertIs(self._registry.get(name="E-BOARD-1"), reconfigured)
+        self.assertEqual(len(self._registry), 1)
+
+    async def test_wait_for(self):
+        """Test waiting for a device to be discovered."""
+        waiter = asyncio.ensure_future(self._registry.wait_for(name="E-BOARD-1", timeout=1))
+        await asyncio.sleep(0)
+        self.assertFalse(waiter.done())
+
+        device = await self._create_device("E-BOARD-1")
+        self._registry.add(device)
+        self.assertIs(await waiter, device)
+
+        self.assertIsNone(await self._registry.wait_for(name="E-BOARD-2", timeout=0.01))
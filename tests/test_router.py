@@ -0,0 +1,50 @@
+import unittest
+
+from pypglab.router import TopicRouter
+
+
+class TestTopicRouter(unittest.TestCase):
+
+    def setUp(self):
+        self._router = TopicRouter()
+
+    def test_exact_match(self):
+        """Test a topic is routed only to the exact topic filter."""
+        self._router.add("pglab/board/relay/0/state", "relay0")
+        self._router.add("pglab/board/relay/1/state", "relay1")
+
+        self.assertEqual(self._router.match("pglab/board/relay/0/state"), ["relay0"])
+        self.assertEqual(self._router.match("pglab/board/relay/2/state"), [])
+        self.assertEqual(self._router.match("pglab/board/relay/0"), [])
+
+    def test_wildcards(self):
+        """Test single and multi level wildcards."""
+        self._router.add("pglab/board/#", "device")
+        self._router.add("pglab/+/relay/+/state", "relays")
+        self._router.add("pglab/discovery/#", "discovery")
+
+        self.assertEqual(sorted(self._router.match("pglab/board/relay/3/state")), ["device", "relays"])
+        self.assertEqual(self._router.match("pglab/board/sensor/value"), ["device"])
+        self.assertEqual(self._router.match("pglab/board"), ["device"])
+        self.assertEqual(self._router.match("pglab/discovery/board/config"), ["discovery"])
+        self.assertEqual(self._router.match("pglab/other/shutter/0/state"), [])
+
+    def test_multiple_handlers(self):
+        """Test a topic filter with more than one handler."""
+        self._router.add("pglab/board/relay/0/state", "first")
+        self._router.add("pglab/board/relay/0/state", "second")
+        self.assertEqual(self._router.match("pglab/board/relay/0/state"), ["first", "second"])
+        self.assertEqual(len(self._router), 2)
+
+    def test_remove(self):
+        """Test removing handlers and pruning the trie."""
+        self._router.add("pglab/board/relay/0/state", "relay0")
+        self._router.add("pglab/board/#", "device")
+
+        self.assertTrue(self._router.remove("pglab/board/relay/0/state", "relay0"))
+        self.assertFalse(self._router.remove("pglab/board/relay/0/state", "relay0"))
+        self.assertEqual(self._router.match("pglab/board/relay/0/state"), ["device"])
+
+        self.assertTrue(self._router.remove("pglab/board/#", "device"))
+        self.assertEqual(self._router.match("pglab/board/relay/0/state"), [])
+        self.assertEqual(len(self._router), 0)
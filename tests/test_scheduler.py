@@ -0,0 +1,33 @@
+import unittest
+
+from pypglab.const import DEFAULT_COMMAND_RATE_LIMIT
+from pypglab.scheduler import CommandScheduler, command_rate_limit
+
+
+class TestCommandScheduler(unittest.TestCase):
+
+    def test_burst(self):
+        """Test the commands in the burst are released without waiting."""
+        scheduler = CommandScheduler(10, 3)
+        self.assertEqual([scheduler.reserve() for _ in range(3)], [0, 0, 0])
+
+    def test_rate(self):
+        """Test the commands after the burst wait for their own time slot."""
+        scheduler = CommandScheduler(10, 1)
+        self.assertEqual(scheduler.reserve(), 0)
+        self.assertAlmostEqual(scheduler.reserve(), 0.1, delta=0.01)
+        self.assertAlmostEqual(scheduler.reserve(), 0.2, delta=0.01)
+        self.assertEqual(scheduler.queued, 2)
+
+    def test_invalid_configuration(self):
+        """Test invalid rate and burst values."""
+        with self.assertRaises(ValueError):
+            CommandScheduler(0, 1)
+        with self.assertRaises(ValueError):
+            CommandScheduler(10, 0)
+
+    def test_command_rate_limit(self):
+        """Test the rate limit lookup by device type and firmware version."""
+        self.assertEqual(command_rate_limit("E-BOARD", "1.0.0"), DEFAULT_COMMAND_RATE_LIMIT)
+        self.assertEqual(command_rate_limit("UNKNOWN", "1.0.0"), DEFAULT_COMMAND_RATE_LIMIT)
+        self.assertEqual(command_rate_limit("E-BOARD", None), DEFAULT_COMMAND_RATE_LIMIT)
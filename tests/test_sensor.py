@@ -0,0 +1,187 @@
+import asyncio
+import json
+import time
+import unittest
+
+from pypglab.const import SENSOR_REBOOT_TIME, SENSOR_TEMPERATURE, SENSOR_VOLTAGE
+from pypglab.fleet import Selector
+from pypglab.helper import AsyncPgLab
+from pypglab.sensor import SensorHistory, StatusSensor
+from pypglab.simulator import Simulator
+
+from .test_simulator import wait_until
+
+
+def sensor_payload(temperature: int, voltage: int = 230, reboot_time: int = 10) -> str:
+    return json.dumps({"temp": temperature, "volt": voltage, "rtime": reboot_time})
+
+
+class TestStatusSensor(unittest.TestCase):
+
+    def setUp(self):
+        self._sensor = StatusSensor(
+            "e-board-1", "E-BOARD-1", [SENSOR_TEMPERATURE, SENSOR_VOLTAGE, SENSOR_REBOOT_TIME], None
+        )
+
+    def test_change_detection(self):
+        """Test only the changed values are notified."""
+        self.assertTrue(self._sensor.status_change_received(sensor_payload(25)))
+        self.assertFalse(self._sensor.status_change_received(sensor_payload(25)))
+
+        # the same values in a different payload
+        self.assertFalse(self._sensor.status_change_received(json.dumps({"rtime": 10, "temp": 25})))
+
+        self.assertTrue(self._sensor.status_change_received(sensor_payload(26)))
+        self.assertEqual(self._sensor.value(SENSOR_TEMPERATURE), 26)
+
+    def test_zero_value(self):
+        """Test a value changed to zero is stored."""
+        self._sensor.status_change_received(sensor_payload(25, reboot_time=10))
+        self.assertTrue(self._sensor.status_change_received(sensor_payload(25, reboot_time=0)))
+        self.assertEqual(self._sensor.value(SENSOR_REBOOT_TIME), 0)
+
+    def test_deadband(self):
+        """Test the changes within the deadband are stored but not notified."""
+        self._sensor.set_filter(SENSOR_TEMPERATURE, deadband=1)
+        self.assertTrue(self._sensor.status_change_received(sensor_payload(25)))
+
+        self.assertFalse(self._sensor.status_change_received(sensor_payload(26)))
+        self.assertEqual(self._sensor.value(SENSOR_TEMPERATURE), 26)
+
+        # the deadband is from the last notified value
+        self.assertTrue(self._sensor.status_change_received(sensor_payload(27)))
+
+    def test_throttle(self):
+        """Test a change held back by the throttle is notified after the window."""
+        self._sensor.set_filter(SENSOR_TEMPERATURE, throttle=0.05)
+        self.assertTrue(self._sensor.status_change_received(sensor_payload(25)))
+        self.assertFalse(self._sensor.status_change_received(sensor_payload(26)))
+        self.assertEqual(self._sensor.value(SENSOR_TEMPERATURE), 26)
+
+        # the same payload again after the window
+        time.sleep(0.06)
+        self.assertTrue(self._sensor.status_change_received(sensor_payload(26)))
+        self.assertFalse(self._sensor.status_change_received(sensor_payload(26)))
+
+    def test_deadband_not_numeric(self):
+        """Test a value not numeric is notified whatever the deadband."""
+        self._sensor.set_filter(SENSOR_TEMPERATURE, deadband=1)
+        self.assertTrue(self._sensor.status_change_received(sensor_payload(25)))
+        self.assertTrue(self._sensor.status_change_received(json.dumps({"temp": "n/a"})))
+        self.assertTrue(self._sensor.status_change_received(sensor_payload(25)))
+
+    def test_invalid_filter(self):
+        """Test the filter of an unknown sensor type."""
+        with self.assertRaises(ValueError):
+            self._sensor.set_filter("humidity", throttle=1)
+        with self.assertRaises(ValueError):
+            self._sensor.set_filter(SENSOR_TEMPERATURE, throttle=-1)
+
+
+class TestSensorThrottle(unittest.IsolatedAsyncioTestCase):
+
+    async def test_held_change(self):
+        """Test a change held back by the throttle is notified at the end of the window without a new message."""
+        sensor = StatusSensor("e-board-1", "E-BOARD-1", [SENSOR_TEMPERATURE, SENSOR_VOLTAGE], None)
+        sensor.set_filter(SENSOR_TEMPERATURE, throttle=0.05)
+        notified = []
+        sensor.set_on_state_callback(notified.append)
+
+        self.assertTrue(sensor.status_change_received(sensor_payload(25)))
+        self.assertFalse(sensor.status_change_received(sensor_payload(26)))
+        self.assertFalse(sensor.status_change_received(sensor_payload(27)))
+
+        self.assertTrue(await wait_until(lambda: notified, timeout=0.5))
+        self.assertEqual(notified, [sensor_payload(27)])
+
+        # the held change was notified, the same payload is not notified again
+        self.assertFalse(sensor.status_change_received(sensor_payload(27)))
+        await asyncio.sleep(0.06)
+        self.assertEqual(len(notified), 1)
+
+
+class TestSensorHistory(unittest.TestCase):
+
+    def test_ring_buffer(self):
+        """Test the oldest values are overwritten when the history is full."""
+        history = SensorHistory(4)
+        self.assertIsNone(history.mean())
+        self.assertIsNone(history.rate())
+
+        for second in range(6):
+            history.append(second * 10, timestamp=second)
+
+        self.assertEqual(len(history), 4)
+        times, values = history.samples()
+        self.assertEqual(list(times), [2, 3, 4, 5])
+        self.assertEqual(list(values), [20, 30, 40, 50])
+        self.assertEqual(history.min(), 20)
+        self.assertEqual(history.max(), 50)
+        self.assertEqual(history.mean(), 35)
+        self.assertAlmostEqual(history.rate(), 10)
+
+    def test_window(self):
+        """Test the queries of the values received in the last seconds."""
+        history = SensorHistory(8)
+        now = time.monotonic()
+        history.append(100, now - 60)
+        history.append(20, now - 2)
+        history.append(24, now - 1)
+
+        self.assertEqual(history.max(), 100)
+        self.assertEqual(history.max(window=10), 24)
+        self.assertEqual(history.mean(window=10), 22)
+        self.assertAlmostEqual(history.rate(window=10), 4)
+        self.assertIsNone(history.mean(window=0.5))
+
+    def test_status_sensor(self):
+        """Test every sensor message is stored, the repeated ones too."""
+        sensor = StatusSensor("e-board-1", "E-BOARD-1", [SENSOR_TEMPERATURE, SENSOR_VOLTAGE], None)
+        self.assertIsNone(sensor.history(SENSOR_TEMPERATURE))
+
+        sensor.enable_history(16)
+        for temperature in (25, 25, 27):
+            sensor.status_change_received(sensor_payload(temperature))
+
+        history = sensor.history(SENSOR_TEMPERATURE)
+        self.assertEqual(list(history.samples()[1]), [25, 25, 27])
+        self.assertEqual(sensor.history(SENSOR_VOLTAGE).mean(), 230)
+
+    def test_invalid_size(self):
+        """Test a history too small for a rate."""
+        with self.assertRaises(ValueError):
+            SensorHistory(1)
+
+
+class TestSensorAggregates(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self._simulator = Simulator()
+        self._virtuals = self._simulator.add_eboards(3)
+        self._pglab = AsyncPgLab(mqtt_client=self._simulator.client(), sensor_history=64)
+        self.assertTrue(await self._pglab.connect("simulator"))
+        self.assertTrue(await wait_until(lambda: len(self._pglab.registry) == 3))
+        await self._pglab.wait_discovery()
+
+    async def asyncTearDown(self):
+        await self._pglab.disconnect()
+
+    async def test_fleet_statistics(self):
+        """Test the statistics of a sensor type across all devices."""
+        for offset, virtual in enumerate(self._virtuals):
+            for temperature in (20, 22):
+                virtual.publish_sensor(temperature=temperature + offset)
+
+        self.assertTrue(
+            await wait_until(lambda: self._pglab.sensor_statistics(SENSOR_TEMPERATURE).samples == 6)
+        )
+        statistics = self._pglab.sensor_statistics(SENSOR_TEMPERATURE)
+        self.assertEqual(statistics.devices, 3)
+        self.assertEqual(statistics.min, 20)
+        self.assertEqual(statistics.max, 24)
+        self.assertEqual(statistics.mean, 22)
+        self.assertEqual(statistics.min_device.name, self._virtuals[0].name)
+        self.assertEqual(statistics.max_device.name, self._virtuals[2].name)
+
+        selected = self._pglab.sensor_statistics(SENSOR_TEMPERATURE, selector=Selector(name=self._virtuals[1].name))
+        self.assertEqual((selected.devices, selected.mean), (1, 22))
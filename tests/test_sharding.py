@@ -0,0 +1,98 @@
+import os
+import tempfile
+import unittest
+
+from pypglab.const import ENTITY_RELAY
+from pypglab.fleet import Selector
+from pypglab.helper import ShardedPgLab, shard_index
+from pypglab.metrics import Metrics
+from pypglab.simulator import Simulator
+
+from .test_simulator import wait_until
+
+DEVICES = 20
+SHARDS = 4
+
+
+class TestShardedPgLab(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self._simulator = Simulator()
+        self._virtuals = self._simulator.add_eboards(DEVICES)
+        self._metrics = Metrics()
+        self._pglab = ShardedPgLab(
+            mqtt_clients=[self._simulator.client() for _ in range(SHARDS)], metrics=self._metrics
+        )
+        self.assertTrue(await self._pglab.connect("simulator"))
+        self.assertTrue(await wait_until(lambda: len(self._pglab.registry) == DEVICES))
+        await self._pglab.wait_discovery()
+
+    async def asyncTearDown(self):
+        await self._pglab.disconnect()
+
+    async def test_shards(self):
+        """Test every device is configured and subscribed by its shard only."""
+        for device in self._pglab.devices:
+            shard = self._pglab.shard(device.name)
+            self.assertIs(shard, self._pglab.shards[shard_index(device.name, SHARDS)])
+
+        # the broker subscriptions for the states and the sensor of every device, in its shard
+        for index, shard in enumerate(self._pglab.shards):
+            names = [virtual.name for virtual in self._virtuals if shard_index(virtual.name, SHARDS) == index]
+            topics = [topic for name in names for topic in (f"pglab/{name}/+/+/state", f"pglab/{name}/sensor/value")]
+            self.assertEqual(sorted(shard._broker_topics), sorted(topics))
+
+        self.assertEqual(self._metrics.snapshot()["gauges"]["devices"], DEVICES)
+
+    async def test_commands(self):
+        """Test the commands and the states of the devices of all shards."""
+        async with self._pglab.events(filter=lambda event: event.entity.id == 3) as events:
+            result = await self._pglab.broadcast(Selector(indexes=[3]), "ON", confirm=True, timeout=0.5)
+            self.assertTrue(result)
+            self.assertEqual(len(result), DEVICES)
+
+            names = set()
+            while len(names) < DEVICES:
+                event = await events.__anext__()
+                names.add(event.device_name)
+
+        for virtual in self._virtuals:
+            self.assertEqual(virtual.state(ENTITY_RELAY, 3), "ON")
+
+    def test_invalid_shard(self):
+        """Test the shard index out of range."""
+        with self.assertRaises(ValueError):
+            ShardedPgLab(shards=0)
+
+
+class TestShardedCache(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self._path = os.path.join(self._directory.name, "devices.json")
+
+        simulator = Simulator()
+        simulator.add_eboards(DEVICES)
+        pglab = ShardedPgLab(mqtt_clients=[simulator.client() for _ in range(SHARDS)], cache=self._path)
+        self.assertTrue(await pglab.connect("simulator"))
+        self.assertTrue(await wait_until(lambda: len(pglab.registry) == DEVICES))
+        await pglab.wait_discovery()
+        await pglab.disconnect()
+
+    async def asyncTearDown(self):
+        self._directory.cleanup()
+
+    async def test_unreachable_broker(self):
+        """Test the cached devices are restored also when a shard can't connect."""
+        def refuse(*args):
+            raise ConnectionRefusedError("broker not reachable")
+
+        clients = [Simulator().client() for _ in range(SHARDS)]
+        clients[1].connect = refuse
+        pglab = ShardedPgLab(mqtt_clients=clients, cache=self._path)
+
+        with self.assertRaises(ConnectionRefusedError):
+            await pglab.connect("simulator")
+        self.assertEqual(len(pglab.registry), DEVICES)
+
+        await pglab.disconnect()
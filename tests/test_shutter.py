@@ -0,0 +1,254 @@
+import asyncio
+import unittest
+
+from pypglab.helper import AsyncPgLab
+from pypglab.mqtt import Client
+from pypglab.shutter import Shutter, ShutterGroup, ShutterTimer
+from pypglab.simulator import Simulator
+
+from .test_simulator import wait_until
+
+TRAVEL_TIME = 0.4
+GROUP_TRAVEL_TIME = 0.1
+
+# the position error allowed in percent
+POSITION_ERROR = 5
+
+
+class TestShutterTimer(unittest.IsolatedAsyncioTestCase):
+
+    async def test_calls(self):
+        """Test the calls are run in deadline order with a single loop timer."""
+        timer = ShutterTimer.get()
+        self.assertIs(timer, ShutterTimer.get(asyncio.get_running_loop()))
+
+        calls = []
+        timer.call_later(0.03, lambda: calls.append(3))
+        timer.call_later(0.01, lambda: calls.append(1))
+        cancelled = timer.call_later(0.02, lambda: calls.append(2))
+        cancelled.cancel()
+        self.assertTrue(cancelled.cancelled)
+        self.assertEqual(timer.pending, 3)
+
+        await asyncio.sleep(0.05)
+        self.assertEqual(calls, [1, 3])
+        self.assertEqual(timer.pending, 0)
+
+
+class TestShutterPosition(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self._simulator = Simulator()
+        self._virtual = self._simulator.add_eboard("E-BOARD-1", shutters=1, travel_time=TRAVEL_TIME)
+        self._pglab = AsyncPgLab(mqtt_client=self._simulator.client())
+        self.assertTrue(await self._pglab.connect("simulator"))
+        device = await self._pglab.get_device_by_name("E-BOARD-1")
+        self._shutter = device.shutters[0]
+
+    async def asyncTearDown(self):
+        await self._pglab.disconnect()
+
+    def assertPosition(self, position: float) -> None:
+        self.assertAlmostEqual(self._shutter.position, position, delta=POSITION_ERROR)
+        self.assertAlmostEqual(self._virtual.position(0), position, delta=POSITION_ERROR)
+
+    async def test_learned_travel_time(self):
+        """Test the travel times learned from a full travel are used to reach a position."""
+        self.assertIsNone(self._shutter.position)
+        self.assertFalse(await self._shutter.set_position(40))
+
+        self.assertTrue(await self._shutter.set_position(100))
+        self.assertEqual(self._shutter.position, 100)
+        self.assertTrue(await self._shutter.set_position(0))
+        self.assertTrue(await self._shutter.set_position(100))
+
+        open_time, close_time = self._shutter.travel_time
+        self.assertAlmostEqual(open_time, TRAVEL_TIME, delta=TRAVEL_TIME * 0.1)
+        self.assertAlmostEqual(close_time, TRAVEL_TIME, delta=TRAVEL_TIME * 0.1)
+
+        self.assertTrue(await self._shutter.set_position(40))
+        self.assertPosition(40)
+
+        self.assertTrue(await self._shutter.set_position(70))
+        self.assertPosition(70)
+
+    async def test_travel_time(self):
+        """Test the position with the travel time given."""
+        self._shutter.set_travel_time(TRAVEL_TIME)
+        self.assertTrue(await self._shutter.set_position(0))
+        self.assertEqual(self._shutter.position, 0)
+
+        self.assertTrue(await self._shutter.set_position(25))
+        self.assertPosition(25)
+
+        # the estimated position while moving
+        await self._shutter.open()
+        await asyncio.sleep(TRAVEL_TIME / 4)
+        self.assertAlmostEqual(self._shutter.position, 50, delta=POSITION_ERROR * 2)
+        await self._shutter.stop(confirm=True)
+        self.assertPosition(self._shutter.position)
+
+    async def test_invalid_position(self):
+        """Test invalid positions and travel times."""
+        with self.assertRaises(ValueError):
+            await self._shutter.set_position(101)
+        with self.assertRaises(ValueError):
+            self._shutter.set_travel_time(0)
+
+
+class TestShutterStop(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        async def publish(topic, payload, qos, retain):
+            self._published.append(payload)
+
+        # a device not reporting any state for a STOP while idle
+        self._published = []
+        self._shutter = Shutter("e-board-1", "E-BOARD-1", 0, Client(publish, None, None))
+        self._shutter.status_change_received("CLOSED")
+
+    async def test_stop_idle(self):
+        """Test a STOP to an idle shutter doesn't prevent the next full travel from being learned."""
+        await self._shutter.stop()
+        self.assertEqual(self._published, ["STOP"])
+
+        await self._shutter.open()
+        self._shutter.status_change_received("OPENING")
+        await asyncio.sleep(0.05)
+        self._shutter.status_change_received("OPEN")
+
+        self.assertEqual(self._shutter.position, 100)
+        self.assertAlmostEqual(self._shutter.travel_time[0], 0.05, delta=0.02)
+
+    async def test_stop_moving(self):
+        """Test a shutter stopped while moving isn't considered at its end stop."""
+        await self._shutter.open()
+        self._shutter.status_change_received("OPENING")
+        await self._shutter.stop()
+        self._shutter.status_change_received("OPEN")
+
+        self.assertIsNone(self._shutter.position)
+        self.assertEqual(self._shutter.travel_time, (None, None))
+
+
+class TestShutterGroup(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self._simulator = Simulator()
+        self._simulator.add_eboards(3, shutters=2, boards="11110000", travel_time=GROUP_TRAVEL_TIME)
+        self._pglab = AsyncPgLab(mqtt_client=self._simulator.client())
+        self.assertTrue(await self._pglab.connect("simulator"))
+        self.assertTrue(await wait_until(lambda: len(self._pglab.registry) == 3))
+        await self._pglab.wait_discovery()
+        self._shutters = [shutter for device in self._pglab.devices for shutter in device.shutters]
+
+        # the time every shutter started opening
+        self._started = {}
+        loop = asyncio.get_running_loop()
+        for shutter in self._shutters:
+            shutter.set_on_state_callback(
+                lambda payload, shutter=shutter: payload == "OPENING" and self._started.setdefault(shutter, loop.time())
+            )
+
+    async def asyncTearDown(self):
+        await self._pglab.disconnect()
+
+    async def test_max_moving(self):
+        """Test no more than max_moving shutters move at the same time."""
+        group = ShutterGroup(self._shutters, max_moving=2)
+        results = await group.close()
+        self.assertTrue(all(results.values()))
+
+        moving = []
+
+        async def sample():
+            while True:
+                moving.append(sum(shutter.state == Shutter.STATE_OPENING for shutter in self._shutters))
+                await asyncio.sleep(0.005)
+
+        sampler = asyncio.create_task(sample())
+        start = asyncio.get_running_loop().time()
+        results = await group.open()
+        elapsed = asyncio.get_running_loop().time() - start
+        sampler.cancel()
+
+        self.assertEqual(len(results), 6)
+        self.assertTrue(all(results.values()))
+        self.assertEqual(max(moving), 2)
+        self.assertTrue(all(shutter.position == 100 for shutter in self._shutters))
+
+        # three rounds of two shutters
+        self.assertGreaterEqual(elapsed, 3 * GROUP_TRAVEL_TIME)
+        self.assertLess(elapsed, 4 * GROUP_TRAVEL_TIME)
+
+    async def test_stagger(self):
+        """Test the motors start stagger seconds apart."""
+        group = ShutterGroup(self._shutters, stagger=0.05)
+        await group.close()
+        self.assertTrue(all((await group.open()).values()))
+
+        started = sorted(self._started.values())
+        self.assertEqual(len(started), 6)
+        for previous, later in zip(started, started[1:]):
+            self.assertGreaterEqual(later - previous, 0.025)
+
+        # the shutters already open don't move
+        self._started.clear()
+        self.assertTrue(all((await group.open()).values()))
+        self.assertEqual(self._started, {})
+
+    async def test_stop(self):
+        """Test stop cancels the shutters not started yet."""
+        group = ShutterGroup(self._shutters, max_moving=1)
+        await group.close()
+
+        opening = asyncio.create_task(group.open())
+        await asyncio.sleep(GROUP_TRAVEL_TIME / 2)
+        await group.stop()
+        results = await opening
+
+        self.assertFalse(any(results.values()))
+        self.assertEqual(len(self._started), 1)
+
+    async def test_stop_stagger(self):
+        """Test stop cancels the shutters waiting for the stagger."""
+        group = ShutterGroup(self._shutters, stagger=0.1)
+        await group.close()
+        self._started.clear()
+
+        opening = asyncio.create_task(group.open())
+        await asyncio.sleep(0.15)
+        await group.stop()
+        started = len(self._started)
+        results = await opening
+
+        self.assertLess(started, 6)
+        self.assertFalse(any(results.values()))
+
+        # no shutter is started after the stop
+        await asyncio.sleep(0.5)
+        self.assertEqual(len(self._started), started)
+
+    async def test_stop_idle(self):
+        """Test stop sends the STOP command only to the moving shutters."""
+        group = ShutterGroup(self._shutters)
+        await group.close()
+
+        published = []
+        client = self._pglab._mqtt_client
+        publish = client.publish
+        client.publish = lambda topic, payload, *args: published.append(topic) or publish(topic, payload, *args)
+
+        moving = self._shutters[0]
+        self.assertTrue(await moving.open(confirm=True))
+        results = await group.stop(timeout=0.1, retries=0)
+
+        self.assertTrue(all(results.values()))
+        self.assertEqual(published, [moving.set_topic, moving.set_topic])
+
+    def test_invalid_group(self):
+        """Test invalid group limits."""
+        with self.assertRaises(ValueError):
+            ShutterGroup([], stagger=-1)
+        with self.assertRaises(ValueError):
+            ShutterGroup([], max_moving=0)
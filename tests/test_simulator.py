@@ -0,0 +1,153 @@
+import asyncio
+import threading
+import unittest
+
+from pypglab.const import E_RELAY, E_SWITCH, ENTITY_RELAY, ENTITY_SHUTTER
+from pypglab.helper import AsyncPgLab, pyPgLab
+from pypglab.shutter import Shutter
+from pypglab.simulator import Simulator
+
+
+async def wait_until(condition, timeout: float = 2) -> bool:
+    """Wait until the condition is true, return false on timeout"""
+    loop = asyncio.get_running_loop()
+    end = loop.time() + timeout
+    while not condition():
+        if loop.time() > end:
+            return False
+        await asyncio.sleep(0.001)
+    return True
+
+
+class TestSimulator(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self._simulator = Simulator()
+        self._pglab = AsyncPgLab(mqtt_client=self._simulator.client())
+
+    async def asyncTearDown(self):
+        await self._pglab.disconnect()
+
+    async def test_discovery(self):
+        """Test the virtual devices are discovered."""
+        self._simulator.add_eboard("E-BOARD-1", shutters=1, boards="11000000")
+        self._simulator.add_erelay("E-RELAY-1")
+        self._simulator.add_eswitch("E-SWITCH-1")
+        self.assertTrue(await self._pglab.connect("simulator"))
+
+        e_board = await self._pglab.get_device_by_name("E-BOARD-1")
+        self.assertEqual(len(e_board.shutters), 1)
+        self.assertEqual(len(e_board.relays), 14)
+
+        e_relay = await self._pglab.get_device_by_name("E-RELAY-1")
+        self.assertEqual(e_relay.type, E_RELAY)
+
+        e_switch = await self._pglab.get_device_by_name("E-SWITCH-1")
+        self.assertEqual(e_switch.type, E_SWITCH)
+
+    async def test_relay(self):
+        """Test a relay command is echoed by the virtual device."""
+        virtual = self._simulator.add_eboard("E-BOARD-1")
+        self.assertTrue(await self._pglab.connect("simulator"))
+        e_board = await self._pglab.get_device_by_name("E-BOARD-1")
+
+        relay = e_board.relays[3]
+        await relay.turn_on()
+        self.assertTrue(await wait_until(lambda: relay.state is True))
+        self.assertEqual(virtual.state(ENTITY_RELAY, 3), "ON")
+
+        await relay.turn_off()
+        self.assertTrue(await wait_until(lambda: relay.state is False))
+
+    async def test_commands_not_received(self):
+        """Test the commands published are not received back, only the states."""
+        self._simulator.add_eboard("E-BOARD-1")
+        self.assertTrue(await self._pglab.connect("simulator"))
+        e_board = await self._pglab.get_device_by_name("E-BOARD-1")
+        self.assertEqual(sorted(self._pglab._broker_topics), ["pglab/E-BOARD-1/+/+/state", "pglab/E-BOARD-1/sensor/value"])
+
+        received = []
+        dispatch = self._pglab._dispatch
+        self._pglab._dispatch = lambda topic, payload: received.append(topic) or dispatch(topic, payload)
+
+        relay = e_board.relays[3]
+        await relay.turn_on()
+        self.assertTrue(await wait_until(lambda: relay.state is True))
+        self.assertEqual(received, [relay.state_topic])
+
+    async def test_shutter_travel(self):
+        """Test a shutter is opening for the travel time."""
+        virtual = self._simulator.add_eboard("E-BOARD-1", shutters=1, travel_time=0.05)
+        self.assertTrue(await self._pglab.connect("simulator"))
+        e_board = await self._pglab.get_device_by_name("E-BOARD-1")
+
+        shutter = e_board.shutters[0]
+        await shutter.open()
+        self.assertTrue(await wait_until(lambda: shutter.state == Shutter.STATE_OPENING))
+        self.assertTrue(await wait_until(lambda: shutter.state == Shutter.STATE_OPEN))
+
+        await shutter.close()
+        self.assertTrue(await wait_until(lambda: shutter.state == Shutter.STATE_CLOSING))
+        await shutter.stop()
+        self.assertTrue(await wait_until(lambda: shutter.state == Shutter.STATE_OPEN))
+        self.assertEqual(virtual.state(ENTITY_SHUTTER, 0), "OPEN")
+
+    async def test_sensor(self):
+        """Test the sensor values published by the virtual device."""
+        virtual = self._simulator.add_eboard("E-BOARD-1")
+        self.assertTrue(await self._pglab.connect("simulator"))
+        e_board = await self._pglab.get_device_by_name("E-BOARD-1")
+
+        virtual.publish_sensor(temperature=31, voltage=229, reboot_time=5)
+        sensor = e_board.status_sensor
+        self.assertTrue(await wait_until(lambda: sensor.state["temp"] == 31))
+        self.assertEqual(sensor.state["volt"], 229)
+
+    async def test_fleet(self):
+        """Test a fleet of virtual devices is discovered."""
+        self._simulator.add_eboards(200, shutters=1, boards="11000000")
+        self.assertTrue(await self._pglab.connect("simulator"))
+
+        self.assertTrue(await wait_until(lambda: len(self._pglab.registry) == 200))
+        await self._pglab.wait_discovery()
+
+    async def test_removed_device(self):
+        """Test the discovery message of a removed device is not retained."""
+        self._simulator.add_eboard("E-BOARD-1")
+        self._simulator.remove_device("E-BOARD-1")
+        self.assertTrue(await self._pglab.connect("simulator"))
+
+        self.assertIsNone(await self._pglab.get_device_by_name("E-BOARD-1", timeout=0.05))
+
+    async def test_empty_simulator(self):
+        """Test a connection before any device is added."""
+        self.assertTrue(await self._pglab.connect("simulator"))
+
+        self._simulator.add_eboard("E-BOARD-1")
+        self.assertIsNotNone(await self._pglab.get_device_by_name("E-BOARD-1"))
+
+
+class TestSimulatorThread(unittest.TestCase):
+
+    def test_pypglab(self):
+        """Test the thread based helper with the simulator event loop in a thread."""
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+
+        try:
+            simulator = Simulator(loop)
+            simulator.add_eboard("E-BOARD-1")
+
+            pglab = pyPgLab(mqtt_client=simulator.client())
+            pglab.start("simulator")
+            pglab.connect()
+
+            e_board = pglab.get_device_by_name("E-BOARD-1")
+            self.assertIsNotNone(e_board)
+            self.assertEqual(len(e_board.relays), 8)
+            pglab.stop()
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
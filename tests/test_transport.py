@@ -0,0 +1,192 @@
+import asyncio
+import json
+import unittest
+
+from pypglab.const import PGLAB_DISCOVERY_TOPIC
+from pypglab.helper import AsyncPgLab
+from pypglab.router import TopicRouter
+
+from .test_registry import discovery
+from .test_simulator import wait_until
+
+# MQTT 3.1.1 control packet types
+CONNECT = 0x10
+CONNACK = 0x20
+PUBLISH = 0x30
+SUBSCRIBE = 0x80
+SUBACK = 0x90
+UNSUBSCRIBE = 0xA0
+UNSUBACK = 0xB0
+PINGREQ = 0xC0
+PINGRESP = 0xD0
+DISCONNECT = 0xE0
+
+
+def packet(packet_type: int, body: bytes) -> bytes:
+    """Return a control packet with its remaining length"""
+    length = len(body)
+    header = bytearray([packet_type])
+    while True:
+        byte, length = length % 128, length // 128
+        header.append(byte | 128 if length else byte)
+        if not length:
+            return bytes(header) + body
+
+
+def string(value: bytes) -> bytes:
+    return len(value).to_bytes(2, "big") + value
+
+
+class LoopbackBroker:
+    """A minimal MQTT broker on a loopback socket, QoS 0 only"""
+
+    def __init__(self, connack: bool = True) -> None:
+        self.connack = connack
+        self.connections = 0
+        self.published: list[tuple[str, bytes]] = []
+        self._retained: dict[str, bytes] = {}
+        self._router = TopicRouter()
+        self._clients: dict[asyncio.StreamWriter, asyncio.StreamReader] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._server: asyncio.Server = None
+
+    async def start(self) -> int:
+        """Start listening, return the port"""
+        self._server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        self._server.close()
+        self.drop()
+        await asyncio.gather(*self._tasks)
+        await self._server.wait_closed()
+
+    def drop(self) -> None:
+        """Close the connection of every client"""
+        for writer, reader in list(self._clients.items()):
+            writer.close()
+            reader.feed_eof()
+
+    def subscribed(self, topic: str) -> bool:
+        """Return true if a client is subscribed to the topic"""
+        return bool(self._router.match(topic))
+
+    def publish(self, topic: str, payload: bytes, retain: bool = False) -> None:
+        """Send a message to the subscribed clients"""
+        if retain:
+            self._retained[topic] = payload
+        message = packet(PUBLISH, string(topic.encode()) + payload)
+        for writer in set(self._router.match(topic)):
+            writer.write(message)
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._clients[writer] = reader
+        self._tasks.add(asyncio.current_task())
+        filters = []
+        try:
+            while True:
+                header = await reader.readexactly(1)
+                length, shift = 0, 0
+                while True:
+                    byte = (await reader.readexactly(1))[0]
+                    length += (byte & 127) << shift
+                    shift += 7
+                    if not byte & 128:
+                        break
+                body = await reader.readexactly(length)
+                self._packet(writer, header[0], body, filters)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._clients.pop(writer, None)
+            self._tasks.discard(asyncio.current_task())
+            for topic_filter in filters:
+                self._router.remove(topic_filter, writer)
+            writer.close()
+
+    def _packet(self, writer: asyncio.StreamWriter, packet_type: int, body: bytes, filters: list) -> None:
+        kind = packet_type & 0xF0
+        if kind == CONNECT:
+            self.connections += 1
+            if self.connack:
+                writer.write(packet(CONNACK, b"\x00\x00"))
+        elif kind == PUBLISH:
+            size = int.from_bytes(body[:2], "big")
+            self.published.append((body[2 : 2 + size].decode(), body[2 + size :]))
+        elif kind == SUBSCRIBE:
+            position, granted, topics = 2, b"", []
+            while position < len(body):
+                size = int.from_bytes(body[position : position + 2], "big")
+                topics.append(body[position + 2 : position + 2 + size].decode())
+                position += size + 3
+                granted += b"\x00"
+            writer.write(packet(SUBACK, body[:2] + granted))
+            for topic_filter in topics:
+                filters.append(topic_filter)
+                self._router.add(topic_filter, writer)
+                for topic, payload in self._retained.items():
+                    if writer in self._router.match(topic):
+                        writer.write(packet(PUBLISH | 1, string(topic.encode()) + payload))
+        elif kind == UNSUBSCRIBE:
+            writer.write(packet(UNSUBACK, body[:2]))
+        elif kind == PINGREQ:
+            writer.write(packet(PINGRESP, b""))
+        elif kind == DISCONNECT:
+            writer.close()
+
+
+class TestSocketTransport(unittest.IsolatedAsyncioTestCase):
+    """The paho socket driven by the event loop, against a broker on a loopback socket"""
+
+    async def asyncSetUp(self):
+        self._broker = LoopbackBroker()
+        self._port = await self._broker.start()
+        config = json.dumps(discovery("E-BOARD-1")).encode()
+        self._broker.publish(f"{PGLAB_DISCOVERY_TOPIC}/E-BOARD-1/config", config, retain=True)
+        self._pglab = AsyncPgLab()
+
+    async def asyncTearDown(self):
+        await self._pglab.disconnect()
+        await self._broker.stop()
+
+    async def test_messages(self):
+        """Test the states are read and the commands written through the socket."""
+        self.assertTrue(await self._pglab.connect("127.0.0.1", self._port, timeout=2))
+        e_board = await self._pglab.get_device_by_name("E-BOARD-1")
+        self.assertIsNotNone(e_board)
+
+        relay = e_board.relays[0]
+        await relay.turn_on()
+        self.assertTrue(await wait_until(lambda: (relay.set_topic, b"ON") in self._broker.published))
+
+        self.assertTrue(await wait_until(lambda: self._broker.subscribed(relay.state_topic)))
+        self._broker.publish(relay.state_topic, b"ON")
+        self.assertTrue(await wait_until(lambda: relay.state is True))
+
+    async def test_reconnection(self):
+        """Test the connection closed by the broker is opened again with the subscriptions."""
+        self.assertTrue(await self._pglab.connect("127.0.0.1", self._port, timeout=2))
+        e_board = await self._pglab.get_device_by_name("E-BOARD-1")
+
+        self._broker.drop()
+        self.assertTrue(await wait_until(lambda: not self._pglab.connected))
+        self.assertTrue(await wait_until(lambda: self._pglab.connected, timeout=5))
+        self.assertEqual(self._broker.connections, 2)
+
+        relay = e_board.relays[1]
+        self.assertTrue(await wait_until(lambda: self._broker.subscribed(relay.state_topic)))
+        self._broker.publish(relay.state_topic, b"ON")
+        self.assertTrue(await wait_until(lambda: relay.state is True))
+
+    async def test_connection_timeout(self):
+        """Test a connection never acknowledged is closed, and can be retried."""
+        self._broker.connack = False
+        self.assertFalse(await self._pglab.connect("127.0.0.1", self._port, timeout=0.1))
+        self.assertIsNone(self._pglab._misc_task)
+
+        self._broker.connack = True
+        self.assertTrue(await self._pglab.connect("127.0.0.1", self._port, timeout=2))
+        self.assertEqual(self._broker.connections, 2)
+
+        misc_tasks = [task for task in asyncio.all_tasks() if task.get_coro().__name__ == "_misc_loop"]
+        self.assertEqual(len(misc_tasks), 1)
@@ -0,0 +1,50 @@
+import unittest
+
+from pypglab import validation as cv
+from pypglab.device import PGLAB_DISCOVERY_SCHEMA, PGLAB_EBOARD_PARAMETERS
+
+from .test_registry import discovery
+
+
+class TestFastValidation(unittest.TestCase):
+
+    def test_well_formed_discovery(self):
+        """Test the fast validation gives the same result of the schema."""
+        config = discovery("E-BOARD-1")
+        config["type"] = "e-board"
+
+        self.assertEqual(cv.fast_discovery(config), PGLAB_DISCOVERY_SCHEMA(config))
+        self.assertEqual(
+            cv.fast_eboard_parameters(config),
+            PGLAB_EBOARD_PARAMETERS(config)["params"],
+        )
+
+    def test_not_well_formed_discovery(self):
+        """Test the messages left to the schema validation."""
+        for field, value in (
+            ("ip", "256.1.1.1"),
+            ("ip", "fe80::1"),
+            ("ip", "192.168.1.10\n"),
+            ("mac", "AA:BB:CC:DD:EE:FF\n"),
+            ("hw", "1.0.0\n"),
+            ("mac", "AA:BB:CC:DD:EE"),
+            ("fw", "1.0"),
+            ("type", "E-UNKNOWN"),
+            ("manufacturer", "Unknown"),
+            ("id", 1234),
+        ):
+            config = discovery("E-BOARD-1")
+            config[field] = value
+            self.assertIsNone(cv.fast_discovery(config), field)
+
+        config = discovery("E-BOARD-1")
+        del config["name"]
+        self.assertIsNone(cv.fast_discovery(config))
+        self.assertIsNone(cv.fast_discovery(None))
+
+    def test_not_well_formed_eboard_parameters(self):
+        """Test the E-Board parameters left to the schema validation."""
+        for shutters, boards in ((33, "11000000"), (True, "11000000"), (1, "1100000"), (1, "11000000\n"), (1, None)):
+            config = discovery("E-BOARD-1")
+            config["params"] = {"shutters": shutters, "boards": boards}
+            self.assertIsNone(cv.fast_eboard_parameters(config))